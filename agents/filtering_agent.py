@@ -1,8 +1,14 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_deepseek import ChatDeepSeek
+from functools import lru_cache
+from pydantic import BaseModel, Field
 from utils.logger import logger
 from core.state import EmailState
+from core.llm_cache import LLMCache, cached_invoke
+from agents.local_classifier import CATEGORIES, LocalClassifier, classification_text
+from utils.token_budget import budget_body
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 class EmailCategory(BaseModel):
     """Defines the category of the email."""
@@ -10,13 +16,11 @@ class EmailCategory(BaseModel):
         description="The category of the email. Must be one of: spam, urgent, informational, needs_review."
     )
 
-def filter_email(state: EmailState, llm: ChatDeepSeek) -> dict:
-    """
-    Filters an email by classifying it into a category using the LLM.
-    """
-    logger.info(f"Filtering email ID: {state.email_id}")
-
-    prompt = ChatPromptTemplate.from_messages(
+@lru_cache(maxsize=None)
+def filter_prompt():
+    # langchain is imported on first use so importing the agents stays cheap
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(
         [
             (
                 "system",
@@ -37,18 +41,41 @@ def filter_email(state: EmailState, llm: ChatDeepSeek) -> dict:
         ]
     )
 
-    structured_llm = llm.with_structured_output(EmailCategory)
-    chain = prompt | structured_llm
-    
+def build_filter_chain(llm: "BaseChatModel") -> Any:
+    """
+    The classification chain for a model; build it once and pass it to every filter_email call.
+    """
+    return filter_prompt() | llm.with_structured_output(EmailCategory)
+
+def filter_email(state: EmailState, llm: "BaseChatModel", cache: Optional[LLMCache] = None,
+                 classifier: Optional[LocalClassifier] = None, chain: Any = None) -> dict:
+    """
+    Filters an email by classifying it into a category. A confident local classifier
+    answers directly; otherwise the LLM decides and its label is kept as training data.
+    """
+    logger.info(f"Filtering email ID: {state.email_id}")
+
+    if classifier is not None:
+        category = classifier.classify(state)
+        if category:
+            return {"category": category}
+
+    prompt = filter_prompt()
+    if chain is None:
+        chain = build_filter_chain(llm)
+    body, tokens_saved = budget_body(state, "filter_email")
+    inputs = {
+        "sender": state.sender,
+        "subject": state.subject,
+        "body": body,
+    }
+
     try:
-        result = chain.invoke({
-            "sender": state.sender,
-            "subject": state.subject,
-            "body": state.cleaned_body,
-        })
-        category = result.category
+        category = cached_invoke(cache, prompt, llm, inputs, lambda: chain.invoke(inputs).category, namespace="filter_email")
         logger.info(f"Email {state.email_id} classified as: {category}")
-        return {"category": category}
+        if cache is not None and category in CATEGORIES:
+            cache.add_example("filter_email", classification_text(state), category)
+        return {"category": category, "tokens_saved": tokens_saved}
     except Exception as e:
         logger.error(f"Error classifying email {state.email_id}: {e}")
-        return {"category": "needs_review"} # Default to review on error
\ No newline at end of file
+        return {"error": f"classification failed: {e}"}
\ No newline at end of file
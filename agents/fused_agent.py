@@ -0,0 +1,102 @@
+from functools import lru_cache
+from pydantic import BaseModel, Field
+from utils.logger import logger
+from core.state import EmailState
+from core.llm_cache import LLMCache, cached_invoke
+from utils.token_budget import budget_body
+from agents.response_agent import requires_review
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+VALID_CATEGORIES = {"spam", "urgent", "informational", "needs_review"}
+
+class EmailAnalysis(BaseModel):
+    """Classification, summary and draft reply for an email, produced in a single pass."""
+    category: str = Field(
+        description="The category of the email. Must be one of: spam, urgent, informational, needs_review."
+    )
+    summary: str = Field(
+        description="A concise, 2-3 sentence summary of the email. Empty for spam."
+    )
+    draft_response: str = Field(
+        description="The body of a polite, professional reply. Empty unless the category is urgent or needs_review."
+    )
+    needs_human_review: bool = Field(
+        description="True if the query is complex, sensitive, or requires information you don't have."
+    )
+
+@lru_cache(maxsize=None)
+def analysis_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "You are an expert email assistant. For the email below, do all of the following in one answer:\n"
+                "1. Classify it into one of: 'spam', 'urgent', 'informational', 'needs_review'. "
+                "An email is 'urgent' if it requires an immediate response. "
+                "It is 'informational' if it's a notification or update not requiring a reply. "
+                "It 'needs_review' if it's a complex query that a human should handle. "
+                "It is 'spam' if it is an unsolicited commercial email.\n"
+                "2. Write a concise, 2-3 sentence summary (leave empty for spam).\n"
+                "3. If the category is 'urgent' or 'needs_review', draft a polite, professional reply body "
+                "that addresses the main points; otherwise leave the draft empty.\n"
+                "4. Flag the draft for human review if the query is complex, sensitive, or requires information you don't have.",
+            ),
+            (
+                "human",
+                "Sender: {sender}\n"
+                "Subject: {subject}\n"
+                "Body:\n{body}",
+            ),
+        ]
+    )
+
+def build_analysis_chain(llm: "BaseChatModel") -> Any:
+    """
+    The fused analysis chain for a model; build it once and pass it to every analyze_email call.
+    """
+    return analysis_prompt() | llm.with_structured_output(EmailAnalysis)
+
+def analyze_email(state: EmailState, llm: "BaseChatModel", cache: Optional[LLMCache] = None, chain: Any = None) -> dict:
+    """
+    Classifies, summarizes and drafts a reply for an email with one structured LLM call.
+    Returns an empty dict if the call or its output is unusable, so the caller can fall back.
+    """
+    logger.info(f"Analyzing email ID: {state.email_id} (fused mode)")
+
+    prompt = analysis_prompt()
+    if chain is None:
+        chain = build_analysis_chain(llm)
+
+    body, tokens_saved = budget_body(state, "analyze_email")
+    inputs = {
+        "sender": state.sender,
+        "subject": state.subject,
+        "body": body,
+    }
+
+    try:
+        result = EmailAnalysis(**cached_invoke(cache, prompt, llm, inputs, lambda: chain.invoke(inputs).model_dump(), namespace="analyze_email"))
+    except Exception as e:
+        logger.error(f"Error analyzing email {state.email_id}: {e}")
+        return {}
+
+    if result.category not in VALID_CATEGORIES:
+        logger.warning(f"Unusable fused analysis for email {state.email_id}: {result}")
+        return {}
+    if result.category in ("urgent", "needs_review") and not result.draft_response.strip():
+        logger.warning(f"Fused analysis for email {state.email_id} is missing a draft")
+        return {}
+
+    needs_review = result.needs_human_review or requires_review(state, result.category)
+    logger.info(f"Email {state.email_id} analyzed as: {result.category}. Needs review: {needs_review}")
+    return {
+        "category": result.category,
+        "summary": result.summary if result.category != "spam" else "",
+        "draft_response": result.draft_response if result.category in ("urgent", "needs_review") else "",
+        "needs_human_review": needs_review,
+        "tokens_saved": tokens_saved,
+    }
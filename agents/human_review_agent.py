@@ -1,12 +1,24 @@
+from typing import Optional
 from utils.logger import logger
 from core.state import EmailState
 
-def review_draft(state: EmailState) -> dict:
+def apply_review_decision(state: EmailState, action: str, edited_response: Optional[str] = None) -> dict:
     """
-    Prompts a human user to review, edit, or reject a drafted email response.
+    Turns a reviewer's decision ("approve", "edit" or "reject") into state updates.
+    Shared by the interactive prompt and the asynchronous review queue.
     """
-    logger.info(f"Awaiting human review for email ID: {state.email_id}")
-    
+    if action == "approve":
+        logger.info(f"Draft for email {state.email_id} approved by user.")
+        return {"final_response": state.draft_response, "status": "approved_for_sending"}
+    if action == "reject":
+        logger.warning(f"Draft for email {state.email_id} rejected by user.")
+        return {"final_response": None, "status": "rejected"}
+    if action == "edit":
+        logger.info(f"Draft for email {state.email_id} edited by user.")
+        return {"final_response": edited_response, "status": "approved_for_sending"}
+    raise ValueError(f"Unknown review action: {action}")
+
+def print_review(state: EmailState):
     print("\n" + "="*50)
     print("🕵️  HUMAN REVIEW REQUIRED 🕵️")
     print("="*50)
@@ -18,6 +30,46 @@ def review_draft(state: EmailState) -> dict:
     print(state.draft_response)
     print("="*50)
 
+class DraftPrinter:
+    """
+    A draft listener that prints drafts as they stream in, so the reviewer can start
+    reading before they are finished and reject them early from review.py.
+    """
+
+    def __init__(self):
+        self.current: Optional[str] = None
+
+    def __call__(self, email_id: str, chunk: str):
+        if email_id != self.current:
+            self.finish()
+            self.current = email_id
+            print(f"✍️  Drafting reply to email {email_id} (stop it with `python review.py reject {email_id}`):")
+        print(chunk, end="", flush=True)
+
+    def finish(self):
+        if self.current is not None:
+            print()
+            self.current = None
+
+def read_edited_draft() -> str:
+    print("Enter your revised draft. Press Ctrl+D (Unix) or Ctrl+Z+Enter (Windows) when done.")
+    lines = []
+    try:
+        while True:
+            line = input()
+            lines.append(line)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    return "\n".join(lines)
+
+def review_draft(state: EmailState) -> dict:
+    """
+    Prompts a human user to review, edit, or reject a drafted email response.
+    """
+    logger.info(f"Awaiting human review for email ID: {state.email_id}")
+
+    print_review(state)
+
     while True:
         action = input("Choose action: [A]pprove, [E]dit, [R]eject: ").strip().lower()
         if action in ['a', 'e', 'r']:
@@ -25,23 +77,10 @@ def review_draft(state: EmailState) -> dict:
         print("Invalid choice. Please enter 'A', 'E', or 'R'.")
 
     if action == 'a':
-        logger.info(f"Draft for email {state.email_id} approved by user.")
-        return {"final_response": state.draft_response, "status": "approved_for_sending"}
+        return apply_review_decision(state, "approve")
     elif action == 'r':
-        logger.warning(f"Draft for email {state.email_id} rejected by user.")
-        return {"final_response": None, "status": "rejected"}
+        return apply_review_decision(state, "reject")
     elif action == 'e':
-        print("Enter your revised draft. Press Ctrl+D (Unix) or Ctrl+Z+Enter (Windows) when done.")
-        lines = []
-        try:
-            while True:
-                line = input()
-                lines.append(line)
-        except (EOFError, KeyboardInterrupt):
-            pass
-        
-        edited_draft = "\n".join(lines)
-        logger.info(f"Draft for email {state.email_id} edited by user.")
-        return {"final_response": edited_draft, "status": "approved_for_sending"}
+        return apply_review_decision(state, "edit", read_edited_draft())
 
-    return {}
\ No newline at end of file
+    return {}
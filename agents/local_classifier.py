@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Sequence, Tuple
+from utils.logger import logger
+from core.state import EmailState
+import config
+
+CATEGORIES = ("spam", "urgent", "informational", "needs_review")
+TOKEN = re.compile(r"[a-z0-9']+")
+# The head of the body carries most of the signal and keeps CPU time per email flat
+MAX_TEXT_CHARS = 3000
+
+def classification_text(state: EmailState) -> str:
+    """
+    The text the local classifier sees; also stored with each LLM label as a training example.
+    """
+    domain = parseaddr(state.sender)[1].rpartition("@")[2].lower()
+    return f"domain:{domain}\n{state.subject}\n{state.cleaned_body[:MAX_TEXT_CHARS]}"
+
+def _features(text: str) -> List[str]:
+    head, _, rest = text.partition("\n")
+    words = TOKEN.findall(rest.lower())
+    return [head] + words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def _softmax(scores: List[float]) -> List[float]:
+    peak = max(scores)
+    exps = [math.exp(score - peak) for score in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+class LocalClassifier:
+    """
+    A TF-IDF + multinomial logistic regression classifier trained on past LLM labels.
+
+    It runs on CPU in well under a millisecond per email and answers only when its top
+    probability reaches the threshold; uncertain emails are escalated to the LLM.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], idf: List[float], labels: Sequence[str],
+                 weights: List[List[float]], bias: List[float], threshold: float = 0.85):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+        self.total = 0
+        self.decided = 0
+        self._lock = threading.Lock()
+
+    def _vectorize(self, text: str) -> Dict[int, float]:
+        counts = Counter(self.vocabulary[f] for f in _features(text) if f in self.vocabulary)
+        vector = {index: (1 + math.log(count)) * self.idf[index] for index, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {index: value / norm for index, value in vector.items()}
+
+    def _scores(self, vector: Dict[int, float]) -> List[float]:
+        scores = list(self.bias)
+        for index, value in vector.items():
+            row = self.weights[index]
+            for k in range(len(scores)):
+                scores[k] += row[k] * value
+        return scores
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        return dict(zip(self.labels, _softmax(self._scores(self._vectorize(text)))))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Returns the most likely category and its probability.
+        """
+        probabilities = self.predict_proba(text)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def classify(self, state: EmailState) -> Optional[str]:
+        """
+        Classifies the email if the model is confident, otherwise returns None.
+        """
+        label, confidence = self.predict(classification_text(state))
+        confident = confidence >= self.threshold
+        with self._lock:
+            self.total += 1
+            self.decided += confident
+        if not confident:
+            return None
+        logger.info(f"Email {state.email_id} classified locally as {label} ({confidence:.2f})")
+        return label
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "emails": self.total,
+                "decided_locally": self.decided,
+                "llm_calls_avoided_ratio": self.decided / self.total if self.total else 0.0,
+            }
+
+    @classmethod
+    def train(cls, examples: Sequence[Tuple[str, str]], epochs: int = 15, learning_rate: float = 0.5,
+              l2: float = 1e-5, min_df: int = 2, max_features: int = 30000, threshold: float = 0.85,
+              seed: int = 0) -> "LocalClassifier":
+        """
+        Fits the model on (text, label) pairs with plain SGD; a few thousand examples take seconds.
+        """
+        labels = sorted({label for _, label in examples})
+        if len(labels) < 2:
+            raise ValueError("Training needs examples of at least two categories")
+        document_frequency = Counter()
+        for text, _ in examples:
+            document_frequency.update(set(_features(text)))
+        kept = [f for f, df in document_frequency.most_common(max_features) if df >= min_df]
+        vocabulary = {feature: index for index, feature in enumerate(kept)}
+        idf = [math.log((1 + len(examples)) / (1 + document_frequency[f])) + 1 for f in kept]
+        model = cls(vocabulary, idf, labels, [[0.0] * len(labels) for _ in kept], [0.0] * len(labels), threshold)
+
+        data = [(model._vectorize(text), labels.index(label)) for text, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for vector, target in data:
+                probabilities = _softmax(model._scores(vector))
+                for k, p in enumerate(probabilities):
+                    gradient = p - (k == target)
+                    model.bias[k] -= rate * gradient
+                    for index, value in vector.items():
+                        row = model.weights[index]
+                        row[k] -= rate * (gradient * value + l2 * row[k])
+        return model
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"labels": self.labels, "threshold": self.threshold, "vocabulary": self.vocabulary,
+                       "idf": self.idf, "weights": self.weights, "bias": self.bias}, f)
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> "LocalClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["vocabulary"], data["idf"], data["labels"], data["weights"], data["bias"],
+                   data["threshold"] if threshold is None else threshold)
+
+def evaluate(model: LocalClassifier, examples: Sequence[Tuple[str, str]]) -> dict:
+    """
+    Compares the model with the LLM labels: overall accuracy, how many emails it would
+    answer at its threshold (coverage), accuracy on those, and CPU time per email.
+    """
+    correct = confident = confident_correct = 0
+    start = time.perf_counter()
+    for text, label in examples:
+        predicted, probability = model.predict(text)
+        correct += predicted == label
+        if probability >= model.threshold:
+            confident += 1
+            confident_correct += predicted == label
+    elapsed = time.perf_counter() - start
+    count = len(examples) or 1
+    return {
+        "examples": len(examples),
+        "accuracy": correct / count,
+        "coverage": confident / count,
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+        "ms_per_email": elapsed / count * 1e3,
+    }
+
+def get_default_classifier() -> Optional[LocalClassifier]:
+    """
+    Loads the model trained by train_classifier.py, or returns None if it is disabled or not trained yet.
+    """
+    if not config.LOCAL_CLASSIFIER_ENABLED or not os.path.exists(config.LOCAL_CLASSIFIER_PATH):
+        return None
+    try:
+        model = LocalClassifier.load(config.LOCAL_CLASSIFIER_PATH, threshold=config.LOCAL_CLASSIFIER_THRESHOLD)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not load local classifier from {config.LOCAL_CLASSIFIER_PATH}: {e}")
+        return None
+    logger.info(f"Loaded local classifier with {len(model.vocabulary)} features from {config.LOCAL_CLASSIFIER_PATH}")
+    return model
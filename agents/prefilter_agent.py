@@ -0,0 +1,123 @@
+import re
+import threading
+from collections import Counter
+from email.utils import parseaddr
+from typing import Iterable, Optional, Tuple
+from utils.logger import logger
+from core.state import EmailState
+import config
+
+SPAM_KEYWORDS = [
+    "% off", "act now", "buy now", "click here", "don't miss out", "exclusive deal", "free gift",
+    "limited time offer", "lowest price", "risk-free", "shop now", "special promotion",
+    "you've been selected", "you have been selected", "you're a winner", "congratulations, you",
+    "claim your prize", "100% free", "no credit check", "double your",
+]
+
+NOTIFICATION_KEYWORDS = [
+    "do not reply", "don't reply", "this is an automated", "automated message", "automatically generated",
+    "notification", "newsletter", "digest", "your receipt", "order confirmation", "has shipped",
+    "has been delivered", "statement is available", "invoice is here", "weekly update", "monthly update",
+]
+
+NOREPLY_SENDER = re.compile(
+    r"^(no-?reply|do-?not-?reply|notifications?|notify|mailer-daemon|newsletters?|news|updates?|alerts?|marketing)"
+    r"([+.-][^@]*)?@",
+    re.IGNORECASE,
+)
+
+BULK_PRECEDENCE = {"bulk", "list", "junk"}
+
+# Only the head of the body is scanned; bulk mail gives itself away early
+MAX_SCAN_CHARS = 5000
+
+def _compile_keywords(keywords: Iterable[str]) -> re.Pattern:
+    """
+    Compiles a keyword list into a single alternation so each text is scanned once.
+    Longer keywords come first so overlapping phrases match the most specific entry.
+    """
+    ordered = sorted({k.lower() for k in keywords}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(k) for k in ordered), re.IGNORECASE)
+
+def _parse_list(value: Optional[str]) -> set:
+    return {item.strip().lower().lstrip("@") for item in (value or "").split(",") if item.strip()}
+
+class RuleBasedPrefilter:
+    """
+    Classifies obvious spam and notifications locally so they skip the LLM classifier.
+
+    Rules only answer when they are confident; everything else returns None and is
+    handed to the LLM. Hit counts per rule are kept for measuring how many LLM calls are avoided.
+    """
+
+    def __init__(self, allowlist: Iterable[str] = (), denylist: Iterable[str] = (), spam_threshold: int = 2):
+        self.allowlist = {entry.lower().lstrip("@") for entry in allowlist}
+        self.denylist = {entry.lower().lstrip("@") for entry in denylist}
+        self.spam_threshold = spam_threshold
+        self.spam_automaton = _compile_keywords(SPAM_KEYWORDS)
+        self.notification_automaton = _compile_keywords(NOTIFICATION_KEYWORDS)
+        self.rule_hits: Counter = Counter()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "RuleBasedPrefilter":
+        return cls(
+            allowlist=_parse_list(config.PREFILTER_ALLOWLIST),
+            denylist=_parse_list(config.PREFILTER_DENYLIST),
+            spam_threshold=config.PREFILTER_SPAM_THRESHOLD,
+        )
+
+    def _matches_list(self, address: str, entries: set) -> bool:
+        domain = address.rpartition("@")[2]
+        return address in entries or any(domain == entry or domain.endswith("." + entry) for entry in entries)
+
+    def evaluate(self, state: EmailState) -> Tuple[Optional[str], str]:
+        """
+        Returns (category, rule) for the email; category is None when no rule is confident.
+        """
+        address = parseaddr(state.sender)[1].lower() or state.sender.lower()
+        headers = {name.lower(): value for name, value in state.headers.items()}
+
+        if self._matches_list(address, self.allowlist):
+            return None, "allowlist"
+        if self._matches_list(address, self.denylist):
+            return "spam", "denylist"
+
+        text = f"{state.subject}\n{state.cleaned_body[:MAX_SCAN_CHARS]}"
+        spam_hits = {m.group(0).lower() for m in self.spam_automaton.finditer(text)}
+        is_bulk = "list-unsubscribe" in headers or headers.get("precedence", "").strip().lower() in BULK_PRECEDENCE
+        is_automated = headers.get("auto-submitted", "no").strip().lower() != "no"
+        is_noreply = bool(NOREPLY_SENDER.match(address))
+
+        if len(spam_hits) >= self.spam_threshold:
+            return "spam", "spam_keywords"
+        if is_bulk and spam_hits:
+            return "spam", "bulk_spam_keywords"
+        if (is_bulk or is_automated) and is_noreply:
+            return "informational", "bulk_noreply"
+        if is_noreply and self.notification_automaton.search(text):
+            return "informational", "noreply_notification"
+        return None, "no_match"
+
+    def classify(self, state: EmailState) -> Optional[str]:
+        """
+        Classifies the email if a rule is confident, recording which rule decided.
+        """
+        category, rule = self.evaluate(state)
+        with self._lock:
+            self.total += 1
+            self.rule_hits[rule] += 1
+        if category:
+            logger.info(f"Email {state.email_id} pre-classified as {category} by rule '{rule}'")
+        return category
+
+    def stats(self) -> dict:
+        with self._lock:
+            decided = sum(hits for rule, hits in self.rule_hits.items() if rule not in ("allowlist", "no_match"))
+            return {
+                "emails": self.total,
+                "decided_locally": decided,
+                "llm_calls_avoided_ratio": decided / self.total if self.total else 0.0,
+                "rule_hits": dict(self.rule_hits),
+            }
@@ -1,19 +1,34 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_deepseek import ChatDeepSeek
+from functools import lru_cache
 from utils.logger import logger
 from core.state import EmailState
+from core.llm_cache import LLMCache, cached_invoke
+from core.draft_stream import DraftCancelled, DraftStream
+from utils.token_budget import budget_body
+from typing import TYPE_CHECKING, Any, Optional
 
-def generate_response(state: EmailState, llm: ChatDeepSeek) -> dict:
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+REVIEW_KEYWORDS = ["confirm", "password", "invoice", "urgent", "complaint", "issue"]
+# Categories that get a drafted reply; the others are processed without one
+DRAFT_CATEGORIES = ("urgent", "needs_review")
+
+def needs_draft(state: EmailState) -> bool:
+    return state.category in DRAFT_CATEGORIES
+
+def requires_review(state: EmailState, category: str) -> bool:
     """
-    Generates a draft response for an email based on its content and summary.
+    Simple logic to decide if a draft needs human review. More complex logic can be added.
     """
-    if state.category not in ["urgent", "needs_review"]:
-        logger.info(f"Skipping response generation for email ID: {state.email_id} (Category: {state.category})")
-        return {"status": "processed"}
+    # Always flag 'needs_review' category for review
+    if category == "needs_review":
+        return True
+    return any(keyword in state.subject.lower() or keyword in state.cleaned_body.lower() for keyword in REVIEW_KEYWORDS)
 
-    logger.info(f"Generating response for email ID: {state.email_id}")
-    
-    prompt = ChatPromptTemplate.from_messages(
+@lru_cache(maxsize=None)
+def response_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(
         [
             ("system", 
              "You are a professional and helpful email assistant. Your task is to draft a response to the following email. "
@@ -32,28 +47,74 @@ def generate_response(state: EmailState, llm: ChatDeepSeek) -> dict:
             ),
         ]
     )
-    
-    chain = prompt | llm
+
+def build_response_chain(llm: "BaseChatModel") -> Any:
+    """
+    The drafting chain for a model; build it once and pass it to every generate_response call.
+    """
+    return response_prompt() | llm
+
+def stream_draft(chain: Any, inputs: dict, stream: DraftStream) -> str:
+    """
+    Streams the draft into `stream` chunk by chunk and returns the whole text.
+    Raises DraftCancelled as soon as the stream is cancelled; leaving the loop closes
+    the model's stream, so generation stops instead of running to the end.
+    """
+    for chunk in chain.stream(inputs):
+        if stream.cancelled():
+            raise DraftCancelled()
+        stream.write(chunk.content)
+    if stream.cancelled():
+        raise DraftCancelled()
+    return stream.text
+
+def generate_response(state: EmailState, llm: "BaseChatModel", cache: Optional[LLMCache] = None, chain: Any = None,
+                      stream: Optional[DraftStream] = None) -> dict:
+    """
+    Generates a draft response for an email based on its content and summary.
+    With a DraftStream the draft is streamed into it as it is generated and can be cancelled.
+    """
+    if not needs_draft(state):
+        logger.info(f"Skipping response generation for email ID: {state.email_id} (Category: {state.category})")
+        return {"status": "processed"}
+
+    logger.info(f"Generating response for email ID: {state.email_id}")
+
+    prompt = response_prompt()
+    if chain is None:
+        chain = build_response_chain(llm)
+
+    body, tokens_saved = budget_body(state, "generate_response")
+    inputs = {
+        "sender": state.sender,
+        "subject": state.subject,
+        "body": body,
+        "summary": state.summary
+    }
+
+    if stream is None:
+        compute = lambda: chain.invoke(inputs).content
+    else:
+        compute = lambda: stream_draft(chain, inputs, stream)
 
     try:
-        response = chain.invoke({
-            "sender": state.sender,
-            "subject": state.subject,
-            "body": state.cleaned_body,
-            "summary": state.summary
-        })
-        draft = response.content
-
-        # Simple logic to decide if review is needed. More complex logic can be added.
-        review_keywords = ["confirm", "password", "invoice", "urgent", "complaint", "issue"]
-        needs_review = any(keyword in state.subject.lower() or keyword in state.cleaned_body.lower() for keyword in review_keywords)
-        
-        # Always flag 'needs_review' category for review
-        if state.category == "needs_review":
-            needs_review = True
-            
+        draft = cached_invoke(cache, prompt, llm, inputs, compute, namespace="generate_response")
+        if stream is not None:
+            if not stream.chunks:
+                # Cache hit: the reviewer still sees the draft, all at once
+                stream.write(draft)
+            stream.close("complete")
+
+        needs_review = requires_review(state, state.category)
+
         logger.info(f"Generated draft for email {state.email_id}. Needs review: {needs_review}")
-        return {"draft_response": draft, "needs_human_review": needs_review}
+        return {"draft_response": draft, "needs_human_review": needs_review, "tokens_saved": tokens_saved}
+    except DraftCancelled:
+        logger.warning(f"Draft generation for email {state.email_id} stopped: rejected by the reviewer.")
+        stream.close("cancelled")
+        return {"draft_response": stream.text, "cancelled": True, "tokens_saved": tokens_saved}
     except Exception as e:
         logger.error(f"Error generating response for email {state.email_id}: {e}")
-        return {"draft_response": "Error during response generation.", "needs_human_review": True}
\ No newline at end of file
+        if stream is not None:
+            stream.close("failed")
+        return {"error": f"response generation failed: {e}"}
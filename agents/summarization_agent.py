@@ -1,11 +1,44 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_deepseek import ChatDeepSeek
+from functools import lru_cache
 from utils.logger import logger
 from core.state import EmailState
+from core.llm_cache import LLMCache, cached_invoke
+from utils.token_budget import budget_body
+from typing import TYPE_CHECKING, Any, Optional
 
-def summarize_email(state: EmailState, llm: ChatDeepSeek) -> dict:
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+@lru_cache(maxsize=None)
+def summary_prompt(threaded: bool):
+    from langchain_core.prompts import ChatPromptTemplate
+    if threaded:
+        return ChatPromptTemplate.from_messages(
+            [
+                ("system", "You are an expert at summarizing email conversations. Given the summary of the conversation so far and its newest message, "
+                           "generate a concise, 2-3 sentence summary of the whole conversation that highlights what the newest message adds or asks."),
+                ("human", "Conversation so far:\n{thread_summary}\n\nNewest message:\n{body}"),
+            ]
+        )
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are an expert at summarizing emails. Generate a concise, 2-3 sentence summary of the following email content."),
+            ("human", "Email Body:\n{body}"),
+        ]
+    )
+
+def build_summary_chain(llm: "BaseChatModel") -> Any:
     """
-    Summarizes the content of an email.
+    The summarization chain for a model; it picks the thread-aware prompt when the
+    inputs carry a thread summary. Build it once and pass it to every summarize_email call.
+    """
+    from langchain_core.runnables import RunnableLambda
+    return RunnableLambda(lambda inputs: summary_prompt("thread_summary" in inputs)) | llm
+
+def summarize_email(state: EmailState, llm: "BaseChatModel", cache: Optional[LLMCache] = None, chain: Any = None) -> dict:
+    """
+    Summarizes the content of an email. For a reply in a known thread, the previous
+    thread summary stands in for the quoted history, so the prompt stays the same size
+    however long the conversation grows.
     """
     if state.category == "spam":
         logger.info(f"Skipping summarization for spam email ID: {state.email_id}")
@@ -13,20 +46,18 @@ def summarize_email(state: EmailState, llm: ChatDeepSeek) -> dict:
 
     logger.info(f"Summarizing email ID: {state.email_id}")
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", "You are an expert at summarizing emails. Generate a concise, 2-3 sentence summary of the following email content."),
-            ("human", "Email Body:\n{body}"),
-        ]
-    )
+    prompt = summary_prompt(bool(state.thread_summary))
+    if chain is None:
+        chain = build_summary_chain(llm)
 
-    chain = prompt | llm
-    
     try:
-        response = chain.invoke({"body": state.cleaned_body})
-        summary = response.content
+        body, tokens_saved = budget_body(state, "summarize_email")
+        inputs = {"body": body}
+        if state.thread_summary:
+            inputs["thread_summary"] = state.thread_summary
+        summary = cached_invoke(cache, prompt, llm, inputs, lambda: chain.invoke(inputs).content, namespace="summarize_email")
         logger.info(f"Generated summary for email {state.email_id}: {summary}")
-        return {"summary": summary}
+        return {"summary": summary, "tokens_saved": tokens_saved}
     except Exception as e:
         logger.error(f"Error summarizing email {state.email_id}: {e}")
-        return {"summary": "Error during summarization."}
\ No newline at end of file
+        return {"error": f"summarization failed: {e}"}
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Benchmark of the local email classifier against the LLM labels it is trained on.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_classifier [--cache llm_cache.sqlite3] [--size N]
+
+With --cache, the labeled examples recorded by earlier runs are used, so the accuracy
+reported is agreement with DeepSeek on your own mail. Without it, a synthetic labeled
+corpus is generated in which a quarter of the emails mix two categories. The report shows
+accuracy, the share of emails answered locally at several thresholds, and the CPU time
+per email next to the typical latency of one LLM classification call.
+"""
+import argparse
+import random
+import time
+from agents.local_classifier import LocalClassifier, evaluate
+from core.llm_cache import LLMCache
+from train_classifier import split_examples
+
+# Typical wall-clock time of a DeepSeek structured-output call, for comparison
+LLM_CALL_MS = 1200
+
+TEMPLATES = {
+    "spam": ["Exclusive deal just for you, save {n}% on {thing} today", "You have been selected for a free {thing}, claim now",
+             "Lowest price on {thing} guaranteed, limited stock"],
+    "urgent": ["The {thing} is down in production, customers cannot log in, please call me", "Need your approval on the {thing} contract before 5pm today",
+               "Server outage affecting {thing}, escalating now"],
+    "informational": ["Your {thing} order has shipped and will arrive Tuesday", "Weekly update: the {thing} team finished the migration",
+                      "Reminder that the office is closed on Monday, {thing} resumes Tuesday"],
+    "needs_review": ["I would like to discuss a partnership around {thing} and pricing for {n} seats", "Legal question about the {thing} agreement and liability clauses",
+                     "Can you explain the refund policy for {thing} bought {n} months ago"],
+}
+THINGS = ["billing portal", "analytics dashboard", "laptop", "API", "conference tickets", "VPN", "subscription", "invoice"]
+FILLER = "thanks please let me know regards team account today update message".split()
+
+def synthetic_examples(size: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    examples = []
+    for i in range(size):
+        label = rng.choice(list(TEMPLATES))
+        text = rng.choice(TEMPLATES[label]).format(n=rng.randint(2, 90), thing=rng.choice(THINGS))
+        if rng.random() < 0.25:
+            # Mixed emails that even the LLM labels inconsistently
+            other = rng.choice([c for c in TEMPLATES if c != label])
+            text += ". " + rng.choice(TEMPLATES[other]).format(n=rng.randint(2, 90), thing=rng.choice(THINGS))
+            if rng.random() < 0.4:
+                label = other
+        noise = " ".join(rng.choice(FILLER) for _ in range(rng.randint(5, 30)))
+        domain = rng.choice(["example.com", "mail.example.org", f"shop{i % 7}.example.net"])
+        examples.append((f"domain:{domain}\nsubject {i}\n{text}. {noise}", label))
+    return examples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache", help="LLM cache database with labeled examples")
+    parser.add_argument("--size", type=int, default=2000, help="Synthetic corpus size")
+    args = parser.parse_args()
+
+    if args.cache:
+        cache = LLMCache(args.cache)
+        examples = cache.examples("filter_email")
+        cache.close()
+    else:
+        examples = synthetic_examples(args.size)
+    train, test = split_examples(examples, 0.2)
+    print(f"Examples: {len(train)} train, {len(test)} test")
+
+    start = time.perf_counter()
+    model = LocalClassifier.train(train)
+    print(f"Training: {time.perf_counter() - start:.2f} s, {len(model.vocabulary)} features")
+
+    print(f"\n{'threshold':>10}{'accuracy':>10}{'local %':>10}{'agree %':>10}{'ms/email':>10}{'LLM ms saved/email':>20}")
+    for threshold in (0.6, 0.7, 0.8, 0.85, 0.9, 0.95):
+        model.threshold = threshold
+        report = evaluate(model, test)
+        saved = report["coverage"] * LLM_CALL_MS - report["ms_per_email"]
+        print(f"{threshold:>10.2f}{report['accuracy']:>10.1%}{report['coverage']:>10.1%}"
+              f"{report['confident_accuracy']:>10.1%}{report['ms_per_email']:>10.3f}{saved:>20.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Micro-benchmark for utils.formatter.clean_email_body against the previous
+BeautifulSoup-based cleaner.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_cleaner [corpus_dir] [--repeat N]
+
+corpus_dir may contain .html, .txt or .eml files (e.g. a "Save as" export of real
+newsletters and replies). Without it, a synthetic corpus of marketing HTML,
+reply chains and plain-text mail is used.
+"""
+import argparse
+import email
+import os
+import re
+import time
+from email import policy
+from bs4 import BeautifulSoup
+from utils.formatter import clean_email_body
+
+def baseline_clean(body: str) -> str:
+    """The original cleaner: BeautifulSoup on every body, then two regex passes."""
+    if not body:
+        return ""
+    text = BeautifulSoup(body, "html.parser").get_text()
+    text = re.sub(r'\s*\n\s*', '\n', text).strip()
+    return re.sub(r'[ \t]{2,}', ' ', text)
+
+def _marketing_html(i: int) -> str:
+    style = "".join(f".c{j}{{color:#{j:06x};padding:{j}px}}" for j in range(200))
+    rows = "".join(
+        f'<tr><td style="padding:8px"><img src="https://cdn.example.com/p{j}.png" width="120"></td>'
+        f'<td><a href="https://example.com/p/{j}?utm_source=mail&amp;id={i}">Product {j}</a> &mdash; '
+        f'<b>${j * 3}.99</b> <span class="c{j}">Save {j}%</span></td></tr>'
+        for j in range(40)
+    )
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Deals {i}</title><style>{style}</style>"
+        f"<script>window.dataLayer=[{i}];</script></head><body><table width='600'>{rows}</table>"
+        f"<p>You are receiving this because you subscribed. <a href='#'>Unsubscribe</a></p>"
+        f"<img src='https://t.example.com/open/{i}.gif' width='1' height='1'></body></html>"
+    )
+
+def _reply_chain_html(i: int) -> str:
+    quoted = "".join(f"<p>Earlier message {j} in the thread with some details.</p>" for j in range(30))
+    return (
+        f'<div dir="ltr">Thanks, that works for me. Ticket #{i}.</div><br>'
+        f'<div class="gmail_quote"><div class="gmail_attr">On Mon, Bob wrote:</div>'
+        f'<blockquote class="gmail_quote">{quoted}</blockquote></div>'
+    )
+
+def _plain_reply(i: int) -> str:
+    quoted = "\n".join(f"> line {j} of the previous message" for j in range(60))
+    return f"Hi,\n\nCan we move the call to Thursday? ({i})\n\nBest,\nAnna\n\nOn Tue, 8 Jul 2025, Tom wrote:\n{quoted}"
+
+def synthetic_corpus(size: int = 300) -> list:
+    makers = [_marketing_html, _reply_chain_html, _plain_reply,
+              lambda i: f"Reminder {i}: the deadline for the Phoenix project is Friday. Let me know about blockers."]
+    return [makers[i % len(makers)](i) for i in range(size)]
+
+def load_corpus(directory: str) -> list:
+    bodies = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        with open(path, "rb") as f:
+            raw = f.read()
+        if name.endswith(".eml"):
+            msg = email.message_from_bytes(raw, policy=policy.default)
+            part = msg.get_body(preferencelist=("html", "plain"))
+            bodies.append(part.get_content() if part else "")
+        elif name.endswith((".html", ".htm", ".txt")):
+            bodies.append(raw.decode("utf-8", errors="replace"))
+    return bodies
+
+def measure(cleaner, corpus: list, repeat: int) -> tuple:
+    best = float("inf")
+    output_chars = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [cleaner(body) for body in corpus]
+        best = min(best, time.perf_counter() - start)
+        output_chars = sum(len(text) for text in outputs)
+    return best, output_chars
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus_dir", nargs="?")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus_dir) if args.corpus_dir else synthetic_corpus()
+    input_mb = sum(len(body.encode("utf-8")) for body in corpus) / 1e6
+    print(f"Corpus: {len(corpus)} bodies, {input_mb:.2f} MB")
+
+    results = {
+        "baseline (bs4)": measure(baseline_clean, corpus, args.repeat),
+        "clean_email_body": measure(clean_email_body, corpus, args.repeat),
+    }
+    print(f"\n{'cleaner':<20}{'total ms':>12}{'us/email':>12}{'MB/s':>10}{'out chars':>12}{'~tokens':>10}")
+    for name, (seconds, chars) in results.items():
+        print(f"{name:<20}{seconds * 1e3:>12.1f}{seconds / len(corpus) * 1e6:>12.1f}"
+              f"{input_mb / seconds:>10.1f}{chars:>12}{chars // 4:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Side-by-side benchmark of the fused (single-call) graph against the three-node pipeline.
+
+Usage (from the repository root, requires DEEPSEEK_API_KEY):
+    python -m benchmarks.bench_fused [path/to/emails.json]
+"""
+import sys
+import time
+from statistics import mean
+from langchain_core.callbacks import BaseCallbackHandler
+from core.email_ingestion import load_emails_from_json
+from core.supervisor import EmailSupervisor
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Accumulates LLM call counts and token usage reported by the model."""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        self.calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+def run_mode(fused: bool, file_path: str) -> dict:
+    supervisor = EmailSupervisor(fused=fused)
+    # Review is deferred so the benchmark never blocks on input()
+    workflow = supervisor.build_graph(defer_review=True)
+    usage = TokenUsageHandler()
+    # Set on the underlying model so structured-output calls through the LLM client are counted too
+    getattr(supervisor.llm, "model", supervisor.llm).callbacks = [usage]
+
+    latencies = []
+    categories = {}
+    for email in load_emails_from_json(file_path):
+        start = time.perf_counter()
+        final_state = workflow.invoke({"email_state": email})
+        latencies.append(time.perf_counter() - start)
+        categories[email.email_id] = final_state['email_state'].category
+
+    return {
+        "emails": len(latencies),
+        "total_s": sum(latencies),
+        "mean_s": mean(latencies) if latencies else 0.0,
+        "max_s": max(latencies) if latencies else 0.0,
+        "llm_calls": usage.calls,
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "categories": categories,
+    }
+
+def main():
+    file_path = sys.argv[1] if len(sys.argv) > 1 else "sample_emails.json"
+    results = {"three-node": run_mode(False, file_path), "fused": run_mode(True, file_path)}
+
+    rows = ["emails", "total_s", "mean_s", "max_s", "llm_calls", "input_tokens", "output_tokens"]
+    print(f"\n{'metric':<15}{'three-node':>14}{'fused':>14}")
+    for row in rows:
+        baseline, fused = results["three-node"][row], results["fused"][row]
+        fmt = "{:>14.2f}" if isinstance(baseline, float) else "{:>14}"
+        print(f"{row:<15}" + fmt.format(baseline) + fmt.format(fused))
+
+    disagreements = [
+        email_id for email_id, category in results["three-node"]["categories"].items()
+        if results["fused"]["categories"].get(email_id) != category
+    ]
+    print(f"\nCategory disagreements: {len(disagreements)} {disagreements if disagreements else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares the materialized JSON loader with the streaming one: time to the first email and
+peak traced memory while walking an export of --emails messages.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_ingestion [--emails 20000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from benchmarks.bench_cleaner import synthetic_corpus
+from core import email_ingestion
+
+def write_export(path: str, count: int):
+    bodies = synthetic_corpus(200)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(count):
+            item = {"email_id": f"bench-{i}", "sender": "a@example.com", "subject": f"Message {i}", "body": bodies[i % len(bodies)]}
+            f.write(("," if i else "") + json.dumps(item) + "\n")
+        f.write("]\n")
+
+def measure(load, path: str) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in load(path):
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, first, total, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.json")
+        write_export(path, args.emails)
+        print(f"Export: {args.emails} emails, {os.path.getsize(path) / 1e6:.1f} MB\n")
+        print(f"{'loader':<24}{'first (ms)':>12}{'total (s)':>12}{'peak MB':>10}")
+        for name, load in (("load_emails_from_json", email_ingestion.load_emails_from_json),
+                           ("iter_emails_from_json", email_ingestion.iter_emails_from_json)):
+            count, first, total, peak = measure(load, path)
+            assert count == args.emails
+            print(f"{name:<24}{first * 1e3:>12.1f}{total:>12.2f}{peak / 1e6:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-email latency of the serial graph (filter -> summarize -> draft) against the parallel
+topology, where summarize_email runs alongside filter_email and is discarded for spam.
+
+Runs offline on a synthetic mailbox with the fake chat model, so the saving shown is
+the LLM latency taken off the critical path, and the extra calls are the summaries
+wasted on spam.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parallel [--size 200] [--llm-latency 0.2] [--spam-ratio 0.2] [--json out.json]
+"""
+import argparse
+import json
+import tempfile
+from statistics import mean
+
+from benchmarks.bench_pipeline import LatencyRecorder, configure, percentile
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.mailbox import generate_mailbox, write_json_export
+from core import supervisor as supervisor_module
+from core.email_ingestion import iter_emails_from_json
+from core.supervisor import EmailSupervisor, SPECULATIVE_SUMMARIES
+
+def run_mode(emails: list, args, parallel: bool) -> dict:
+    llm = FakeChatModel(latency=args.llm_latency, jitter=args.llm_jitter, output_tokens=args.output_tokens)
+    supervisor = EmailSupervisor(fused=False, llm=llm, parallel=parallel)
+    # Deferred review so the run never stops at an input() prompt
+    supervisor.workflow = supervisor.build_graph(defer_review=True)
+    email_timer = LatencyRecorder()
+    original_timer = supervisor_module.EMAIL_SECONDS
+    supervisor_module.EMAIL_SECONDS = email_timer
+    discarded_before = SPECULATIVE_SUMMARIES.value(outcome="discarded")
+    try:
+        for email in emails:
+            supervisor.process_email(email.model_copy(deep=True))
+    finally:
+        supervisor_module.EMAIL_SECONDS = original_timer
+
+    latencies = [sample for samples in email_timer.samples.values() for sample in samples]
+    return {
+        "mean_ms": mean(latencies) * 1e3 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "llm_calls": llm.calls,
+        "discarded_summaries": SPECULATIVE_SUMMARIES.value(outcome="discarded") - discarded_before,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--spam-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="Latency variation as a fraction")
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    messages = generate_mailbox(args.size, spam_ratio=args.spam_ratio, seed=args.seed)
+    with tempfile.TemporaryDirectory() as state_dir:
+        # Deduplication would hide the difference; every email goes through the graph
+        configure(state_dir, dedup=False)
+        path = f"{state_dir}/export.json"
+        write_json_export(path, messages)
+        emails = list(iter_emails_from_json(path))
+        results = {"serial": run_mode(emails, args, parallel=False), "parallel": run_mode(emails, args, parallel=True)}
+
+    serial, parallel = results["serial"], results["parallel"]
+    print(f"{args.size} emails, fake LLM {args.llm_latency * 1e3:.0f} ms/call, spam {args.spam_ratio:.0%}\n")
+    print(f"{'metric':<22}{'serial':>12}{'parallel':>12}")
+    for row in ("mean_ms", "p50_ms", "p99_ms", "llm_calls", "discarded_summaries"):
+        print(f"{row:<22}{serial[row]:>12.1f}{parallel[row]:>12.1f}")
+    saved = serial["mean_ms"] - parallel["mean_ms"]
+    share = saved / serial["mean_ms"] if serial["mean_ms"] else 0.0
+    print(f"\nParallel saves {saved:.1f} ms per email on average ({share:.0%}) "
+          f"for {parallel['llm_calls'] - serial['llm_calls']} extra LLM calls.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
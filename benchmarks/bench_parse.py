@@ -0,0 +1,70 @@
+"""
+Measures a large initial IMAP pull with inline parsing vs. the process-pool parse pipeline.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parse [--messages 5000] [--workers 4] [--latency-ms 20]
+
+Messages come from the in-memory IMAP stand-in; --latency-ms adds a simulated network
+round-trip to every FETCH so the overlap between download and parsing is visible.
+"""
+import argparse
+import os
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from benchmarks.bench_cleaner import synthetic_corpus
+from benchmarks.imap_standin import FakeIMAPServer
+from core import email_imap
+
+def build_mailbox(count: int) -> FakeIMAPServer:
+    server = FakeIMAPServer()
+    bodies = synthetic_corpus(min(count, 400))
+    for i in range(count):
+        body = bodies[i % len(bodies)]
+        msg = MIMEMultipart("alternative")
+        msg["From"] = f"sender{i % 97}@example.com"
+        msg["Subject"] = f"Message {i}"
+        msg.attach(MIMEText(body if not body.startswith("<") else "See the HTML version.", "plain", "utf-8"))
+        msg.attach(MIMEText(body, "html", "utf-8"))
+        server.add_raw(msg.as_bytes())
+    return server
+
+class _SlowConnection:
+    """Adds a fixed delay to every UID command, like a remote server would."""
+
+    def __init__(self, mail, latency: float):
+        self.mail = mail
+        self.latency = latency
+
+    def uid(self, *args):
+        time.sleep(self.latency)
+        return self.mail.uid(*args)
+
+def run(server: FakeIMAPServer, workers: int, latency: float, header_first: bool) -> float:
+    mail = _SlowConnection(server.connect(), latency)
+    uids = sorted(server.messages)
+    start = time.perf_counter()
+    emails = email_imap.fetch_emails_by_uid(mail, uids, header_first=header_first, parse_workers=workers)
+    elapsed = time.perf_counter() - start
+    assert len(emails) == len(uids)
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = build_mailbox(args.messages)
+    latency = args.latency_ms / 1000
+    print(f"{args.messages} messages, {os.cpu_count()} CPUs, {args.latency_ms:.0f} ms per FETCH\n")
+    print(f"{'mode':<14}{'workers':>8}{'seconds':>10}{'emails/s':>10}")
+    for header_first in (False, True):
+        mode = "header-first" if header_first else "full"
+        for workers in (1, args.workers):
+            seconds = run(server, workers, latency, header_first)
+            print(f"{mode:<14}{workers:>8}{seconds:>10.2f}{args.messages / seconds:>10.0f}")
+
+if __name__ == "__main__":
+    main()
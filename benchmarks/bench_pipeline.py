@@ -0,0 +1,183 @@
+"""
+End-to-end benchmark of MailMind on a synthetic mailbox, fully offline and reproducible.
+
+A seeded mailbox is served from the in-memory IMAP stand-in and ChatDeepSeek is replaced
+by a fake chat model with configurable latency and output length. The report covers:
+  - ingestion: IMAP full and header-first fetch, and the streaming JSON loader
+  - processing: EmailSupervisor.process_email one email at a time, and iter_process with
+    --concurrency workers
+with emails/sec, p50/p99 per-email and per-node latency, LLM calls and peak traced memory.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline [--size 500] [--html-ratio 0.3] [--thread-ratio 0.2]
+        [--spam-ratio 0.2] [--llm-latency 0.05] [--output-tokens 60] [--concurrency 8] [--json out.json]
+
+Compare the --json output of two commits to catch performance regressions. Peak memory is
+measured with tracemalloc, which slows down CPU-bound phases; pass --no-trace-memory to
+time them without it.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+import config
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.imap_standin import FakeIMAPServer
+from benchmarks.mailbox import generate_mailbox, load_into, write_json_export
+from core import supervisor as supervisor_module
+from core.email_imap import fetch_emails_by_uid
+from core.email_ingestion import iter_emails_from_json
+from core.supervisor import EmailSupervisor
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class LatencyRecorder:
+    """Collects raw latencies in place of one of the supervisor's bucketed histograms."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[next(iter(labels.values()))].append(time.perf_counter() - start)
+
+@contextmanager
+def measured(result: dict, count: int, trace_memory: bool):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        result["seconds"] = elapsed
+        result["emails_per_s"] = count / elapsed if elapsed else 0.0
+        if trace_memory:
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+
+def configure(state_dir: str, dedup: bool):
+    """Keeps every on-disk store in a scratch directory and turns off caching across runs."""
+    config.LLM_CACHE_ENABLED = False  # every email must reach the (fake) model
+    config.CHECKPOINT_ENABLED = False
+    config.DEDUP_ENABLED = dedup
+    config.REVIEW_MODE = "queue"
+    for name in ("LLM_CACHE_PATH", "CHECKPOINT_PATH", "REVIEW_QUEUE_PATH", "DEDUP_PATH", "THREAD_STORE_PATH", "OUTBOX_PATH",
+                 "WORK_QUEUE_PATH"):
+        setattr(config, name, os.path.join(state_dir, f"{name.lower()}.sqlite3"))
+    config.LOCAL_CLASSIFIER_PATH = os.path.join(state_dir, "local_classifier.json")
+    config.DRAFT_STREAM_DIR = os.path.join(state_dir, "drafts")
+
+def bench_ingestion(messages: list, state_dir: str, trace_memory: bool) -> tuple:
+    server = FakeIMAPServer()
+    uids = load_into(server, messages)
+    results = {}
+    emails = []
+    for name, header_first in (("imap_full", False), ("imap_header_first", True)):
+        connection = server.connect()
+        connection.select("INBOX")
+        results[name] = {}
+        with measured(results[name], len(uids), trace_memory):
+            emails = fetch_emails_by_uid(connection, uids, header_first=header_first)
+        assert len(emails) == len(uids)
+
+    path = os.path.join(state_dir, "export.json")
+    write_json_export(path, messages)
+    results["json_stream"] = {}
+    with measured(results["json_stream"], len(messages), trace_memory):
+        count = sum(1 for _ in iter_emails_from_json(path))
+    assert count == len(messages)
+    return results, emails
+
+def bench_processing(emails: list, args, mode: str) -> dict:
+    llm = FakeChatModel(latency=args.llm_latency, jitter=args.llm_jitter, output_tokens=args.output_tokens)
+    supervisor = EmailSupervisor(fused=args.fused, llm=llm)
+    node_timer, email_timer = LatencyRecorder(), LatencyRecorder()
+    original_timers = supervisor_module.NODE_SECONDS, supervisor_module.EMAIL_SECONDS
+    supervisor_module.NODE_SECONDS, supervisor_module.EMAIL_SECONDS = node_timer, email_timer
+    result = {}
+    try:
+        if mode == "process_email":
+            # Deferred review so the run never stops at an input() prompt
+            supervisor.workflow = supervisor.build_graph(defer_review=True)
+            with measured(result, len(emails), args.trace_memory):
+                for email in emails:
+                    supervisor.process_email(email.model_copy(deep=True))
+        else:
+            with measured(result, len(emails), args.trace_memory):
+                for _ in supervisor.iter_process((email.model_copy(deep=True) for email in emails),
+                                                 max_concurrency=args.concurrency, interactive_review=False):
+                    pass
+    finally:
+        supervisor_module.NODE_SECONDS, supervisor_module.EMAIL_SECONDS = original_timers
+
+    per_email = [sample for samples in email_timer.samples.values() for sample in samples]
+    result["email_p50_ms"] = percentile(per_email, 0.50) * 1e3
+    result["email_p99_ms"] = percentile(per_email, 0.99) * 1e3
+    result["llm_calls"] = llm.calls
+    result["llm_calls_per_email"] = llm.calls / len(emails) if emails else 0.0
+    result["nodes"] = {
+        node: {"calls": len(samples), "p50_ms": percentile(samples, 0.50) * 1e3, "p99_ms": percentile(samples, 0.99) * 1e3}
+        for node, samples in sorted(node_timer.samples.items())
+    }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--html-ratio", type=float, default=0.3)
+    parser.add_argument("--thread-ratio", type=float, default=0.2)
+    parser.add_argument("--spam-ratio", type=float, default=0.2)
+    parser.add_argument("--thread-depth", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="Latency variation as a fraction")
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fused", action="store_true", help="Benchmark the single-call fused graph")
+    parser.add_argument("--dedup", action="store_true", help="Keep near-duplicate detection on")
+    parser.add_argument("--no-trace-memory", dest="trace_memory", action="store_false")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    messages = generate_mailbox(args.size, html_ratio=args.html_ratio, thread_ratio=args.thread_ratio,
+                                spam_ratio=args.spam_ratio, thread_depth=args.thread_depth, seed=args.seed)
+    with tempfile.TemporaryDirectory() as state_dir:
+        configure(state_dir, args.dedup)
+        ingestion, emails = bench_ingestion(messages, state_dir, args.trace_memory)
+        processing = {
+            "process_email": bench_processing(emails, args, "process_email"),
+            f"iter_process x{args.concurrency}": bench_processing(emails, args, "iter_process"),
+        }
+
+    print(f"Mailbox: {args.size} emails (html {args.html_ratio:.0%}, threads {args.thread_ratio:.0%}, spam {args.spam_ratio:.0%}), "
+          f"fake LLM {args.llm_latency * 1e3:.0f} ms/call, {args.output_tokens} tokens\n")
+    print(f"{'ingestion':<24}{'emails/s':>12}{'seconds':>10}{'peak MB':>10}")
+    for name, row in ingestion.items():
+        print(f"{name:<24}{row['emails_per_s']:>12.0f}{row['seconds']:>10.2f}{row.get('peak_mb', 0.0):>10.1f}")
+    print(f"\n{'processing':<24}{'emails/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'LLM/email':>11}{'peak MB':>10}")
+    for name, row in processing.items():
+        print(f"{name:<24}{row['emails_per_s']:>12.1f}{row['email_p50_ms']:>10.1f}{row['email_p99_ms']:>10.1f}"
+              f"{row['llm_calls_per_email']:>11.2f}{row.get('peak_mb', 0.0):>10.1f}")
+        for node, stats in row["nodes"].items():
+            print(f"  {node:<22}{stats['calls']:>12}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "ingestion": ingestion, "processing": processing}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Startup time and per-call overhead.
+
+Startup: each snippet runs in a fresh interpreter (in a scratch directory, so no state
+files are touched) and the median wall time over --repeat runs is reported. Python's own
+startup is measured too and can be subtracted.
+
+Per-call overhead: filter_email, summarize_email and generate_response are timed against
+a zero-latency fake model with no cache, once with the chain the supervisor builds once
+and reuses, and once building the chain on every call (prompt templates are built once
+per process either way).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [--repeat 5] [--calls 500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    "python": "pass",
+    "import config": "import config",
+    "import core.supervisor": "import core.supervisor",
+    "import main": "import main",
+    "EmailSupervisor(llm=fake)": (
+        "from benchmarks.fake_llm import FakeChatModel\n"
+        "from core.supervisor import EmailSupervisor\n"
+        "EmailSupervisor(fused=False, llm=FakeChatModel())"
+    ),
+    "first email (fake LLM)": (
+        "from benchmarks.fake_llm import FakeChatModel\n"
+        "from core.state import EmailState\n"
+        "from core.supervisor import EmailSupervisor\n"
+        "supervisor = EmailSupervisor(fused=False, llm=FakeChatModel())\n"
+        "supervisor.workflow = supervisor.build_graph(defer_review=True)\n"
+        "supervisor.process_email(EmailState(email_id='1', subject='Hi', sender='a@example.com',"
+        " body='Can we meet on Thursday?', cleaned_body='Can we meet on Thursday?'))"
+    ),
+}
+
+def time_snippet(code: str, repeat: int) -> float:
+    env = dict(os.environ, PYTHONPATH=ROOT, SCHEDULER_ENABLED="false", METRICS_PORT="0")
+    samples = []
+    for _ in range(repeat):
+        # A fresh directory each time, so no run finds the state files of the previous one
+        with tempfile.TemporaryDirectory() as scratch:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=scratch, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+    return median(samples)
+
+def per_call_overhead(calls: int) -> dict:
+    from benchmarks.fake_llm import FakeChatModel
+    from agents.filtering_agent import filter_email, build_filter_chain
+    from agents.summarization_agent import summarize_email, build_summary_chain
+    from agents.response_agent import generate_response, build_response_chain
+    from core.state import EmailState
+
+    llm = FakeChatModel(output_tokens=5)
+    email = EmailState(email_id="1", subject="Hi", sender="a@example.com", category="urgent",
+                       body="Can we meet on Thursday?", cleaned_body="Can we meet on Thursday?")
+    results = {}
+    for name, run, build in (("filter_email", filter_email, build_filter_chain),
+                             ("summarize_email", summarize_email, build_summary_chain),
+                             ("generate_response", generate_response, build_response_chain)):
+        chain = build(llm)
+        run(email, llm, chain=chain)  # warm up lazy imports and prompt construction
+        row = {}
+        for mode, kwargs in (("reused_chain", {"chain": chain}), ("chain_per_call", {})):
+            start = time.perf_counter()
+            for _ in range(calls):
+                run(email, llm, **kwargs)
+            row[mode] = (time.perf_counter() - start) / calls * 1e6
+        results[name] = row
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'startup (median of ' + str(args.repeat) + ')':<32}{'ms':>10}")
+    for name, code in SNIPPETS.items():
+        print(f"{name:<32}{time_snippet(code, args.repeat) * 1e3:>10.0f}")
+
+    import logging
+    logging.disable(logging.INFO)  # agents log every call
+    print(f"\n{'per call (zero-latency model)':<32}{'reused us':>12}{'per-call us':>14}")
+    for name, row in per_call_overhead(args.calls).items():
+        print(f"{name:<32}{row['reused_chain']:>12.0f}{row['chain_per_call']:>14.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput of workers.py against the number of worker processes, fully offline.
+
+A synthetic mailbox is spread over --accounts accounts and enqueued in a fresh work
+queue, then 1, 2, 4, ... worker processes (each with its own EmailSupervisor and fake
+chat model) drain it. The report shows emails/min (worker start-up included) and the
+speedup over one worker, and checks that every email was completed exactly once: no
+job leased twice, none left over.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_workers [--size 300] [--accounts 12] [--workers 1,2,4]
+        [--concurrency 4] [--llm-latency 0.05] [--json out.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+import config
+from benchmarks.bench_pipeline import configure
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.mailbox import generate_mailbox, write_json_export
+from core.email_ingestion import iter_emails_from_json
+from core.work_queue import WorkQueue
+
+def run_worker(state_dir: str, index: int, count: int, args):
+    import logging
+    logging.disable(logging.WARNING)  # every node logs, and the queued accounts have no SMTP settings
+    from core.supervisor import EmailSupervisor
+    from core.worker import Worker
+
+    configure(state_dir, dedup=False)
+    os.chdir(state_dir)  # approved drafts are saved to ./drafts
+    llm = FakeChatModel(latency=args.llm_latency, jitter=args.llm_jitter, output_tokens=args.output_tokens)
+    supervisor = EmailSupervisor(fused=False, llm=llm)
+    queue = WorkQueue(config.WORK_QUEUE_PATH)
+    # No mailboxes to poll: every worker leases from the pre-filled queue
+    Worker(supervisor, queue, [], index=index, count=count, max_concurrency=args.concurrency, steal=True).run(until_empty=True)
+
+def run_workers(emails: list, workers: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as state_dir:
+        configure(state_dir, dedup=False)
+        os.makedirs(os.path.join(state_dir, "drafts"))
+        queue = WorkQueue(config.WORK_QUEUE_PATH)
+        for position, email in enumerate(emails):
+            account = f"account{position % args.accounts}"
+            queue.enqueue(account, email.model_copy(update={"email_id": f"{account}-{email.email_id}", "account": account}))
+        queue.close()
+
+        start = time.perf_counter()
+        processes = [multiprocessing.Process(target=run_worker, args=(state_dir, index, workers, args)) for index in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        with sqlite3.connect(config.WORK_QUEUE_PATH) as conn:
+            done = conn.execute("SELECT COUNT(*) FROM work_queue WHERE status = 'done'").fetchone()[0]
+            leased_twice = conn.execute("SELECT COUNT(*) FROM work_queue WHERE attempts > 1").fetchone()[0]
+    return {
+        "seconds": elapsed,
+        "emails_per_min": len(emails) / elapsed * 60,
+        "done": done,
+        "leased_twice": leased_twice,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=300)
+    parser.add_argument("--accounts", type=int, default=12)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--concurrency", type=int, default=4, help="Emails in flight per worker")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="Latency variation as a fraction")
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    messages = generate_mailbox(args.size, seed=args.seed)
+    with tempfile.TemporaryDirectory() as export_dir:
+        path = os.path.join(export_dir, "export.json")
+        write_json_export(path, messages)
+        emails = list(iter_emails_from_json(path))
+
+    results = {}
+    for workers in (int(count) for count in args.workers.split(",")):
+        results[workers] = run_workers(emails, workers, args)
+
+    print(f"{args.size} emails over {args.accounts} accounts, fake LLM {args.llm_latency * 1e3:.0f} ms/call, "
+          f"{args.concurrency} in flight per worker\n")
+    print(f"{'workers':>8}{'seconds':>10}{'emails/min':>12}{'speedup':>9}{'done':>7}{'leased twice':>14}")
+    baseline = next(iter(results.values()))["emails_per_min"]
+    for workers, row in results.items():
+        print(f"{workers:>8}{row['seconds']:>10.1f}{row['emails_per_min']:>12.0f}{row['emails_per_min'] / baseline:>8.2f}x"
+              f"{row['done']:>7}{row['leased_twice']:>14}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
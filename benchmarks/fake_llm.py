@@ -0,0 +1,107 @@
+"""
+A stand-in for ChatDeepSeek with configurable latency and output length, so the whole
+pipeline can be benchmarked (and tested) offline and reproducibly.
+"""
+import hashlib
+import random
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+SPAM_WORDS = ("discount", "% off", "buy now", "limited time", "winner", "free gift", "unsubscribe")
+URGENT_WORDS = ("urgent", "asap", "immediately", "outage", "is down", "deadline today")
+INFORMATIONAL_WORDS = ("newsletter", "weekly update", "has shipped", "receipt", "reminder", "digest")
+FILLER = ("thanks", "for", "the", "update", "we", "will", "review", "this", "and", "get", "back", "to", "you", "soon")
+
+def fake_category(text: str) -> str:
+    """A keyword rule standing in for the model's classification."""
+    text = text.lower()
+    for category, words in (("spam", SPAM_WORDS), ("urgent", URGENT_WORDS), ("informational", INFORMATIONAL_WORDS)):
+        if any(word in text for word in words):
+            return category
+    return "needs_review"
+
+def _field_types(schema) -> dict:
+    fields = getattr(schema, "model_fields", None)
+    if fields is not None:
+        return {name: field.annotation for name, field in fields.items()}
+    return {name: field.outer_type_ for name, field in schema.__fields__.items()}
+
+class FakeChatModel(BaseChatModel):
+    """
+    Answers every prompt after `latency` seconds (+/- `jitter` as a fraction) with
+    `output_tokens` words, each taking another `token_latency` seconds; streamed, the
+    first word arrives after `latency` and the rest one by one. Structured output is filled in from the prompt: the category
+    comes from keywords, strings get filler text and booleans are False.
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    token_latency: float = 0.0
+    output_tokens: int = 60
+    model_name: str = "fake-chat"
+    calls: int = 0
+    input_tokens: int = 0
+    generated_tokens: int = 0
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._counter_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _words(self, prompt: str) -> List[str]:
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest()
+        rng = random.Random(int.from_bytes(digest, "big"))
+        if self.latency:
+            time.sleep(max(0.0, self.latency * (1 + rng.uniform(-self.jitter, self.jitter))))
+        with self._counter_lock:
+            self.calls += 1
+            self.input_tokens += len(prompt) // 4
+            self.generated_tokens += self.output_tokens
+        return [rng.choice(FILLER) for _ in range(self.output_tokens)]
+
+    def _respond(self, prompt: str) -> str:
+        words = self._words(prompt)
+        if self.token_latency:
+            time.sleep(self.token_latency * len(words))
+        return " ".join(words)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self._respond(prompt)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": self.output_tokens,
+                 "total_tokens": len(prompt) // 4 + self.output_tokens}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        for index, word in enumerate(self._words(prompt)):
+            if index and self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else " " + word))
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        types = _field_types(schema)
+
+        def answer(prompt_value):
+            messages = prompt_value.to_messages() if hasattr(prompt_value, "to_messages") else prompt_value
+            prompt = "\n".join(str(message.content) for message in messages)
+            text = self._respond(prompt)
+            values = {}
+            for name, field_type in types.items():
+                if name == "category":
+                    # Classify on the email itself, not on the instructions listing every category
+                    values[name] = fake_category(str(messages[-1].content))
+                elif field_type is bool:
+                    values[name] = False
+                else:
+                    values[name] = text
+            return schema(**values)
+
+        return RunnableLambda(answer)
@@ -0,0 +1,163 @@
+"""
+An in-memory IMAP stand-in that speaks enough of imaplib's client API for MailMind's
+fetch paths: SELECT response codes, UID SEARCH, UID FETCH (full bodies, BODYSTRUCTURE,
+HEADER.FIELDS and body sections) and UID STORE. Used by the tests and benchmarks.
+"""
+import email
+import re
+from email.message import Message
+
+class FakeIMAPServer:
+    """Holds a mailbox; `connect` returns a client connection bound to it."""
+
+    def __init__(self, uidvalidity=1, capabilities=("IMAP4REV1",)):
+        self.uidvalidity = uidvalidity
+        self.capabilities = tuple(capabilities)
+        self.messages = {}  # uid -> {"raw": bytes, "seen": bool}
+        self.next_uid = 1
+        self.modseq = 1
+        self.commands = []
+        self.bytes_sent = 0
+        self.failing_uids = set()  # FETCH commands that include one of these get a NO
+
+    def add_raw(self, raw: bytes, seen: bool = False) -> int:
+        uid = self.next_uid
+        self.messages[uid] = {"raw": raw, "seen": seen}
+        self.next_uid += 1
+        self.modseq += 1
+        return uid
+
+    def add_message(self, subject, body="Hello", seen=False, sender="sender@example.com") -> int:
+        raw = f"From: {sender}\r\nSubject: {subject}\r\n\r\n{body}\r\n".encode()
+        return self.add_raw(raw, seen)
+
+    def reset(self, uidvalidity):
+        self.uidvalidity = uidvalidity
+        self.messages = {}
+        self.next_uid = 1
+
+    def connect(self, host=None, port=None, *args, **kwargs):
+        return FakeIMAPConnection(self)
+
+def _quote(value) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def bodystructure(part: Message) -> str:
+    """Renders the BODYSTRUCTURE of a parsed message the way a server would."""
+    if part.is_multipart():
+        children = "".join(bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())})"
+    params = [(k, v) for k, v in (part.get_params() or [])[1:]]
+    params_s = "(" + " ".join(f"{_quote(k.upper())} {_quote(v)}" for k, v in params) + ")" if params else "NIL"
+    encoding = part.get("Content-Transfer-Encoding", "7BIT").upper()
+    payload = part.get_payload()
+    size = len(payload.encode() if isinstance(payload, str) else b"")
+    disposition = part.get_content_disposition()
+    disposition_s = f"({_quote(disposition.upper())} NIL)" if disposition else "NIL"
+    main, sub = part.get_content_maintype().upper(), part.get_content_subtype().upper()
+    if main == "TEXT":
+        lines = payload.count("\n") if isinstance(payload, str) else 0
+        return f"({_quote(main)} {_quote(sub)} {params_s} NIL NIL {_quote(encoding)} {size} {lines} NIL {disposition_s} NIL)"
+    return f"({_quote(main)} {_quote(sub)} {params_s} NIL NIL {_quote(encoding)} {size} NIL {disposition_s} NIL)"
+
+def _section(msg: Message, section: str) -> bytes:
+    part = msg
+    for index in section.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+        elif index != "1":
+            return b""
+    payload = part.get_payload()
+    return payload.encode() if isinstance(payload, str) else b""
+
+class FakeIMAPConnection:
+    def __init__(self, server: FakeIMAPServer):
+        self.server = server
+        self.capabilities = server.capabilities
+        self._untagged = {}
+
+    def login(self, username, password):
+        return "OK", [b"Logged in"]
+
+    def enable(self, capability):
+        return "OK", [b"ENABLED"]
+
+    def noop(self):
+        return "OK", [b"NOOP completed"]
+
+    def select(self, folder="INBOX"):
+        server = self.server
+        self._untagged = {
+            "UIDVALIDITY": [str(server.uidvalidity).encode()],
+            "UIDNEXT": [str(server.next_uid).encode()],
+            "HIGHESTMODSEQ": [str(server.modseq).encode()],
+        }
+        return "OK", [str(len(server.messages)).encode()]
+
+    def response(self, code):
+        return code, self._untagged.pop(code, [None])
+
+    def _uid_set(self, spec):
+        uids = set()
+        for item in spec.split(","):
+            if ":" in item:
+                start, end = item.split(":")
+                end = max(self.server.messages, default=0) if end == "*" else int(end)
+                uids.update(uid for uid in self.server.messages if int(start) <= uid <= end)
+            else:
+                uids.add(int(item))
+        return sorted(uid for uid in uids if uid in self.server.messages)
+
+    def _fetch_one(self, uid: int, items: str):
+        raw = self.server.messages[uid]["raw"]
+        text = f"{uid} (UID {uid}"
+        literals = []
+        if "BODYSTRUCTURE" in items:
+            text += f" BODYSTRUCTURE {bodystructure(email.message_from_bytes(raw))}"
+        header_match = re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items)
+        section_match = re.search(r"BODY\.PEEK\[([\d.]+)\]", items)
+        if "BODY.PEEK[]" in items:
+            literals.append(("BODY[]", raw))
+        elif header_match:
+            wanted = set(header_match.group(1).upper().split())
+            msg = email.message_from_bytes(raw)
+            header_bytes = "".join(f"{k}: {v}\r\n" for k, v in msg.items() if k.upper() in wanted).encode() + b"\r\n"
+            literals.append((f"BODY[HEADER.FIELDS ({header_match.group(1)})]", header_bytes))
+        elif section_match:
+            data = _section(email.message_from_bytes(raw), section_match.group(1))
+            literals.append((f"BODY[{section_match.group(1)}]", data))
+
+        if not literals:
+            return [(text + ")").encode()]
+        name, data = literals[0]
+        self.server.bytes_sent += len(data)
+        return [(f"{text} {name} {{{len(data)}}}".encode(), data), b")"]
+
+    def uid(self, command, *args):
+        self.server.commands.append((command,) + args)
+        messages = self.server.messages
+        if command == "SEARCH":
+            criteria = args[-1]
+            if criteria == "UNSEEN":
+                uids = [uid for uid, m in messages.items() if not m["seen"]]
+            else:
+                uids = self._uid_set(criteria.split()[1])
+                if not uids and messages:
+                    uids = [max(messages)]  # "N:*" always matches the highest UID
+            return "OK", [" ".join(map(str, uids)).encode()]
+        if command == "FETCH":
+            if self.server.failing_uids & set(self._uid_set(args[0])):
+                return "NO", [b"FETCH failed"]
+            data = []
+            for uid in self._uid_set(args[0]):
+                data.extend(self._fetch_one(uid, args[1]))
+            return "OK", data
+        if command == "STORE":
+            for uid in self._uid_set(args[0]):
+                if "\\Seen" in args[2]:
+                    messages[uid]["seen"] = args[1].startswith("+")
+            return "OK", []
+        return "NO", [b"unsupported"]
+
+    def logout(self):
+        return "BYE", [b"Logging out"]
@@ -0,0 +1,110 @@
+"""
+Synthetic mailboxes with a configurable size and mix: HTML newsletters, spam, long
+reply threads with quoted history, and plain questions. Generation is seeded, so the
+same arguments always produce the same mailbox.
+"""
+import json
+import random
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+NAMES = ["Alice Smith", "Bob Jones", "Carol White", "Dan Brown", "Erin Green", "Frank Moore", "Grace Lee", "Hiro Tanaka"]
+TOPICS = ["Q3 budget", "website redesign", "API migration", "office move", "hiring plan", "security audit", "launch event"]
+QUESTIONS = [
+    "Could you send me the latest numbers for the {topic} before Thursday?",
+    "We are blocked on the {topic}; the staging server is down and we need help immediately.",
+    "I have a few concerns about the contract terms for the {topic} and would like to discuss them.",
+    "Can we move our {topic} meeting to next week? Let me know what works for you.",
+]
+
+def _html_newsletter(rng: random.Random, i: int) -> str:
+    rows = "".join(
+        f'<tr><td style="padding:8px"><img src="https://cdn.example.com/{i}/{j}.png" width="96"></td>'
+        f'<td><a href="https://example.com/a/{j}?utm_source=news&amp;id={i}">Story {j}</a> &mdash; '
+        f'<span style="color:#333">{rng.choice(TOPICS)} weekly update, part {j}</span></td></tr>'
+        for j in range(rng.randint(10, 40))
+    )
+    return (f"<html><head><style>td{{font-family:Arial}}</style></head><body><h1>Weekly update #{i}</h1>"
+            f"<table>{rows}</table><p><a href='#'>Unsubscribe</a></p></body></html>")
+
+def _spam(rng: random.Random, i: int, html: bool) -> str:
+    offer = f"Limited time: {rng.randint(30, 90)}% off everything. Buy now and get a free gift! Offer #{i}."
+    if html:
+        return f"<html><body><h2>{offer}</h2><p><a href='https://deals.example.net/{i}'>Shop now</a></p></body></html>"
+    return f"{offer}\n\nClick here to claim: https://deals.example.net/{i}\nTo unsubscribe reply STOP."
+
+def _quote(text: str, author: str) -> str:
+    return f"On Mon, {author} wrote:\n" + "\n".join(f"> {line}" for line in text.splitlines())
+
+def generate_mailbox(size: int, html_ratio: float = 0.3, thread_ratio: float = 0.2, spam_ratio: float = 0.2,
+                     thread_depth: int = 8, seed: int = 0) -> List[dict]:
+    """
+    Returns `size` message specs (email_id, sender, subject, body, html, headers).
+    A `thread_ratio` share of messages are replies in conversations up to `thread_depth`
+    messages deep, each quoting the whole history; `html_ratio` of the rest are HTML.
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 6, 9, 0, tzinfo=timezone.utc)
+    threads = []  # open conversations: {"subject", "ids", "body", "author"}
+    messages = []
+    for i in range(size):
+        sender = rng.choice(NAMES)
+        address = f'{sender} <{sender.split()[0].lower()}@example.com>'
+        message_id = f"<{seed}.{i}@bench.example.com>"
+        headers = {"Message-ID": message_id, "Date": format_datetime(start + timedelta(minutes=7 * i))}
+        roll = rng.random()
+        html = False
+
+        if roll < spam_ratio:
+            html = rng.random() < html_ratio
+            address = f"Deals <offers@shop{i % 5}.example.net>"
+            subject, body = "Exclusive deal just for you", _spam(rng, i, html)
+            headers["List-Unsubscribe"] = f"<https://shop{i % 5}.example.net/u/{i}>"
+        elif roll < spam_ratio + thread_ratio:
+            open_threads = [t for t in threads if len(t["ids"]) < thread_depth]
+            if open_threads and rng.random() < 0.8:
+                thread = rng.choice(open_threads)
+            else:
+                thread = {"subject": f"{rng.choice(TOPICS)} follow-up {i}", "ids": [], "body": "", "author": sender}
+                threads.append(thread)
+            reply = rng.choice(QUESTIONS).format(topic=thread["subject"])
+            body = reply if not thread["body"] else f"{reply}\n\n{_quote(thread['body'], thread['author'])}"
+            subject = ("Re: " if thread["ids"] else "") + thread["subject"]
+            if thread["ids"]:
+                headers["In-Reply-To"] = thread["ids"][-1]
+                headers["References"] = " ".join(thread["ids"])
+            thread.update(ids=thread["ids"] + [message_id], body=body, author=sender)
+        elif rng.random() < html_ratio:
+            html = True
+            address = f"Newsletter <newsletter@news{i % 3}.example.org>"
+            subject, body = f"Weekly update #{i}", _html_newsletter(rng, i)
+            headers["List-Unsubscribe"] = f"<https://news{i % 3}.example.org/u>"
+        else:
+            subject = rng.choice(TOPICS).capitalize()
+            body = rng.choice(QUESTIONS).format(topic=subject.lower()) + f"\n\nBest,\n{sender.split()[0]}"
+
+        messages.append({"email_id": str(i + 1), "sender": address, "subject": subject, "body": body, "html": html, "headers": headers})
+    return messages
+
+def to_raw(message: dict) -> bytes:
+    """Renders a message spec as RFC 822 bytes."""
+    msg = EmailMessage()
+    msg["From"] = message["sender"]
+    msg["To"] = "me@example.com"
+    msg["Subject"] = message["subject"]
+    for name, value in message["headers"].items():
+        msg[name] = value
+    # HTML-only, like most newsletters; with a plain alternative the pipeline would never see the HTML
+    msg.set_content(message["body"], subtype="html" if message["html"] else "plain")
+    return msg.as_bytes()
+
+def load_into(server, messages: List[dict]) -> List[int]:
+    """Adds the messages to a FakeIMAPServer as unread mail and returns their UIDs."""
+    return [server.add_raw(to_raw(message)) for message in messages]
+
+def write_json_export(path: str, messages: List[dict]):
+    """Writes the messages in the format read by core.email_ingestion."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{key: message[key] for key in ("email_id", "sender", "subject", "body", "headers")} for message in messages], f)
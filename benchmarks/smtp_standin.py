@@ -0,0 +1,84 @@
+"""
+A minimal threaded SMTP server (in the spirit of aiosmtpd's Debugging handler) for tests
+and benchmarks. It accepts every message, records it, counts connections, and can be told
+to reject the next N recipients with a transient 451 reply.
+"""
+import socketserver
+import threading
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server.standin
+        with server.lock:
+            server.connections += 1
+        self._reply("220 standin ESMTP ready")
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250-standin")
+                self._reply("250 8BITMIME")
+            elif verb == "MAIL":
+                mail_from, recipients = command[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                with server.lock:
+                    reject = server.reject_next > 0
+                    if reject:
+                        server.reject_next -= 1
+                if reject:
+                    self._reply("451 Temporary failure, try again later")
+                else:
+                    recipients.append(command[8:].strip())
+                    self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line)
+                with server.lock:
+                    server.messages.append({"from": mail_from, "to": recipients, "data": b"".join(lines)})
+                self._reply("250 OK: queued")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class SMTPStandin:
+    """Runs the stand-in on localhost in a background thread; use as a context manager."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.reject_next = 0
+        self.lock = threading.Lock()
+        self._server = _ThreadingServer(("127.0.0.1", 0), _SMTPHandler)
+        self._server.standin = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
@@ -12,15 +12,168 @@ EMAIL_SERVER = os.getenv("EMAIL_SERVER")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_USERNAME = os.getenv("EMAIL_USERNAME")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+# Durable queue for emails whose delivery failed transiently
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
 
 # IMAP (Fetching) Email Configuration
 IMAP_SERVER = os.getenv("IMAP_SERVER")
 IMAP_PORT = int(os.getenv("IMAP_PORT", 993))
 IMAP_USERNAME = os.getenv("IMAP_USERNAME")
 IMAP_PASSWORD = os.getenv("IMAP_PASSWORD")
+# Incremental sync: only fetch messages with a UID above the persisted watermark
+IMAP_INCREMENTAL_SYNC = os.getenv("IMAP_INCREMENTAL_SYNC", "true").lower() == "true"
+IMAP_SYNC_STATE_PATH = os.getenv("IMAP_SYNC_STATE_PATH", "imap_sync_state.json")
+# Number of UIDs per FETCH round-trip
+IMAP_FETCH_CHUNK_SIZE = int(os.getenv("IMAP_FETCH_CHUNK_SIZE", 50))
+# Messages fetched ahead of processing when streaming a mailbox; bounds memory for large inboxes
+IMAP_STREAM_WINDOW = int(os.getenv("IMAP_STREAM_WINDOW", 200))
+# Fetch headers + BODYSTRUCTURE first, then only the text body part (attachments are never downloaded)
+IMAP_HEADER_FIRST = os.getenv("IMAP_HEADER_FIRST", "true").lower() == "true"
+# Worker processes that parse large pulls in parallel with the download (1 parses inline)
+IMAP_PARSE_WORKERS = int(os.getenv("IMAP_PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+
+# IMAP IDLE Daemon Configuration
+# Re-issue IDLE before the server's inactivity timeout (RFC 2177 recommends < 29 minutes)
+IMAP_IDLE_TIMEOUT_SECONDS = float(os.getenv("IMAP_IDLE_TIMEOUT_SECONDS", 25 * 60))
+# Polling interval when the server does not support IDLE
+IMAP_POLL_INTERVAL_SECONDS = float(os.getenv("IMAP_POLL_INTERVAL_SECONDS", 60))
+IMAP_RECONNECT_MAX_BACKOFF_SECONDS = float(os.getenv("IMAP_RECONNECT_MAX_BACKOFF_SECONDS", 300))
+# Send drafts that need no review automatically; otherwise they are saved to drafts/
+DAEMON_AUTO_SEND = os.getenv("DAEMON_AUTO_SEND", "false").lower() == "true"
+
+# Processing Configuration
+# Number of emails processed concurrently; 1 keeps the original one-at-a-time flow
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", 1))
+# Classify, summarize and draft with a single structured LLM call instead of three
+FUSED_MODE = os.getenv("FUSED_MODE", "false").lower() == "true"
+# Summarize while classifying instead of after it; the summary is discarded if the email is spam
+PARALLEL_SUMMARY = os.getenv("PARALLEL_SUMMARY", "false").lower() == "true"
+
+# Multi-account Workers (workers.py)
+# JSON list of mailboxes; without it the IMAP_*/EMAIL_* mailbox is the only account
+ACCOUNTS_PATH = os.getenv("ACCOUNTS_PATH", "accounts.json")
+# Worker processes; the accounts are split between them for polling
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", 2))
+# Let a worker whose own accounts are quiet process mail from other accounts
+WORKER_STEAL = os.getenv("WORKER_STEAL", "true").lower() == "true"
+# Local queue the workers share; a leased email is handed to another worker if its lease is
+# neither finished nor renewed within WORK_LEASE_SECONDS (e.g. the worker crashed)
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", "work_queue.sqlite3")
+WORK_LEASE_SECONDS = float(os.getenv("WORK_LEASE_SECONDS", 300))
+WORK_MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", 5))
+
+# Scheduling
+# Reorder emails so urgent mail is drafted first (priority classes with SLA deadlines)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+# How many emails are read ahead of processing to choose from
+SCHEDULER_LOOKAHEAD = int(os.getenv("SCHEDULER_LOOKAHEAD", 500))
+# Comma-separated addresses or domains whose mail is always urgent, e.g. "ceo@example.com,bigcustomer.com"
+SCHEDULER_VIP_SENDERS = os.getenv("SCHEDULER_VIP_SENDERS", "")
+SCHEDULER_URGENT_KEYWORDS = os.getenv(
+    "SCHEDULER_URGENT_KEYWORDS",
+    "urgent,asap,immediately,emergency,escalation,outage,is down,critical,blocked,deadline,action required",
+)
+# SLA from receipt to draft per priority class, in seconds
+SLA_URGENT_SECONDS = float(os.getenv("SLA_URGENT_SECONDS", 900))
+SLA_NORMAL_SECONDS = float(os.getenv("SLA_NORMAL_SECONDS", 14400))
+SLA_LOW_SECONDS = float(os.getenv("SLA_LOW_SECONDS", 86400))
+# An email queued longer than this is processed next whatever its priority
+SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", 600))
+
+# Token Budgets
+# Maximum estimated body tokens sent to each node's prompt; longer bodies are trimmed (0 disables)
+TOKEN_BUDGET_FILTER = int(os.getenv("TOKEN_BUDGET_FILTER", 1000))
+TOKEN_BUDGET_SUMMARIZE = int(os.getenv("TOKEN_BUDGET_SUMMARIZE", 3000))
+TOKEN_BUDGET_RESPONSE = int(os.getenv("TOKEN_BUDGET_RESPONSE", 4000))
+TOKEN_BUDGET_ANALYZE = int(os.getenv("TOKEN_BUDGET_ANALYZE", 4000))
+
+# Near-duplicate Detection Configuration
+# Reuse one LLM result for near-identical emails (alert storms, repeated questions)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_PATH = os.getenv("DEDUP_PATH", "dedup_index.sqlite3")
+# Maximum SimHash distance (in bits, out of 64) for two bodies to count as duplicates
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 3))
+DEDUP_TTL_SECONDS = float(os.getenv("DEDUP_TTL_SECONDS", 7 * 24 * 3600))
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", 20000))
+# How long a duplicate waits for the first email of its cluster to finish processing
+DEDUP_WAIT_SECONDS = float(os.getenv("DEDUP_WAIT_SECONDS", 60))
+
+# Local Classifier Configuration
+# TF-IDF + logistic regression trained on past LLM labels (python train_classifier.py)
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "true").lower() == "true"
+LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", "local_classifier.json")
+# Minimum probability for the local answer; less confident emails go to the LLM
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.85))
+
+# Conversation Thread Configuration
+# Summarize replies incrementally from the stored thread summary instead of the full history
+THREADS_ENABLED = os.getenv("THREADS_ENABLED", "true").lower() == "true"
+THREAD_STORE_PATH = os.getenv("THREAD_STORE_PATH", "threads.sqlite3")
+
+# Checkpointing Configuration
+# Persist the workflow state after every node so interrupted runs resume instead of starting over
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "true").lower() == "true"
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.sqlite3")
+# Fetched IMAP emails are spooled in the checkpoint ledger before the sync watermark moves past
+# them; an email a run did not finish is retried by the next run, up to this many times
+CHECKPOINT_MAX_ATTEMPTS = int(os.getenv("CHECKPOINT_MAX_ATTEMPTS", 5))
+
+# Human Review Configuration
+# "interactive" prompts in the terminal while processing; "queue" stores drafts for review.py and moves on
+REVIEW_MODE = os.getenv("REVIEW_MODE", "interactive").lower()
+REVIEW_QUEUE_PATH = os.getenv("REVIEW_QUEUE_PATH", "review_queue.sqlite3")
+# Stream drafts token by token: shown while they are written, stored in DRAFT_STREAM_DIR as
+# <email_id>_draft.partial.txt until finished, and stoppable with `python review.py reject ID`
+STREAM_DRAFTS = os.getenv("STREAM_DRAFTS", "true").lower() == "true"
+DRAFT_STREAM_DIR = os.getenv("DRAFT_STREAM_DIR", "drafts")
+
+# LLM Response Cache Configuration
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 50000))
+
+# LLM Client Configuration
+# Shared rate limiting, retries and concurrency control for every DeepSeek call
+LLM_RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE_ENABLED", "true").lower() == "true"
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+# Token bucket: average requests per minute and burst size. DeepSeek publishes no fixed
+# limit, so the default (0) leaves pacing to the concurrency limit and Retry-After
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_BURST = int(os.getenv("LLM_BURST", 20))
+# Exponential backoff with full jitter; a Retry-After header takes precedence
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", 1.0))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", 60.0))
+# Circuit breaker: consecutive failures before opening, and seconds before probing again
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", 5))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", 30.0))
+# AIMD concurrency limit: grows while calls succeed, halves on errors or calls slower than the target
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", 4))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", 1))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", 16))
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", 20.0))
+
+# Rule-based Prefilter Configuration
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+# Comma-separated addresses or domains, e.g. "boss@work.com,partner.io"
+PREFILTER_ALLOWLIST = os.getenv("PREFILTER_ALLOWLIST", "")
+PREFILTER_DENYLIST = os.getenv("PREFILTER_DENYLIST", "")
+# Number of distinct spam phrases needed to mark an email as spam without the LLM
+PREFILTER_SPAM_THRESHOLD = int(os.getenv("PREFILTER_SPAM_THRESHOLD", 2))
+
+# Metrics and Tracing Configuration
+# Port for the Prometheus /metrics (and /metrics.json) endpoint; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# File the metrics are written to as JSON every METRICS_JSON_INTERVAL_SECONDS; empty disables it
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", "")
+METRICS_JSON_INTERVAL_SECONDS = float(os.getenv("METRICS_JSON_INTERVAL_SECONDS", 60))
+# OpenTelemetry spans per email and node (needs opentelemetry-api and a configured SDK)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
 
 # Basic validation
+# Only a run that calls DeepSeek needs the key; EmailSupervisor raises if it is missing then
 if not DEEPSEEK_API_KEY:
-    raise ValueError("DEEPSEEK_API_KEY not found in environment variables.")
+    print("Warning: DEEPSEEK_API_KEY not found. Runs that call the DeepSeek API will fail.")
 if not EMAIL_USERNAME or not EMAIL_PASSWORD:
     print("Warning: Email credentials not found. Sending/fetching emails will fail.")
\ No newline at end of file
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+from core.email_imap import connect_imap
+from core.email_sender import SMTPClient, Outbox
+from utils.logger import logger
+import config
+
+# Account names end up in email IDs and file names
+ACCOUNT_NAME = re.compile(r"^[A-Za-z0-9_.]+$")
+DEFAULT_ACCOUNT = "default"
+
+def account_path(path: str, name: str) -> str:
+    """
+    A per-account variant of a state file path, e.g. outbox.sqlite3 -> outbox.support.sqlite3.
+    The default account keeps the configured path, so single-mailbox setups are unchanged.
+    """
+    if name == DEFAULT_ACCOUNT:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+@dataclass(frozen=True)
+class Account:
+    """
+    One mailbox: where its mail is fetched from and how replies to it are sent.
+    """
+    name: str
+    imap_server: str
+    imap_username: str
+    imap_password: str
+    imap_port: int = 993
+    folder: str = "inbox"
+    smtp_server: Optional[str] = None
+    smtp_port: int = 587
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+
+    @property
+    def sync_state_path(self) -> str:
+        return account_path(config.IMAP_SYNC_STATE_PATH, self.name)
+
+    @property
+    def outbox_path(self) -> str:
+        return account_path(config.OUTBOX_PATH, self.name)
+
+    def email_id(self, uid: str) -> str:
+        # UIDs are only unique within a mailbox
+        return uid if self.name == DEFAULT_ACCOUNT else f"{self.name}-{uid}"
+
+    def connect_imap(self):
+        return connect_imap(self.imap_server, self.imap_port, self.imap_username, self.imap_password)
+
+    def smtp_client(self) -> SMTPClient:
+        return SMTPClient(self.smtp_server, self.smtp_port, self.smtp_username, self.smtp_password)
+
+    def outbox(self) -> Outbox:
+        return Outbox(self.outbox_path)
+
+def _expand(value):
+    # "${SUPPORT_IMAP_PASSWORD}" keeps secrets in the environment rather than in the accounts file
+    return os.path.expandvars(value) if isinstance(value, str) else value
+
+def load_accounts(path: Optional[str] = None) -> List[Account]:
+    """
+    Reads the accounts file (a JSON list of Account fields). Without one, the single
+    mailbox configured through IMAP_* and EMAIL_* is the "default" account.
+    """
+    path = path or config.ACCOUNTS_PATH
+    if not os.path.exists(path):
+        if not all([config.IMAP_SERVER, config.IMAP_USERNAME, config.IMAP_PASSWORD]):
+            return []
+        return [Account(name=DEFAULT_ACCOUNT, imap_server=config.IMAP_SERVER, imap_port=config.IMAP_PORT,
+                        imap_username=config.IMAP_USERNAME, imap_password=config.IMAP_PASSWORD,
+                        smtp_server=config.EMAIL_SERVER, smtp_port=config.EMAIL_PORT,
+                        smtp_username=config.EMAIL_USERNAME, smtp_password=config.EMAIL_PASSWORD)]
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    accounts = []
+    for entry in entries:
+        account = Account(**{key: _expand(value) for key, value in entry.items()})
+        if not ACCOUNT_NAME.match(account.name):
+            raise ValueError(f"Invalid account name {account.name!r}: use letters, digits, '_' and '.'")
+        accounts.append(account)
+    names = [account.name for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate account names in {path}")
+    logger.info(f"Loaded {len(accounts)} accounts from {path}.")
+    return accounts
+
+def shard_accounts(accounts: List[Account], index: int, count: int) -> List[Account]:
+    """
+    The accounts worker `index` of `count` polls: round-robin over the sorted names, so every
+    worker computes the same split from the same accounts file and shards differ by at most one.
+    """
+    ordered = sorted(accounts, key=lambda account: account.name)
+    return [account for position, account in enumerate(ordered) if position % count == index]
@@ -0,0 +1,156 @@
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+from core.state import EmailState
+from utils.logger import logger
+import config
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+class ProcessingLedger:
+    """
+    Records how far each email (keyed by email_id) got, so a restarted run can skip
+    emails that were fully handled and resume the rest from their last checkpoint.
+
+    Fetched emails can also be spooled here before the mailbox's sync watermark moves past
+    them, so emails fetched by a run that crashed before finishing them are replayed by
+    the next one (see unfinished()).
+
+    Statuses: "fetched" (spooled, not started yet), "in_progress" (graph started),
+    "processed" (graph finished, result not yet sent or saved), "awaiting_review" (draft
+    stored in the review queue), "done" (post-processing finished) and "failed" (gave up
+    after max_attempts).
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processing_ledger ("
+            "email_id TEXT PRIMARY KEY, status TEXT NOT NULL, final_status TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, state TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(processing_ledger)")}
+        if "state" not in columns:
+            # Ledgers written before fetched emails were spooled
+            self._conn.execute("ALTER TABLE processing_ledger ADD COLUMN state TEXT")
+        self._conn.commit()
+
+    def get(self, email_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM processing_ledger WHERE email_id = ?", (email_id,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, email_id: str, status: str, final_status: Optional[str] = None, new_attempt: bool = False):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO processing_ledger (email_id, status, final_status, attempts, updated_at) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(email_id) DO UPDATE SET status = excluded.status, final_status = excluded.final_status, "
+                "attempts = attempts + ?, updated_at = excluded.updated_at",
+                (email_id, status, final_status, time.time(), 1 if new_attempt else 0),
+            )
+            self._conn.commit()
+
+    def mark_started(self, email_id: str):
+        self._set(email_id, "in_progress", new_attempt=True)
+
+    def mark_processed(self, email: EmailState):
+        self._set(email.email_id, "processed", email.status)
+
+    def mark_awaiting_review(self, email: EmailState):
+        self._set(email.email_id, "awaiting_review", email.status)
+
+    def mark_done(self, email: EmailState):
+        self._set(email.email_id, "done", email.status)
+
+    def spool(self, emails: Iterable[EmailState]):
+        """
+        Durably records freshly fetched emails in one transaction. Emails the ledger
+        already knows keep their status.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO processing_ledger (email_id, status, updated_at, state) VALUES (?, 'fetched', ?, ?) "
+                "ON CONFLICT(email_id) DO UPDATE SET state = excluded.state WHERE state IS NULL",
+                [(email.email_id, now, email.model_dump_json()) for email in emails],
+            )
+            self._conn.commit()
+
+    def unfinished(self) -> List[EmailState]:
+        """
+        The spooled emails that were never finished (interrupted, or failed with an error),
+        oldest first. Emails that already used up max_attempts are marked failed instead.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT email_id, attempts, state FROM processing_ledger "
+                "WHERE state IS NOT NULL AND status IN ('fetched', 'in_progress', 'processed') ORDER BY updated_at"
+            ).fetchall()
+        emails = []
+        for email_id, attempts, state in rows:
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on email {email_id} after {attempts} attempts.")
+                self._set(email_id, "failed", "error")
+                continue
+            emails.append(EmailState.model_validate_json(state))
+        return emails
+
+    def is_done(self, email_id: str) -> bool:
+        return self.get(email_id) == "done"
+
+    def skip_done(self, emails: Iterable[EmailState]) -> Iterator[EmailState]:
+        """
+        Filters out emails a previous run already handled completely.
+        """
+        for email in emails:
+            if self.is_done(email.email_id):
+                logger.info(f"Skipping email {email.email_id}: already processed in a previous run.")
+                continue
+            yield email
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM processing_ledger GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_checkpointer(path: str) -> "SqliteSaver":
+    """
+    Opens a SQLite-backed LangGraph checkpointer that is safe to share between worker threads.
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    # Workers share this file with their ledgers: wait for another writer's lock instead of
+    # failing, and WAL keeps readers from blocking on it
+    conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return SqliteSaver(conn)
+
+def delete_checkpoints(checkpointer: "SqliteSaver", thread_id: str):
+    """
+    Removes every checkpoint and pending write stored for a thread.
+    """
+    try:
+        checkpointer.delete_thread(thread_id)
+    except NotImplementedError:
+        # Older langgraph-checkpoint-sqlite releases do not implement delete_thread
+        with checkpointer.cursor() as cur:
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            cur.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+def get_default_checkpointing():
+    """
+    Returns (checkpointer, ledger) as configured in config.py, or (None, None) if disabled.
+    """
+    if not config.CHECKPOINT_ENABLED:
+        return None, None
+    return open_checkpointer(config.CHECKPOINT_PATH), ProcessingLedger(config.CHECKPOINT_PATH, config.CHECKPOINT_MAX_ATTEMPTS)
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from email.utils import parseaddr
+from typing import Dict, List, Optional
+from core.state import EmailState
+from utils.logger import logger
+import config
+
+WORD = re.compile(r"\w+", re.UNICODE)
+DIGITS = re.compile(r"\d+")
+SHINGLE_SIZE = 3
+# Very short bodies ("Thanks!") look alike without meaning the same thing
+MIN_WORDS = 8
+RESULT_FIELDS = ("category", "summary", "draft_response", "needs_human_review")
+# Reply and forward markers that do not change what a subject is about
+SUBJECT_PREFIX = re.compile(r"^(?:\s*(?:re|fwd?|aw|wg|sv)\s*(?:\[\d+\])?\s*:)+", re.IGNORECASE)
+# Greetings whose name adapt_draft may rewrite
+GREETING_WORDS = r"hi|hello|hey|dear|good (?:morning|afternoon|evening)"
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash over word 3-shingles. Digits are normalized so that templated
+    messages (alerts, receipts, password resets) land close together.
+    Returns None if the text is too short to fingerprint reliably.
+    """
+    words = [DIGITS.sub("0", word) for word in WORD.findall(text.lower())]
+    if len(words) < MIN_WORDS:
+        return None
+    weights = [0] * 64
+    for i in range(len(words) - SHINGLE_SIZE + 1):
+        shingle = " ".join(words[i:i + SHINGLE_SIZE])
+        value = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def content_digest(*texts: str) -> str:
+    """
+    Exact fingerprint of the words of one or more texts, digits included, to tell an exact
+    duplicate from a near-duplicate whose order numbers, amounts or names differ.
+    """
+    words = "\n".join(" ".join(WORD.findall(text.lower())) for text in texts)
+    return hashlib.blake2b(words.encode(), digest_size=16).hexdigest()
+
+def email_digest(email: EmailState) -> str:
+    """
+    Exact fingerprint of an email's subject (without Re:/Fwd: prefixes) and body.
+    """
+    return content_digest(SUBJECT_PREFIX.sub("", email.subject), email.cleaned_body)
+
+def _first_name(address: str) -> str:
+    name = parseaddr(address)[0].strip().strip('"')
+    return name.split()[0] if name else ""
+
+def adapt_draft(draft: str, source_sender: str, target_sender: str) -> str:
+    """
+    Re-addresses a draft written for one sender to another by rewriting the name in its
+    greeting line ("Hi Alice," -> "Hi Bob,", or "Hello," if the new sender has no name).
+    The rest of the draft is left alone, since names like "May" or "Mark" are also words.
+    """
+    source, target = _first_name(source_sender), _first_name(target_sender)
+    if not draft or not source or source == target:
+        return draft
+    lines = draft.split("\n")
+    index = next((i for i, line in enumerate(lines) if line.strip()), None)
+    if index is None:
+        return draft
+    greeting = re.compile(rf"^(\s*(?:{GREETING_WORDS})[ \t]+){re.escape(source)}\b|^(\s*){re.escape(source)}(?=\s*[,!:]|\s*$)",
+                          re.IGNORECASE)
+    if target:
+        lines[index] = greeting.sub(lambda m: (m.group(1) or m.group(2)) + target, lines[index], count=1)
+    else:
+        lines[index] = greeting.sub(lambda m: (m.group(2) or "") + "Hello", lines[index], count=1)
+    return "\n".join(lines)
+
+class _Entry:
+    def __init__(self, fingerprint: int, email_id: str, sender: str, result: Optional[dict] = None, created_at: Optional[float] = None,
+                 digest: Optional[str] = None):
+        self.fingerprint = fingerprint
+        self.email_id = email_id
+        self.sender = sender
+        self.digest = digest
+        self.result = result
+        self.created_at = created_at or time.time()
+        self.ready = threading.Event()
+        if result is not None:
+            self.ready.set()
+
+class DedupIndex:
+    """
+    Finds near-duplicate emails with SimHash and an LSH band index, so one LLM result
+    can be reused for a whole cluster of alert storms, password resets or repeated questions.
+
+    The 64-bit fingerprint is split into max_distance + 1 bands; by the pigeonhole principle
+    any fingerprint within max_distance bits shares at least one band exactly, so a lookup
+    only compares against the few candidates in matching buckets. Results are persisted in
+    SQLite and the index is rebuilt in memory on startup.
+
+    Emails processed concurrently are coordinated: the first email of a cluster claims it,
+    and its duplicates wait for that result instead of calling the LLM themselves.
+    """
+
+    def __init__(self, path: str, max_distance: int = 3, ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 20000, wait_seconds: float = 60.0):
+        self.path = path
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_seconds = wait_seconds
+        bands = max_distance + 1
+        self._bands = [(64 * i // bands, 64 * (i + 1) // bands) for i in range(bands)]
+        self._buckets: List[Dict[int, List[_Entry]]] = [{} for _ in self._bands]
+        self._entries: List[_Entry] = []
+        self._claims: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.emails = 0
+        self.duplicates = 0
+        self.llm_calls_avoided = 0
+        # One index for all worker processes, opened like the work queue
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dedup_index ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, fingerprint INTEGER NOT NULL, email_id TEXT NOT NULL, "
+            "sender TEXT, result TEXT NOT NULL, created_at REAL NOT NULL, digest TEXT)"
+        )
+        if "digest" not in {row[1] for row in self._conn.execute("PRAGMA table_info(dedup_index)")}:
+            # Indexes written before exact digests were stored; their entries never count as exact duplicates
+            # (nor do entries whose digest did not cover the subject yet)
+            self._conn.execute("ALTER TABLE dedup_index ADD COLUMN digest TEXT")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            self._conn.execute("DELETE FROM dedup_index WHERE created_at < ?", (cutoff,))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT fingerprint, email_id, sender, result, created_at, digest FROM dedup_index ORDER BY id DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+            for fingerprint, email_id, sender, result, created_at, digest in reversed(rows):
+                self._insert(_Entry(fingerprint % (1 << 64), email_id, sender, json.loads(result), created_at, digest))
+        logger.info(f"Loaded {len(rows)} email fingerprints from {self.path}")
+
+    def _band_keys(self, fingerprint: int):
+        for index, (start, end) in enumerate(self._bands):
+            yield index, fingerprint >> start & ((1 << (end - start)) - 1)
+
+    def _insert(self, entry: _Entry):
+        self._entries.append(entry)
+        for index, key in self._band_keys(entry.fingerprint):
+            self._buckets[index].setdefault(key, []).append(entry)
+
+    def _remove(self, entry: _Entry):
+        self._entries.remove(entry)
+        for index, key in self._band_keys(entry.fingerprint):
+            bucket = self._buckets[index].get(key, [])
+            if entry in bucket:
+                bucket.remove(entry)
+            if not bucket:
+                self._buckets[index].pop(key, None)
+
+    def _nearest(self, fingerprint: int) -> Optional[_Entry]:
+        best, best_distance = None, self.max_distance + 1
+        now = time.time()
+        for index, key in self._band_keys(fingerprint):
+            for entry in self._buckets[index].get(key, ()):
+                if now - entry.created_at > self.ttl_seconds:
+                    continue
+                distance = hamming_distance(fingerprint, entry.fingerprint)
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+        return best
+
+    def lookup(self, email: EmailState) -> Optional[dict]:
+        """
+        Returns the reusable result of a near-duplicate email (adapted to this sender),
+        or None. On a miss, the email claims its cluster until remember() or release().
+
+        A draft is only reused as is for an exact duplicate (same subject and body) from a
+        sender with the same name. Otherwise its subject, numbers or names may not fit this
+        email, so it needs review.
+        """
+        fingerprint = simhash(email.cleaned_body)
+        with self._lock:
+            self.emails += 1
+            if fingerprint is None:
+                return None
+            match = self._nearest(fingerprint)
+            if match is None:
+                claim = _Entry(fingerprint, email.email_id, email.sender, digest=email_digest(email))
+                self._insert(claim)
+                self._claims[email.email_id] = claim
+                return None
+
+        if not match.ready.wait(self.wait_seconds) or match.result is None:
+            logger.info(f"Near-duplicate of email {match.email_id} has no result yet; processing {email.email_id} normally.")
+            return None
+
+        with self._lock:
+            self.duplicates += 1
+            self.llm_calls_avoided += match.result.get("llm_calls", 0)
+        logger.info(f"Email {email.email_id} is a near-duplicate of {match.email_id}; reusing its result.")
+        updates = {field: match.result[field] for field in RESULT_FIELDS}
+        if updates["draft_response"]:
+            exact = match.digest == email_digest(email) and _first_name(match.sender) == _first_name(email.sender)
+            if not exact and not updates["needs_human_review"]:
+                logger.info(f"Draft reused from {match.email_id} for {email.email_id} differs in subject, names or numbers; "
+                            f"flagging it for review.")
+                updates["needs_human_review"] = True
+            updates["draft_response"] = adapt_draft(updates["draft_response"], match.sender, email.sender)
+        updates["duplicate_of"] = match.email_id
+        return updates
+
+    def remember(self, email: EmailState, llm_calls: int):
+        """
+        Publishes the result of an email that claimed a cluster so its duplicates can reuse it.
+        """
+        with self._lock:
+            claim = self._claims.pop(email.email_id, None)
+        if claim is None:
+            return
+        if email.category in ("new", "error") or email.status == "error":
+            self.release(email, claim)
+            return
+        claim.result = {field: getattr(email, field) for field in RESULT_FIELDS}
+        claim.result["llm_calls"] = llm_calls
+        claim.ready.set()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO dedup_index (fingerprint, email_id, sender, result, created_at, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (_to_signed(claim.fingerprint), claim.email_id, claim.sender, json.dumps(claim.result), claim.created_at, claim.digest),
+            )
+            self._conn.commit()
+            while len(self._entries) > self.max_entries:
+                oldest = self._entries[0]
+                self._remove(oldest)
+                self._conn.execute("DELETE FROM dedup_index WHERE email_id = ? AND created_at = ?", (oldest.email_id, oldest.created_at))
+            self._conn.commit()
+
+    def release(self, email: EmailState, claim: Optional[_Entry] = None):
+        """
+        Drops the claim of an email that failed, waking its duplicates so they process normally.
+        """
+        with self._lock:
+            claim = claim or self._claims.pop(email.email_id, None)
+            if claim is None:
+                return
+            if claim in self._entries:
+                self._remove(claim)
+        claim.ready.set()
+
+    def stats(self) -> dict:
+        return {
+            "emails": self.emails,
+            "duplicates": self.duplicates,
+            "dedup_rate": self.duplicates / self.emails if self.emails else 0.0,
+            "llm_calls_avoided": self.llm_calls_avoided,
+            "clusters": len(self._entries),
+        }
+
+def get_default_dedup_index() -> Optional[DedupIndex]:
+    """
+    Creates the index configured in config.py, or returns None if deduplication is disabled.
+    """
+    if not config.DEDUP_ENABLED:
+        return None
+    return DedupIndex(config.DEDUP_PATH, max_distance=config.DEDUP_MAX_DISTANCE, ttl_seconds=config.DEDUP_TTL_SECONDS,
+                      max_entries=config.DEDUP_MAX_ENTRIES, wait_seconds=config.DEDUP_WAIT_SECONDS)
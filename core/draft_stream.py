@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from utils.logger import logger
+from utils.metrics import metrics
+
+DRAFT_FIRST_TOKEN_SECONDS = metrics.histogram("mailmind_draft_first_token_seconds",
+                                              "Time from requesting a draft to its first streamed token")
+DRAFT_SECONDS = metrics.histogram("mailmind_draft_seconds",
+                                  "Time to generate a whole draft, by outcome (complete, cancelled, failed)")
+
+PARTIAL_SUFFIX = "_draft.partial.txt"
+CANCEL_SUFFIX = "_draft.cancel"
+
+# Called with (email_id, chunk) for every chunk of every streamed draft
+DraftListener = Callable[[str, str], None]
+
+class DraftCancelled(Exception):
+    """Raised inside generation when the reviewer rejected the draft before it was finished."""
+
+def partial_draft_path(directory: str, email_id: str) -> str:
+    return os.path.join(directory, f"{email_id}{PARTIAL_SUFFIX}")
+
+def read_partial_draft(directory: str, email_id: str) -> Optional[str]:
+    """
+    The text generated so far for a draft still being streamed, or None if there is none.
+    """
+    try:
+        with open(partial_draft_path(directory, email_id), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def streaming_drafts(directory: str) -> List[str]:
+    """
+    IDs of the emails whose drafts are being generated right now, by any process.
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len(PARTIAL_SUFFIX)] for name in names if name.endswith(PARTIAL_SUFFIX))
+
+def request_cancel(directory: str, email_id: str) -> bool:
+    """
+    Asks the process generating a draft (possibly another one) to stop.
+    Returns False if no draft is being generated for the email.
+    """
+    if not os.path.exists(partial_draft_path(directory, email_id)):
+        return False
+    with open(os.path.join(directory, f"{email_id}{CANCEL_SUFFIX}"), "w", encoding="utf-8"):
+        pass
+    return True
+
+class DraftStream:
+    """
+    One draft as it is generated. Each chunk is passed to the listeners (e.g. the review
+    console) and, with a directory, appended to <directory>/<email_id>_draft.partial.txt so
+    a reviewer can read it before it is finished. cancel(), or a cancel file written by
+    request_cancel() in another process, stops the generation at the next chunk.
+    """
+
+    def __init__(self, email_id: str, directory: Optional[str] = None, listeners: List[DraftListener] = (),
+                 poll_seconds: float = 0.2, on_close: Optional[Callable[["DraftStream"], None]] = None):
+        self.email_id = email_id
+        self.directory = directory
+        self.listeners = listeners
+        self.poll_seconds = poll_seconds
+        self.on_close = on_close
+        self.chunks: List[str] = []
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self._cancelled = threading.Event()
+        self._checked_at = 0.0
+        self._file = None
+        if directory is not None:
+            # Created up front so the draft can be rejected while waiting for its first token
+            self._file = open(partial_draft_path(directory, email_id), "w", encoding="utf-8")
+            self._remove(CANCEL_SUFFIX)  # left over from an earlier run
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def write(self, chunk: str):
+        if not chunk:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks.append(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+            self._file.flush()
+        for listener in self.listeners:
+            try:
+                listener(self.email_id, chunk)
+            except Exception as e:
+                logger.warning(f"Draft listener failed for email {self.email_id}: {e}")
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        if self._cancelled.is_set():
+            return True
+        if self.directory is not None:
+            # Cancel files come from other processes; checking every chunk would mean a stat per token
+            now = time.monotonic()
+            if now - self._checked_at >= self.poll_seconds:
+                self._checked_at = now
+                if os.path.exists(os.path.join(self.directory, f"{self.email_id}{CANCEL_SUFFIX}")):
+                    self._cancelled.set()
+        return self._cancelled.is_set()
+
+    def _remove(self, suffix: str):
+        try:
+            os.remove(os.path.join(self.directory, f"{self.email_id}{suffix}"))
+        except FileNotFoundError:
+            pass
+
+    def close(self, outcome: str):
+        """
+        Records the time to first token and the total draft time under `outcome`, then
+        removes the partial file and any cancel request. The finished draft is stored by
+        the workflow as before.
+        """
+        elapsed = time.perf_counter() - self.started_at
+        DRAFT_SECONDS.observe(elapsed, outcome=outcome)
+        if self.first_token_at is not None:
+            first_token = self.first_token_at - self.started_at
+            DRAFT_FIRST_TOKEN_SECONDS.observe(first_token)
+            logger.info(f"Draft for email {self.email_id} {outcome}: first token after {first_token:.2f}s, "
+                        f"{elapsed:.2f}s in total ({len(self.chunks)} chunks)")
+        else:
+            logger.info(f"Draft for email {self.email_id} {outcome} after {elapsed:.2f}s with no tokens")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.directory is not None:
+            self._remove(PARTIAL_SUFFIX)
+            self._remove(CANCEL_SUFFIX)
+        if self.on_close is not None:
+            self.on_close(self)
+
+class DraftStreams:
+    """
+    The drafts being generated right now, by email ID, with listeners shared by all of them.
+    """
+
+    def __init__(self, directory: Optional[str] = None, poll_seconds: float = 0.2):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.poll_seconds = poll_seconds
+        self.listeners: List[DraftListener] = []
+        self._streams: Dict[str, DraftStream] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: DraftListener):
+        self.listeners.append(listener)
+
+    def open(self, email_id: str) -> DraftStream:
+        stream = DraftStream(email_id, self.directory, self.listeners, self.poll_seconds, on_close=self._forget)
+        with self._lock:
+            self._streams[email_id] = stream
+        return stream
+
+    def _forget(self, stream: DraftStream):
+        with self._lock:
+            if self._streams.get(stream.email_id) is stream:
+                del self._streams[stream.email_id]
+
+    def get(self, email_id: str) -> Optional[DraftStream]:
+        with self._lock:
+            return self._streams.get(email_id)
+
+    def active(self) -> List[str]:
+        with self._lock:
+            return list(self._streams)
+
+    def cancel(self, email_id: str) -> bool:
+        """
+        Stops the generation of an email's draft. Returns False if none is in progress.
+        """
+        stream = self.get(email_id)
+        if stream is None:
+            return False
+        stream.cancel()
+        return True
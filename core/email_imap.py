@@ -1,19 +1,44 @@
 import imaplib
 import email
+import base64
+import quopri
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from email.header import decode_header
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 from core.state import EmailState
+from core.imap_sync_state import SyncStateStore
+from core.email_threads import thread_fields
+from core.imap_parser import parse_fetch_response, find_body_item, find_text_parts, choose_text_part
 from utils.formatter import clean_email_body
+from utils.iterators import iterate_in_thread
 from utils.logger import logger
+from utils.metrics import metrics
 import config
 
+IMAP_FETCH_SECONDS = metrics.histogram("mailmind_imap_fetch_seconds", "Time to download and parse a set of messages")
+IMAP_MESSAGES = metrics.counter("mailmind_imap_messages_total", "Messages downloaded from IMAP")
+IMAP_ERRORS = metrics.counter("mailmind_imap_errors_total", "Failed IMAP FETCH commands by phase")
+
+# Headers kept on EmailState for cheap local classification, and the recipients for threading
+KEPT_HEADERS = ["List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted", "X-Auto-Response-Suppress", "Date", "To", "Cc"]
+
+UID_PATTERN = re.compile(rb"UID (\d+)")
+
+# Header fields requested in header-first mode
+FETCH_HEADER_FIELDS = ["FROM", "SUBJECT", "MESSAGE-ID", "IN-REPLY-TO", "REFERENCES"] + [name.upper() for name in KEPT_HEADERS]
+
+# Below this many messages, starting worker processes costs more than parsing inline
+PARALLEL_PARSE_MIN_MESSAGES = 200
+
 def _decode_header_safely(header_value) -> str:
     """
     Safely decodes an email header, handling different character sets.
     """
     if not header_value:
         return ""
-    
+
     decoded_parts = []
     for part, charset in decode_header(header_value):
         if isinstance(part, bytes):
@@ -24,105 +49,470 @@ def _decode_header_safely(header_value) -> str:
                 decoded_parts.append(part.decode('latin-1', errors='replace'))
         else:
             decoded_parts.append(part)
-            
+
     return "".join(decoded_parts)
 
-def fetch_unread_emails() -> List[EmailState]:
+def _decode_payload(payload: bytes, charset: Optional[str]) -> str:
     """
-    Fetches unread emails from the configured IMAP server with robust encoding handling.
+    Decodes a body payload, trying utf-8 then latin-1 when no charset is declared.
     """
-    emails_list: List[EmailState] = []
+    if charset:
+        try:
+            return payload.decode(charset, errors='replace')
+        except LookupError:
+            pass
     try:
-        logger.info(f"Connecting to IMAP server: {config.IMAP_SERVER}")
-        mail = imaplib.IMAP4_SSL(config.IMAP_SERVER, config.IMAP_PORT)
-        mail.login(config.IMAP_USERNAME, config.IMAP_PASSWORD)
-        
-        mail.select("inbox")
-        
-        status, messages = mail.search(None, "UNSEEN")
-        if status != "OK":
-            logger.error("Failed to search for emails.")
-            return []
-            
-        email_ids = messages[0].split()
-        if not email_ids:
-            logger.info("No unread emails found.")
-            mail.logout()
-            return []
-            
-        logger.info(f"Found {len(email_ids)} unread emails.")
+        return payload.decode('utf-8', errors='strict')
+    except UnicodeDecodeError:
+        return payload.decode('latin-1', errors='replace')
+
+def _build_email_state(msg, body: str, email_id: str) -> EmailState:
+    """
+    Builds an EmailState from a parsed message (or header block) and its decoded body.
+    """
+    return EmailState(
+        email_id=email_id,
+        subject=_decode_header_safely(msg["Subject"]),
+        sender=_decode_header_safely(msg.get("From")),
+        body=body,
+        cleaned_body=clean_email_body(body),
+        headers={name: _decode_header_safely(msg[name]) for name in KEPT_HEADERS if msg[name] is not None},
+        **thread_fields(msg["Message-ID"], msg["In-Reply-To"], msg["References"]),
+    )
+
+def parse_email_message(raw_bytes: bytes, email_id: str) -> EmailState:
+    """
+    Parses a raw RFC822 message into an EmailState, preferring the text/plain body.
+    """
+    msg = email.message_from_bytes(raw_bytes)
+
+    # Get email body with proper decoding
+    body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            content_disposition = str(part.get("Content-Disposition"))
+
+            if "attachment" in content_disposition:
+                continue
+
+            if content_type in ["text/plain", "text/html"]:
+                try:
+                    body = _decode_payload(part.get_payload(decode=True), part.get_content_charset())
+                    if content_type == "text/plain":
+                        break # Prefer plain text
+                except Exception as e:
+                    logger.warning(f"Could not decode part of email {email_id}: {e}")
+    else:
+        # Not a multipart email, just get the payload
+        try:
+            body = _decode_payload(msg.get_payload(decode=True), msg.get_content_charset())
+        except Exception as e:
+            logger.warning(f"Could not decode payload of email {email_id}: {e}")
+
+    return _build_email_state(msg, body, email_id)
+
+def _build_from_parts(uid: int, header_bytes: bytes, body_bytes: Optional[bytes], part: Optional[dict]) -> EmailState:
+    """
+    Builds an EmailState from a header-first fetch: the header block plus the raw,
+    still transfer-encoded text part (if one was found).
+    """
+    body = ""
+    if part and body_bytes is not None:
+        try:
+            payload = _decode_transfer_encoding(body_bytes, part["encoding"])
+            body = _decode_payload(payload, part["charset"])
+        except Exception as e:
+            logger.warning(f"Could not decode body of email {uid}: {e}")
+    return _build_email_state(email.message_from_bytes(header_bytes), body, str(uid))
+
+def _parse_raw_batch(items: List[Tuple[int, bytes]]) -> Dict[int, EmailState]:
+    return {uid: parse_email_message(raw, str(uid)) for uid, raw in items}
+
+def _build_parts_batch(items: List[tuple]) -> Dict[int, EmailState]:
+    return {item[0]: _build_from_parts(*item) for item in items}
 
-        for email_id in email_ids:
-            status, msg_data = mail.fetch(email_id, "(RFC822)")
+class _ParsePipeline:
+    """
+    Parses fetched messages while the next FETCH is on the wire. With more than one
+    worker, batches go to a process pool so parsing scales across cores; at most
+    2 * workers batches are queued, which bounds memory when the network outpaces parsing.
+    """
+
+    def __init__(self, workers: int):
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.max_pending = 2 * workers
+        self.pending = deque()
+        self.emails: Dict[int, EmailState] = {}
+
+    def submit(self, parse: Callable[[list], Dict[int, EmailState]], items: list):
+        if not items:
+            return
+        if self.executor is None:
+            self.emails.update(parse(items))
+            return
+        while len(self.pending) >= self.max_pending:
+            self._collect(*self.pending.popleft())
+        self.pending.append((self.executor.submit(parse, items), parse, items))
+
+    def _collect(self, future, parse, items):
+        try:
+            self.emails.update(future.result())
+        except Exception as e:
+            # A crashed worker must not lose the batch; parse it here instead
+            logger.warning(f"Parser worker failed ({e}); parsing {len(items)} emails inline.")
+            self.emails.update(parse(items))
+
+    def finish(self) -> Dict[int, EmailState]:
+        try:
+            while self.pending:
+                self._collect(*self.pending.popleft())
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+        return self.emails
+
+def _parse_workers(message_count: int, workers: Optional[int]) -> int:
+    workers = config.IMAP_PARSE_WORKERS if workers is None else workers
+    return workers if message_count >= PARALLEL_PARSE_MIN_MESSAGES else 1
+
+def connect_imap(server: Optional[str] = None, port: Optional[int] = None, username: Optional[str] = None,
+                 password: Optional[str] = None) -> imaplib.IMAP4_SSL:
+    """
+    Opens an authenticated connection to an IMAP server, by default the configured one.
+    """
+    server = server or config.IMAP_SERVER
+    logger.info(f"Connecting to IMAP server: {server}")
+    mail = imaplib.IMAP4_SSL(server, port or config.IMAP_PORT)
+    mail.login(username or config.IMAP_USERNAME, password or config.IMAP_PASSWORD)
+    return mail
+
+def _uid_set(uids: List[int]) -> str:
+    """
+    Compresses UIDs into an IMAP sequence set, e.g. [1, 2, 3, 7] -> "1:3,7".
+    """
+    ranges = []
+    for uid in sorted(uids):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+def _chunks(uids: List[int], size: int) -> Iterator[List[int]]:
+    for i in range(0, len(uids), max(1, size)):
+        yield uids[i:i + size]
+
+def _decode_transfer_encoding(data: bytes, encoding: str) -> bytes:
+    if encoding == "base64":
+        return base64.b64decode(data, validate=False)
+    if encoding == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+def _fetch_full_messages(mail, uids: List[int], chunk_size: int, workers: Optional[int] = None) -> Dict[int, EmailState]:
+    """
+    Downloads whole messages, one UID FETCH round-trip per chunk of UIDs. Each chunk is
+    handed to the parse pipeline as soon as it arrives.
+    """
+    pipeline = _ParsePipeline(_parse_workers(len(uids), workers))
+    try:
+        for chunk in _chunks(uids, chunk_size):
+            status, msg_data = mail.uid("FETCH", _uid_set(chunk), "(UID BODY.PEEK[])")
             if status != "OK":
-                logger.error(f"Failed to fetch email with ID {email_id.decode()}.")
+                logger.error(f"Failed to fetch emails with UIDs {_uid_set(chunk)}.")
+                IMAP_ERRORS.inc(phase="full")
                 continue
-            
+            raw_messages = []
             for response_part in msg_data:
                 if isinstance(response_part, tuple):
-                    msg = email.message_from_bytes(response_part[1])
-                    
-                    # Safely decode subject and sender
-                    subject = _decode_header_safely(msg["Subject"])
-                    sender = _decode_header_safely(msg.get("From"))
-
-                    # Get email body with proper decoding
-                    body = ""
-                    if msg.is_multipart():
-                        for part in msg.walk():
-                            content_type = part.get_content_type()
-                            content_disposition = str(part.get("Content-Disposition"))
-                            
-                            if "attachment" in content_disposition:
-                                continue
-
-                            if content_type in ["text/plain", "text/html"]:
-                                try:
-                                    payload = part.get_payload(decode=True)
-                                    charset = part.get_content_charset()
-                                    if charset:
-                                        body = payload.decode(charset, errors='replace')
-                                    else:
-                                        # If no charset, try utf-8 then latin-1 as a fallback
-                                        try:
-                                            body = payload.decode('utf-8', errors='strict')
-                                        except UnicodeDecodeError:
-                                            body = payload.decode('latin-1', errors='replace')
-                                    if content_type == "text/plain":
-                                        break # Prefer plain text
-                                except Exception as e:
-                                    logger.warning(f"Could not decode part of email {email_id.decode()}: {e}")
-
-                    else:
-                        # Not a multipart email, just get the payload
-                        try:
-                            payload = msg.get_payload(decode=True)
-                            charset = msg.get_content_charset()
-                            if charset:
-                                body = payload.decode(charset, errors='replace')
-                            else:
-                                try:
-                                    body = payload.decode('utf-8', errors='strict')
-                                except UnicodeDecodeError:
-                                    body = payload.decode('latin-1', errors='replace')
-                        except Exception as e:
-                            logger.warning(f"Could not decode payload of email {email_id.decode()}: {e}")
-
-                    cleaned_body = clean_email_body(body)
-
-                    email_state = EmailState(
-                        email_id=email_id.decode(),
-                        subject=subject,
-                        sender=sender,
-                        body=body,
-                        cleaned_body=cleaned_body,
-                    )
-                    emails_list.append(email_state)
-                    logger.info(f"Successfully parsed email from {sender} with subject '{subject}'")
-
-        mail.logout()
-        return emails_list
+                    match = UID_PATTERN.search(response_part[0])
+                    if match:
+                        raw_messages.append((int(match.group(1)), response_part[1]))
+            pipeline.submit(_parse_raw_batch, raw_messages)
+    finally:
+        emails = pipeline.finish()
+    return emails
+
+def _fetch_header_first(mail, uids: List[int], chunk_size: int, workers: Optional[int] = None) -> Dict[int, EmailState]:
+    """
+    Two-phase fetch: BODYSTRUCTURE plus selected headers first, then only the chosen
+    text/plain or text/html part of each message. Attachments are never downloaded.
+    """
+    header_items = f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({' '.join(FETCH_HEADER_FIELDS)})])"
+    headers: Dict[int, bytes] = {}
+    sections: Dict[str, List[int]] = {}
+    text_parts: Dict[int, dict] = {}
+    fallback: List[int] = []
+
+    for chunk in _chunks(uids, chunk_size):
+        status, msg_data = mail.uid("FETCH", _uid_set(chunk), header_items)
+        if status != "OK":
+            logger.error(f"Failed to fetch headers for UIDs {_uid_set(chunk)}.")
+            IMAP_ERRORS.inc(phase="headers")
+            continue
+        try:
+            parsed = parse_fetch_response(msg_data)
+        except ValueError as e:
+            logger.warning(f"Could not parse BODYSTRUCTURE response, fetching full messages instead: {e}")
+            fallback.extend(chunk)
+            continue
+        for uid, fields in parsed.items():
+            headers[uid] = find_body_item(fields, "BODY[HEADER") or b""
+            structure = fields.get("BODYSTRUCTURE")
+            part = choose_text_part(find_text_parts(structure)) if isinstance(structure, list) else None
+            if part:
+                text_parts[uid] = part
+                sections.setdefault(part["section"], []).append(uid)
+
+    # Messages sharing a section number (typically "1" or "1.1") are fetched together
+    pipeline = _ParsePipeline(_parse_workers(len(headers), workers))
+    try:
+        for section, section_uids in sections.items():
+            for chunk in _chunks(section_uids, chunk_size):
+                status, msg_data = mail.uid("FETCH", _uid_set(chunk), f"(UID BODY.PEEK[{section}])")
+                if status != "OK":
+                    # Left out of the result rather than returned without a body, so they are fetched again
+                    logger.error(f"Failed to fetch body section {section} for UIDs {_uid_set(chunk)}.")
+                    IMAP_ERRORS.inc(phase="body")
+                    for uid in chunk:
+                        headers.pop(uid, None)
+                    continue
+                pipeline.submit(_build_parts_batch, [
+                    (uid, headers.pop(uid), find_body_item(fields, f"BODY[{section}]") or b"", text_parts[uid])
+                    for uid, fields in parse_fetch_response(msg_data).items() if uid in headers
+                ])
+        # Messages without a text part keep an empty body
+        pipeline.submit(_build_parts_batch, [(uid, header_bytes, None, None) for uid, header_bytes in headers.items()])
+    finally:
+        emails = pipeline.finish()
+
+    if fallback:
+        emails.update(_fetch_full_messages(mail, fallback, chunk_size, workers))
+    return emails
+
+def fetch_emails_by_uid(mail, uids: List[int], chunk_size: Optional[int] = None, header_first: Optional[bool] = None,
+                        parse_workers: Optional[int] = None) -> List[EmailState]:
+    """
+    Fetches the given UIDs in batches of `chunk_size`, returning EmailStates in UID order.
+    Messages whose FETCH failed are left out, so callers must not treat them as fetched.
+    With header_first, only headers, BODYSTRUCTURE and the preferred text part are downloaded.
+    Large pulls are parsed by `parse_workers` processes while later batches download.
+    """
+    chunk_size = chunk_size or config.IMAP_FETCH_CHUNK_SIZE
+    header_first = config.IMAP_HEADER_FIRST if header_first is None else header_first
+    uids = sorted(uids)
+    if not uids:
+        return []
+
+    with IMAP_FETCH_SECONDS.time(mode="header_first" if header_first else "full"):
+        if header_first:
+            emails = _fetch_header_first(mail, uids, chunk_size, parse_workers)
+        else:
+            emails = _fetch_full_messages(mail, uids, chunk_size, parse_workers)
+    emails_list = [emails[uid] for uid in uids if uid in emails]
+    IMAP_MESSAGES.inc(len(emails_list))
+    for email_state in emails_list:
+        logger.info(f"Successfully parsed email from {email_state.sender} with subject '{email_state.subject}'")
+    return emails_list
+
+def mailbox_email_id(folder: str, uidvalidity: Optional[int], uid: int) -> str:
+    """
+    The email_id of a fetched message. UIDs are only unique within a folder and its
+    UIDVALIDITY, and the id keys the ledger, checkpoints, review queue and draft files,
+    so a UID reused after a UIDVALIDITY change must not match the earlier message.
+    """
+    folder = re.sub(r"[^a-z0-9]+", "_", folder.lower()).strip("_")  # used in file names
+    return f"{folder}-{uidvalidity}-{uid}" if uidvalidity is not None else f"{folder}-{uid}"
+
+def _assign_email_ids(emails: List[EmailState], folder: str, uidvalidity: Optional[int]) -> List[int]:
+    """
+    Replaces the bare UIDs fetch_emails_by_uid uses as email_id. Returns the UIDs fetched.
+    """
+    uids = []
+    for email_state in emails:
+        uids.append(int(email_state.email_id))
+        email_state.email_id = mailbox_email_id(folder, uidvalidity, uids[-1])
+    return uids
+
+def iter_unread_emails(window: Optional[int] = None,
+                       spool: Optional[Callable[[List[EmailState]], None]] = None) -> Iterator[EmailState]:
+    """
+    Streams unread emails from the configured IMAP server, `window` messages at a time, so
+    memory use and time-to-first-email do not grow with the size of the inbox. The emails of
+    each window are marked as \\Seen once the consumer has taken all of them; messages
+    that failed to fetch stay unread and are fetched again by the next run.
+
+    The consumer usually takes emails well before it has finished them, so a crash would
+    lose emails already marked as \\Seen. With `spool` (e.g. EmailSupervisor.spool), each
+    window is handed to it to be stored durably before any of its emails is yielded.
+    """
+    window = window or config.IMAP_STREAM_WINDOW
+    mail = None
+    try:
+        mail = connect_imap()
+
+        mail.select("inbox")
+        uidvalidity = _response_int(mail, "UIDVALIDITY")
+
+        status, messages = mail.uid("SEARCH", None, "UNSEEN")
+        if status != "OK":
+            logger.error("Failed to search for emails.")
+            return
+
+        uids = [int(uid) for uid in messages[0].split()]
+        if not uids:
+            logger.info("No unread emails found.")
+            return
+
+        logger.info(f"Found {len(uids)} unread emails.")
+
+        for window_uids in _chunks(uids, window):
+            emails = fetch_emails_by_uid(mail, window_uids)
+            fetched = _assign_email_ids(emails, "inbox", uidvalidity)
+            if len(fetched) < len(window_uids):
+                logger.warning(f"{len(window_uids) - len(fetched)} unread emails failed to fetch; they stay unread for the next run.")
+            if spool is not None:
+                spool(emails)
+            yield from emails
+            for chunk in _chunks(fetched, config.IMAP_FETCH_CHUNK_SIZE):
+                mail.uid("STORE", _uid_set(chunk), "+FLAGS", "(\\Seen)")
 
     except Exception as e:
         logger.error(f"An error occurred while fetching emails: {e}")
-        return []
\ No newline at end of file
+    finally:
+        if mail is not None:
+            try:
+                mail.logout()
+            except Exception:
+                pass
+
+def aiter_unread_emails(window: Optional[int] = None,
+                        spool: Optional[Callable[[List[EmailState]], None]] = None) -> AsyncIterator[EmailState]:
+    """
+    Async variant of iter_unread_emails; IMAP I/O and parsing run in a worker thread.
+    """
+    return iterate_in_thread(iter_unread_emails(window, spool))
+
+def fetch_unread_emails() -> List[EmailState]:
+    """
+    Fetches unread emails from the configured IMAP server with robust encoding handling.
+    Fetched messages are marked as \\Seen so the next run does not pick them up again.
+    """
+    return list(iter_unread_emails())
+
+def _response_int(mail, code: str) -> Optional[int]:
+    """
+    Reads a numeric untagged response code (e.g. UIDVALIDITY) left over from SELECT.
+    """
+    _, data = mail.response(code)
+    if not data or data[-1] is None:
+        return None
+    value = data[-1].decode() if isinstance(data[-1], bytes) else str(data[-1])
+    match = re.search(r"\d+", value)
+    return int(match.group(0)) if match else None
+
+def _search_uids(mail, criteria: str) -> List[int]:
+    status, data = mail.uid("SEARCH", None, criteria)
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"UID SEARCH {criteria} failed")
+    return sorted(int(uid) for uid in (data[0] or b"").split())
+
+def iter_new_emails(folder: str = "inbox", mail=None, state_store: Optional[SyncStateStore] = None,
+                    window: Optional[int] = None,
+                    spool: Optional[Callable[[List[EmailState]], None]] = None) -> Iterator[EmailState]:
+    """
+    Incrementally streams messages that arrived since the last run, using UIDs.
+
+    The last processed UID and the folder's UIDVALIDITY are persisted, so each poll costs
+    O(new mail) and does not depend on the \\Seen flag. On the first run, or after the server
+    resets UIDVALIDITY, the currently unread messages are used to seed the watermark; the
+    email ids include UIDVALIDITY (see mailbox_email_id), so reused UIDs are new emails.
+    When the server supports CONDSTORE, an unchanged HIGHESTMODSEQ skips the search entirely.
+    Messages are fetched `window` at a time with BODY.PEEK so they are not marked as read,
+    and the watermark advances as each window is consumed. It stops just before the first
+    message that failed to fetch, so the next run fetches it again (and, with it, the later
+    messages already returned, which skip_done or the work queue drop). As in iter_unread_emails, pass
+    `spool` unless the consumer finishes each email before taking the next one, or stores
+    it durably itself (as the work queue does).
+    """
+    state_store = state_store or SyncStateStore(config.IMAP_SYNC_STATE_PATH)
+    window = window or config.IMAP_STREAM_WINDOW
+    owns_connection = mail is None
+    try:
+        if owns_connection:
+            mail = connect_imap()
+
+        condstore = "CONDSTORE" in getattr(mail, "capabilities", ())
+        if condstore:
+            try:
+                mail.enable("CONDSTORE")
+            except Exception as e:
+                logger.debug(f"ENABLE CONDSTORE failed, continuing without it: {e}")
+                condstore = False
+
+        status, _ = mail.select(folder)
+        if status != "OK":
+            logger.error(f"Failed to select folder {folder}.")
+            return
+
+        uidvalidity = _response_int(mail, "UIDVALIDITY")
+        uidnext = _response_int(mail, "UIDNEXT")
+        highestmodseq = _response_int(mail, "HIGHESTMODSEQ") if condstore else None
+        saved = state_store.get(folder)
+
+        if saved is None or saved.get("uidvalidity") != uidvalidity:
+            if saved is not None:
+                logger.warning(f"UIDVALIDITY changed for {folder}; re-seeding sync state from unread messages.")
+            last_uid = 0
+            uids = _search_uids(mail, "UNSEEN")
+        else:
+            last_uid = saved.get("last_uid", 0)
+            if highestmodseq is not None and highestmodseq == saved.get("highestmodseq"):
+                logger.info(f"No changes in {folder} since last sync (HIGHESTMODSEQ {highestmodseq}).")
+                return
+            if uidnext is not None and uidnext <= last_uid + 1:
+                logger.info(f"No new emails in {folder} since UID {last_uid}.")
+                state_store.update(folder, uidvalidity=uidvalidity, last_uid=last_uid, highestmodseq=highestmodseq)
+                return
+            # "N:*" always matches the highest UID, even if it is below N, so filter explicitly
+            uids = [uid for uid in _search_uids(mail, f"UID {last_uid + 1}:*") if uid > last_uid]
+
+        logger.info(f"Found {len(uids)} new emails in {folder} (after UID {last_uid}).")
+
+        watermark = last_uid
+        complete = True  # every UID up to here was fetched
+        for window_uids in _chunks(uids, window):
+            emails = fetch_emails_by_uid(mail, window_uids)
+            fetched = set(_assign_email_ids(emails, folder, uidvalidity))
+            if complete:
+                for uid in window_uids:
+                    if uid not in fetched:
+                        logger.warning(f"Email {uid} in {folder} failed to fetch; the next sync starts from it.")
+                        complete = False
+                        break
+                    watermark = uid
+            if spool is not None:
+                spool(emails)
+            yield from emails
+            # HIGHESTMODSEQ is only stored with the final watermark, so an interrupted sync is not skipped
+            state_store.update(folder, uidvalidity=uidvalidity, last_uid=watermark, highestmodseq=None)
+
+        if complete:
+            watermark = max([watermark] + ([uidnext - 1] if uidnext else []))
+            state_store.update(folder, uidvalidity=uidvalidity, last_uid=watermark, highestmodseq=highestmodseq)
+
+    except Exception as e:
+        logger.error(f"An error occurred while syncing emails: {e}")
+    finally:
+        if owns_connection and mail is not None:
+            try:
+                mail.logout()
+            except Exception:
+                pass
+
+def fetch_new_emails(folder: str = "inbox", mail=None, state_store: Optional[SyncStateStore] = None) -> List[EmailState]:
+    """
+    Incrementally fetches messages that arrived since the last run (see iter_new_emails).
+    """
+    return list(iter_new_emails(folder, mail=mail, state_store=state_store))
@@ -1,34 +1,120 @@
 import json
-from typing import List
+from typing import AsyncIterator, Iterator, List, TextIO
 from core.state import EmailState
+from core.email_threads import thread_fields
 from utils.formatter import clean_email_body
+from utils.iterators import iterate_in_thread
 from utils.logger import logger
 
-def load_emails_from_json(file_path: str) -> List[EmailState]:
+try:
+    import ijson  # optional: C-accelerated incremental parser for very large exports
+except ImportError:
+    ijson = None
+
+READ_SIZE = 64 * 1024
+
+def _iter_json_array(f: TextIO) -> Iterator[dict]:
     """
-    Loads email data from a JSON file and returns a list of EmailState objects.
+    Yields the items of a top-level JSON array one at a time, reading the file in
+    fixed-size blocks so memory stays bounded by the largest single item.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # Skip whitespace and separators between items
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position >= len(buffer) and not eof:
+            block = f.read(READ_SIZE)
+            eof = not block
+            buffer, position = buffer[position:] + block, 0
+            continue
+        if not started:
+            if position >= len(buffer) or buffer[position] != "[":
+                raise json.JSONDecodeError("Expected a JSON array", buffer, position)
+            started = True
+            position += 1
+            continue
+        if position >= len(buffer):
+            raise json.JSONDecodeError("Unterminated JSON array", buffer, position)
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The item continues in the next block
+            block = f.read(READ_SIZE)
+            eof = not block
+            buffer, position = buffer[position:] + block, 0
+            continue
+        if end == len(buffer) and not eof:
+            # A number at the end of the buffer may still be incomplete
+            block = f.read(READ_SIZE)
+            eof = not block
+            buffer, position = buffer[position:] + block, 0
+            continue
+        yield item
+        position = end
+        if position > READ_SIZE:
+            buffer, position = buffer[position:], 0
+
+def _to_email_state(item: dict) -> EmailState:
+    headers = item.get("headers", {})
+    threading_headers = thread_fields(
+        item.get("message_id") or headers.get("Message-ID"),
+        item.get("in_reply_to") or headers.get("In-Reply-To"),
+        item.get("references") or headers.get("References"),
+    )
+    return EmailState(
+        email_id=item.get("email_id", "local-id"),
+        subject=item.get("subject", ""),
+        sender=item.get("sender", ""),
+        body=item.get("body", ""),
+        headers=headers,
+        cleaned_body=clean_email_body(item.get("body", "")),
+        **threading_headers,
+    )
+
+def iter_emails_from_json(file_path: str) -> Iterator[EmailState]:
+    """
+    Streams EmailState objects from a JSON array file without loading it all into memory.
+    Uses ijson when it is installed and a stdlib incremental reader otherwise.
     """
-    logger.info(f"Loading emails from local JSON file: {file_path}")
-    emails_list: List[EmailState] = []
+    logger.info(f"Streaming emails from local JSON file: {file_path}")
+    count = 0
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            for item in data:
-                cleaned_body = clean_email_body(item.get("body", ""))
-                email_state = EmailState(
-                    email_id=item.get("email_id", "local-id"),
-                    subject=item.get("subject", ""),
-                    sender=item.get("sender", ""),
-                    body=item.get("body", ""),
-                    cleaned_body=cleaned_body
-                )
-                emails_list.append(email_state)
-        logger.info(f"Successfully loaded {len(emails_list)} emails from JSON.")
+        if ijson is not None:
+            with open(file_path, 'rb') as f:
+                for item in ijson.items(f, "item"):
+                    count += 1
+                    yield _to_email_state(item)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for item in _iter_json_array(f):
+                    count += 1
+                    yield _to_email_state(item)
+        logger.info(f"Successfully loaded {count} emails from JSON.")
     except FileNotFoundError:
         logger.error(f"JSON file not found at {file_path}")
-    except json.JSONDecodeError:
-        logger.error(f"Error decoding JSON from {file_path}")
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error decoding JSON from {file_path} after {count} emails: {e}")
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
-        
-    return emails_list
\ No newline at end of file
+
+def aiter_emails_from_json(file_path: str) -> AsyncIterator[EmailState]:
+    """
+    Async variant of iter_emails_from_json; file reads and parsing run in a worker thread.
+    """
+    return iterate_in_thread(iter_emails_from_json(file_path))
+
+def load_emails_from_json(file_path: str) -> List[EmailState]:
+    """
+    Loads email data from a JSON file and returns a list of EmailState objects.
+    """
+    return list(iter_emails_from_json(file_path))
@@ -1,9 +1,258 @@
+import random
 import smtplib
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Iterable, List, Optional, Tuple
 from utils.logger import logger
+from utils.metrics import metrics
 import config
 
+SMTP_SECONDS = metrics.histogram("mailmind_smtp_send_seconds", "Latency of SMTP sends, including reconnects")
+SMTP_SENT = metrics.counter("mailmind_smtp_sent_total", "Emails accepted by the SMTP server")
+SMTP_ERRORS = metrics.counter("mailmind_smtp_errors_total", "Failed SMTP sends by whether the error is transient")
+
+def _build_message(sender: str, to_email: str, subject: str, body: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Connection problems and 4xx replies are worth retrying; 5xx replies are permanent.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.error, TimeoutError))
+
+class SMTPClient:
+    """
+    A persistent SMTP connection that is opened lazily, reused across sends and
+    re-established transparently when the server drops it.
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, username: Optional[str] = None,
+                 password: Optional[str] = None, timeout: float = 30.0, max_idle_seconds: float = 60.0):
+        self.host = host or config.EMAIL_SERVER
+        self.port = port or config.EMAIL_PORT
+        self.username = username if username is not None else config.EMAIL_USERNAME
+        self.password = password if password is not None else config.EMAIL_PASSWORD
+        self.timeout = timeout
+        # Idle connections are checked with NOOP before reuse; servers often drop them after a minute or so
+        self.max_idle_seconds = max_idle_seconds
+        self.connections_opened = 0
+        self.sent = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=10000)
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        logger.info(f"Connecting to SMTP server {self.host}:{self.port}.")
+        server = smtplib.SMTP(self.host, self.port)
+        if server.sock is not None:
+            server.sock.settimeout(self.timeout)
+        server.ehlo()
+        if server.has_extn("starttls"):
+            server.starttls()  # Secure the connection
+            server.ehlo()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self._server = server
+        self.connections_opened += 1
+
+    def _ensure_connected(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.max_idle_seconds:
+            try:
+                code, _ = self._server.noop()
+                if code != 250:
+                    self._drop()
+            except smtplib.SMTPException:
+                self._drop()
+        if self._server is None:
+            self._connect()
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+        self._server = None
+
+    def send(self, to_email: str, subject: str, body: str):
+        """
+        Sends one email over the shared connection, reconnecting once if the server hung up.
+        Raises the underlying smtplib error on failure.
+        """
+        msg = _build_message(self.username, to_email, subject, body)
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                for attempt in range(2):
+                    self._ensure_connected()
+                    try:
+                        self._server.sendmail(self.username, to_email, msg.as_string())
+                        break
+                    except smtplib.SMTPServerDisconnected:
+                        self._server = None
+                        if attempt == 1:
+                            raise
+                        logger.warning("SMTP connection dropped; reconnecting.")
+            except Exception as e:
+                self.errors += 1
+                SMTP_ERRORS.inc(transient=is_transient_error(e))
+                raise
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+                SMTP_SECONDS.observe(self.latencies[-1])
+                self._last_used = time.monotonic()
+            self.sent += 1
+            SMTP_SENT.inc()
+        logger.info(f"Email sent successfully to {to_email}")
+
+    def send_many(self, messages: Iterable[Tuple[str, str, str]]) -> List[Optional[Exception]]:
+        """
+        Sends (to_email, subject, body) tuples over one connection. Returns one entry per
+        message: None on success, otherwise the exception that was raised.
+        """
+        results: List[Optional[Exception]] = []
+        for to_email, subject, body in messages:
+            try:
+                self.send(to_email, subject, body)
+                results.append(None)
+            except Exception as e:
+                logger.error(f"Failed to send email to {to_email}: {e}")
+                results.append(e)
+        return results
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+        return {
+            "sent": self.sent,
+            "errors": self.errors,
+            "connections_opened": self.connections_opened,
+            "latency_mean_s": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p50_s": pick(0.50),
+            "latency_p95_s": pick(0.95),
+        }
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class Outbox:
+    """
+    A durable SQLite queue of outgoing emails. Transient failures are retried with
+    exponential backoff; permanent failures and exhausted retries are marked failed.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5, base_delay: float = 30.0, max_delay: float = 3600.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # Workers replying through the same account share the outbox
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, to_email TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        metrics.gauge("mailmind_outbox_pending", "Emails waiting in the outbox for (re)delivery", function=self.pending_count)
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (to_email, subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (to_email, subject, body, now, now),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def pending_count(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()
+        return count
+
+    def _due(self, limit: int) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, to_email, subject, body, attempts FROM outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+
+    def _update(self, message_id: int, status: str, attempts: int, error: Optional[str] = None, next_attempt_at: float = 0.0):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (status, attempts, error, next_attempt_at, message_id),
+            )
+            self._conn.commit()
+
+    def flush(self, client: SMTPClient, limit: int = 500) -> dict:
+        """
+        Sends every due message through `client` and reschedules transient failures.
+        """
+        counts = {"sent": 0, "retrying": 0, "failed": 0}
+        for message_id, to_email, subject, body, attempts in self._due(limit):
+            attempts += 1
+            try:
+                client.send(to_email, subject, body)
+                self._update(message_id, "sent", attempts)
+                counts["sent"] += 1
+            except Exception as e:
+                if is_transient_error(e) and attempts < self.max_attempts:
+                    delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+                    delay += random.uniform(0, delay / 4)
+                    logger.warning(f"Transient error sending to {to_email} (attempt {attempts}); retrying in {delay:.0f}s: {e}")
+                    self._update(message_id, "pending", attempts, str(e), time.time() + delay)
+                    counts["retrying"] += 1
+                else:
+                    logger.error(f"Giving up on email to {to_email} after {attempts} attempts: {e}")
+                    self._update(message_id, "failed", attempts, str(e))
+                    counts["failed"] += 1
+        return counts
+
+def deliver(client: SMTPClient, outbox: Optional[Outbox], to_email: str, subject: str, body: str) -> bool:
+    """
+    Sends an email over a shared client. Transient failures are queued in the outbox
+    for a later retry instead of being lost. Returns True if the email was sent now.
+    """
+    try:
+        client.send(to_email, subject, body)
+        return True
+    except Exception as e:
+        if outbox is not None and is_transient_error(e):
+            logger.warning(f"Queueing email to {to_email} for retry: {e}")
+            outbox.enqueue(to_email, subject, body)
+        else:
+            logger.error(f"Failed to send email to {to_email}: {e}")
+        return False
+
 def send_email(to_email: str, subject: str, body: str):
     """
     Sends an email using the configured SMTP server.
@@ -12,21 +261,9 @@ def send_email(to_email: str, subject: str, body: str):
         logger.error("SMTP configuration is incomplete. Cannot send email.")
         return
 
-    msg = MIMEMultipart()
-    msg['From'] = config.EMAIL_USERNAME
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
     try:
-        logger.info(f"Connecting to SMTP server {config.EMAIL_SERVER}:{config.EMAIL_PORT} to send email.")
-        server = smtplib.SMTP(config.EMAIL_SERVER, config.EMAIL_PORT)
-        server.starttls()  # Secure the connection
-        server.login(config.EMAIL_USERNAME, config.EMAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(config.EMAIL_USERNAME, to_email, text)
-        server.quit()
-        logger.info(f"Email sent successfully to {to_email}")
+        with SMTPClient() as client:
+            client.send(to_email, subject, body)
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {e}")
 
@@ -39,4 +276,4 @@ def save_draft(subject: str, body: str, filename: str):
             f.write(f"Subject: {subject}\n\n{body}")
         logger.info(f"Draft saved to drafts/{filename}")
     except Exception as e:
-        logger.error(f"Failed to save draft: {e}")
\ No newline at end of file
+        logger.error(f"Failed to save draft: {e}")
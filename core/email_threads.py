@@ -0,0 +1,174 @@
+import re
+import sqlite3
+import threading
+import time
+from email.utils import getaddresses, parseaddr
+from typing import List, Optional, Set, Tuple
+from core.state import EmailState
+from utils.logger import logger
+import config
+
+MESSAGE_ID = re.compile(r"<[^<>\s]+>")
+
+def parse_message_ids(header_value: Optional[str]) -> List[str]:
+    """
+    Extracts the <message-id> tokens from a Message-ID, In-Reply-To or References header.
+    """
+    if not header_value:
+        return []
+    return MESSAGE_ID.findall(header_value)
+
+def thread_root(message_id: str, in_reply_to: str, references: List[str]) -> str:
+    """
+    The thread a message belongs to, identified by its root Message-ID: the first entry of
+    References, else the parent from In-Reply-To, else the message itself.
+    """
+    if references:
+        return references[0]
+    return in_reply_to or message_id
+
+def thread_fields(message_id: Optional[str], in_reply_to: Optional[str], references: Optional[str]) -> dict:
+    """
+    Builds the threading fields of an EmailState from raw header values.
+    """
+    own_id = (parse_message_ids(message_id) or [""])[0]
+    parent = (parse_message_ids(in_reply_to) or [""])[0]
+    refs = parse_message_ids(references)
+    return {"message_id": own_id, "in_reply_to": parent, "references": refs, "thread_id": thread_root(own_id, parent, refs)}
+
+def participants(email: EmailState) -> Set[str]:
+    """
+    The lowercased addresses of an email's sender and its To and Cc recipients.
+    """
+    values = [email.sender, email.headers.get("To", ""), email.headers.get("Cc", "")]
+    return {address.lower() for _, address in getaddresses(values) if address}
+
+def _key(account: str, value: str) -> str:
+    # Threads and Message-IDs are stored per account; the configured mailbox keeps bare keys
+    return f"{account} {value}" if account else value
+
+class ThreadStore:
+    """
+    Keeps a running summary per conversation, so each new reply is summarized from the
+    previous thread summary plus the new message instead of the whole quoted history.
+
+    Each summary has a version. A new summary is only stored if the thread is still at
+    the version it was built from. Otherwise a concurrent reply (another batch worker or
+    process) was folded in meanwhile, and the caller summarizes again from the newer
+    summary. The messages already folded into a thread are recorded, so an email that
+    is processed again (resume, retry) is not folded in twice.
+
+    In-Reply-To and References are set by the sender, so threads are kept per account,
+    and an email only joins a stored thread if its sender was already on it (sender or
+    recipient of a message in it). Otherwise a forged References header could pull
+    another conversation's summary into the prompt of a draft that may be sent back.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Worker processes update summaries concurrently; see WorkQueue for the settings
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, summary TEXT NOT NULL, "
+            "message_count INTEGER NOT NULL, updated_at REAL NOT NULL, version INTEGER NOT NULL DEFAULT 0, "
+            "participants TEXT NOT NULL DEFAULT '')"
+        )
+        if "version" not in {row[1] for row in self._conn.execute("PRAGMA table_info(threads)")}:
+            # Stores written before summaries were versioned
+            self._conn.execute("ALTER TABLE threads ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "participants" not in {row[1] for row in self._conn.execute("PRAGMA table_info(threads)")}:
+            # Threads stored before participants were recorded are not joined again
+            self._conn.execute("ALTER TABLE threads ADD COLUMN participants TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS thread_messages (message_id TEXT PRIMARY KEY, thread_id TEXT NOT NULL)")
+        self._conn.commit()
+
+    def resolve(self, email: EmailState) -> str:
+        """
+        Finds the stored thread of an email through any message it replies to or references;
+        this also links replies whose References header was truncated by a mail client. An
+        email whose sender is not on the stored thread starts a new thread of its own.
+        """
+        known_ids = [email.in_reply_to] + list(reversed(email.references))
+        thread_id = None
+        with self._lock:
+            for message_id in filter(None, known_ids):
+                row = self._conn.execute("SELECT thread_id FROM thread_messages WHERE message_id = ?",
+                                         (_key(email.account, message_id),)).fetchone()
+                if row:
+                    thread_id = row[0]
+                    break
+            thread_id = thread_id or email.thread_id or email.message_id or email.email_id
+            row = self._conn.execute("SELECT participants FROM threads WHERE thread_id = ?",
+                                     (_key(email.account, thread_id),)).fetchone()
+        sender = parseaddr(email.sender)[1].lower()
+        if row is not None and sender not in row[0].split():
+            logger.warning(f"Email {email.email_id} refers to thread {thread_id}, but its sender {sender or '(none)'} "
+                           f"is not part of it; starting a new thread.")
+            return email.message_id or email.email_id
+        return thread_id
+
+    def get_summary(self, thread_id: str, account: str = "") -> str:
+        return self.get(thread_id, account)[0]
+
+    def get(self, thread_id: str, account: str = "") -> Tuple[str, int]:
+        """
+        The thread's summary and its version (0 for a new thread).
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT summary, version FROM threads WHERE thread_id = ?",
+                                     (_key(account, thread_id),)).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def is_folded(self, email: EmailState) -> bool:
+        """
+        Whether the email is already part of its thread's summary.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM thread_messages WHERE message_id = ?",
+                                     (_key(email.account, email.message_id or email.email_id),)).fetchone()
+        return row is not None
+
+    def update(self, email: EmailState, summary: str) -> bool:
+        """
+        Stores the conversation summary that now includes this email, built from the
+        thread summary at email.thread_version. Returns False, storing nothing, if another
+        summary was stored since; an email already folded into the thread is skipped.
+        """
+        message_id = _key(email.account, email.message_id or email.email_id)
+        thread_key = _key(email.account, email.thread_id)
+        with self._lock:
+            # The version check and the write are one transaction, also across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM thread_messages WHERE message_id = ?", (message_id,)).fetchone():
+                    self._conn.rollback()
+                    logger.info(f"Email {email.email_id} is already part of the summary of thread {email.thread_id}.")
+                    return True
+                row = self._conn.execute("SELECT version, participants FROM threads WHERE thread_id = ?", (thread_key,)).fetchone()
+                if (row[0] if row else 0) != email.thread_version:
+                    self._conn.rollback()
+                    return False
+                addresses = " ".join(sorted(set(row[1].split() if row else []) | participants(email)))
+                self._conn.execute("INSERT INTO thread_messages (message_id, thread_id) VALUES (?, ?)", (message_id, email.thread_id))
+                self._conn.execute(
+                    "INSERT INTO threads (thread_id, summary, message_count, updated_at, version, participants) "
+                    "VALUES (?, ?, 1, ?, 1, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET summary = excluded.summary, message_count = message_count + 1, "
+                    "updated_at = excluded.updated_at, version = version + 1, participants = excluded.participants",
+                    (thread_key, summary, time.time(), addresses),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return True
+
+def get_default_thread_store() -> Optional[ThreadStore]:
+    """
+    Creates the store configured in config.py, or returns None if thread tracking is disabled.
+    """
+    if not config.THREADS_ENABLED:
+        return None
+    return ThreadStore(config.THREAD_STORE_PATH)
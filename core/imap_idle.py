@@ -0,0 +1,169 @@
+import imaplib
+import random
+import threading
+from typing import Optional
+from core.email_imap import connect_imap, iter_new_emails
+from core.email_sender import SMTPClient, Outbox, deliver, save_draft
+from core.scheduler import get_default_scheduler
+from core.state import EmailState
+from utils.logger import logger
+import config
+
+class IMAPIdleDaemon:
+    """
+    Keeps an authenticated IMAP connection open and pushes new mail through the
+    EmailSupervisor as soon as it arrives.
+
+    Uses IMAP IDLE (RFC 2177) when the server advertises it and falls back to NOOP
+    polling otherwise. Lost connections are re-established with exponential backoff.
+    """
+
+    def __init__(self, supervisor, folder: str = "inbox", max_concurrency: Optional[int] = None):
+        self.supervisor = supervisor
+        self.folder = folder
+        self.max_concurrency = max_concurrency or max(1, config.MAX_CONCURRENCY)
+        self.idle_timeout = config.IMAP_IDLE_TIMEOUT_SECONDS
+        self.poll_interval = config.IMAP_POLL_INTERVAL_SECONDS
+        self.initial_backoff = 1.0
+        self.max_backoff = config.IMAP_RECONNECT_MAX_BACKOFF_SECONDS
+        self._stop = threading.Event()
+        self._end_idle = None
+        self.smtp_client = SMTPClient()
+        self.outbox = Outbox(config.OUTBOX_PATH)
+        # Urgent mail in a burst of new messages is drafted first, if fetched mail is spooled
+        self.scheduler = get_default_scheduler(supervisor.prefilter, supervisor.classifier,
+                                               spooled=supervisor.ledger is not None)
+
+    def stop(self):
+        self._stop.set()
+        end_idle = self._end_idle
+        if end_idle is not None:
+            end_idle()
+
+    def run(self, max_cycles: Optional[int] = None):
+        """
+        Runs until stop() is called (or for max_cycles wait cycles, mainly for tests).
+        """
+        backoff = self.initial_backoff
+        cycles = 0
+        while not self._stop.is_set():
+            mail = None
+            try:
+                mail = connect_imap()
+                backoff = self.initial_backoff
+                supports_idle = "IDLE" in getattr(mail, "capabilities", ())
+                logger.info(f"Daemon connected; waiting for mail using {'IDLE' if supports_idle else 'NOOP polling'}.")
+
+                # Catch up on anything that arrived while we were disconnected
+                self.sync_and_process(mail)
+                while not self._stop.is_set():
+                    if max_cycles is not None and cycles >= max_cycles:
+                        self._stop.set()
+                        break
+                    cycles += 1
+                    if supports_idle:
+                        changed = self._idle_wait(mail, self.idle_timeout)
+                    else:
+                        self._stop.wait(self.poll_interval)
+                        mail.noop()
+                        changed = True  # iter_new_emails returns early if UIDNEXT is unchanged
+                    if changed and not self._stop.is_set():
+                        self.sync_and_process(mail)
+            except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError) as e:
+                if self._stop.is_set():
+                    break
+                delay = backoff + random.uniform(0, backoff / 2)
+                logger.error(f"IMAP connection lost ({e}); reconnecting in {delay:.1f}s")
+                self._stop.wait(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+        self.smtp_client.close()
+        logger.info("IMAP daemon stopped.")
+
+    def _idle_wait(self, mail, timeout: float) -> bool:
+        """
+        Issues IDLE and blocks until the server reports new messages (EXISTS), the timeout
+        expires or stop() is called. Returns True if new mail was announced.
+
+        Reads stay blocking (imaplib buffers lines, so select() on the socket is unreliable);
+        a timer or stop() ends the IDLE by sending DONE, which makes the server reply.
+        """
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        line = mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        lock = threading.Lock()
+        done_sent = []
+
+        def end_idle():
+            with lock:
+                if not done_sent:
+                    done_sent.append(True)
+                    mail.send(b"DONE\r\n")
+
+        timer = threading.Timer(timeout, end_idle)
+        timer.daemon = True
+        timer.start()
+        self._end_idle = end_idle
+        if self._stop.is_set():
+            end_idle()
+
+        new_mail = False
+        try:
+            while True:
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if line.startswith(tag):
+                    break
+                if line.startswith(b"*") and b"EXISTS" in line:
+                    new_mail = True
+                    end_idle()
+        finally:
+            timer.cancel()
+            self._end_idle = None
+        return new_mail
+
+    def sync_and_process(self, mail):
+        # New mail is processed as it streams in; each window is spooled in the ledger before
+        # the watermark moves past it, and what a crash interrupted is retried first
+        emails = iter_new_emails(self.folder, mail=mail, spool=self.supervisor.spool)
+        emails = self.supervisor.skip_done(self.supervisor.with_unfinished(emails))
+        if self.scheduler is not None:
+            emails = self.scheduler.schedule(emails)
+        processed = 0
+        for final_state in self.supervisor.iter_process(emails, max_concurrency=self.max_concurrency, interactive_review=False):
+            self.handle_result(final_state)
+            if self.scheduler is not None:
+                self.scheduler.complete(final_state)
+            self.supervisor.mark_done(final_state)
+            processed += 1
+        if processed:
+            logger.info(f"Daemon processed {processed} new emails.")
+        if self.outbox.pending_count():
+            self.outbox.flush(self.smtp_client)
+
+    def handle_result(self, final_state: EmailState):
+        handle_unattended_result(final_state, self.smtp_client, self.outbox)
+
+def handle_unattended_result(final_state: EmailState, smtp_client: SMTPClient, outbox: Outbox):
+    """
+    Non-interactive post-processing: send or save approved drafts. Drafts awaiting review
+    are already in the supervisor's review queue. Shared by the daemon and the workers.
+    """
+    logger.info(f"Finished processing email ID {final_state.email_id}. Final status: {final_state.status}")
+    subject = f"Re: {final_state.subject}"
+    if final_state.status == "approved_for_sending" and final_state.final_response:
+        if config.DAEMON_AUTO_SEND:
+            deliver(smtp_client, outbox, to_email=final_state.sender, subject=subject, body=final_state.final_response)
+        else:
+            save_draft(subject=subject, body=final_state.final_response, filename=f"{final_state.email_id}_draft.txt")
+    elif final_state.status == "awaiting_review":
+        logger.info(f"Draft for email {final_state.email_id} is waiting in the review queue (run review.py).")
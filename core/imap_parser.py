@@ -0,0 +1,148 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# A parsed IMAP value: an atom/string (bytes), NIL (None) or a parenthesized list
+IMAPValue = Union[bytes, None, list]
+
+_TOKEN = re.compile(
+    rb'\s*(?:'
+    rb'(?P<open>\()|(?P<close>\))'
+    rb'|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|\{(?P<literal>\d+)\}$'
+    rb'|(?P<atom>[^\s()"{}\[\]]+(?:\[[^\]]*\])?(?:<[\d.]+>)?)'
+    rb')'
+)
+
+class _Literal:
+    def __init__(self, data: bytes):
+        self.data = data
+
+def _tokenize(response: Iterable[Union[bytes, Tuple[bytes, bytes]]]) -> List:
+    """
+    Flattens an imaplib FETCH response into tokens. imaplib splits the response at every
+    literal, returning (text ending in {n}, literal bytes) tuples; literals become one token.
+    """
+    tokens = []
+    for item in response:
+        if isinstance(item, tuple):
+            text, literal = item
+        else:
+            text, literal = item, None
+        if text is None:
+            continue
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if not match or match.end() == pos:
+                raise ValueError(f"Unparseable IMAP response near: {text[pos:pos + 40]!r}")
+            pos = match.end()
+            if match.group("open"):
+                tokens.append("(")
+            elif match.group("close"):
+                tokens.append(")")
+            elif match.group("quoted") is not None:
+                tokens.append(re.sub(rb'\\(.)', rb'\1', match.group("quoted")))
+            elif match.group("literal") is not None:
+                tokens.append(_Literal(literal or b""))
+            else:
+                atom = match.group("atom")
+                tokens.append(None if atom.upper() == b"NIL" else atom)
+    return tokens
+
+def _parse_list(tokens: List, pos: int) -> Tuple[list, int]:
+    values = []
+    while pos < len(tokens):
+        token = tokens[pos]
+        if token == ")":
+            return values, pos + 1
+        if token == "(":
+            value, pos = _parse_list(tokens, pos + 1)
+            values.append(value)
+            continue
+        values.append(token.data if isinstance(token, _Literal) else token)
+        pos += 1
+    return values, pos
+
+def parse_fetch_response(response: Iterable[Union[bytes, Tuple[bytes, bytes]]]) -> Dict[int, Dict[str, IMAPValue]]:
+    """
+    Parses the data returned by `mail.uid("FETCH", ...)` into {uid: {item name: value}}.
+    Item names are upper-cased, e.g. "BODYSTRUCTURE" or "BODY[1.2]".
+    """
+    tokens = _tokenize(response)
+    results: Dict[int, Dict[str, IMAPValue]] = {}
+    pos = 0
+    while pos < len(tokens):
+        # Each message is "<seq> ( name value name value ... )"
+        if tokens[pos] == "(":
+            items, pos = _parse_list(tokens, pos + 1)
+            fields = {}
+            for i in range(0, len(items) - 1, 2):
+                name = items[i].decode("ascii", errors="replace").upper() if isinstance(items[i], bytes) else str(items[i])
+                fields[name] = items[i + 1]
+            if "UID" in fields:
+                results[int(fields["UID"])] = fields
+        else:
+            pos += 1
+    return results
+
+def find_body_item(fields: Dict[str, IMAPValue], prefix: str) -> Optional[bytes]:
+    """
+    Returns the value of the first item whose name starts with `prefix`, e.g. "BODY[HEADER".
+    """
+    for name, value in fields.items():
+        if name.startswith(prefix):
+            return value if isinstance(value, bytes) else None
+    return None
+
+def _params(value: IMAPValue) -> Dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {
+        value[i].decode(errors="replace").lower(): value[i + 1].decode(errors="replace")
+        for i in range(0, len(value) - 1, 2)
+        if isinstance(value[i], bytes) and isinstance(value[i + 1], bytes)
+    }
+
+def find_text_parts(bodystructure: list, prefix: str = "") -> List[dict]:
+    """
+    Walks a BODYSTRUCTURE and lists inline text/plain and text/html parts with their
+    section number, charset and transfer encoding. Attachments and embedded messages are skipped.
+    """
+    if not bodystructure:
+        return []
+    if isinstance(bodystructure[0], list):
+        parts = []
+        # Child parts come first; the subtype and extension data (which may contain lists) follow
+        for index, child in enumerate(bodystructure):
+            if not isinstance(child, list):
+                break
+            section = f"{prefix}.{index + 1}" if prefix else str(index + 1)
+            parts.extend(find_text_parts(child, section))
+        return parts
+
+    main_type = (bodystructure[0] or b"").decode(errors="replace").lower()
+    sub_type = (bodystructure[1] or b"").decode(errors="replace").lower() if len(bodystructure) > 1 else ""
+    if main_type != "text" or sub_type not in ("plain", "html"):
+        return []
+    # Text parts: type, subtype, params, id, description, encoding, size, lines, md5, disposition, ...
+    disposition = bodystructure[9] if len(bodystructure) > 9 else None
+    if isinstance(disposition, list) and disposition and isinstance(disposition[0], bytes) and disposition[0].lower() == b"attachment":
+        return []
+    encoding = bodystructure[5] if len(bodystructure) > 5 else None
+    return [{
+        "section": prefix or "1",
+        "content_type": f"text/{sub_type}",
+        "charset": _params(bodystructure[2] if len(bodystructure) > 2 else None).get("charset"),
+        "encoding": encoding.decode(errors="replace").lower() if isinstance(encoding, bytes) else "7bit",
+        "size": int(bodystructure[6]) if len(bodystructure) > 6 and isinstance(bodystructure[6], bytes) and bodystructure[6].isdigit() else 0,
+    }]
+
+def choose_text_part(parts: List[dict]) -> Optional[dict]:
+    """
+    Prefers the first text/plain part, falling back to the first text/html part.
+    """
+    for part in parts:
+        if part["content_type"] == "text/plain":
+            return part
+    return parts[0] if parts else None
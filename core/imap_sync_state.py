@@ -0,0 +1,38 @@
+import json
+import os
+import threading
+from typing import Optional
+from utils.logger import logger
+
+class SyncStateStore:
+    """
+    Persists per-folder IMAP sync watermarks (UIDVALIDITY, last UID, HIGHESTMODSEQ) in a JSON file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logger.error(f"Corrupt IMAP sync state in {self.path}; starting from scratch.")
+            return {}
+
+    def get(self, folder: str) -> Optional[dict]:
+        with self._lock:
+            return self._load().get(folder)
+
+    def update(self, folder: str, uidvalidity: Optional[int], last_uid: int, highestmodseq: Optional[int] = None):
+        with self._lock:
+            data = self._load()
+            data[folder] = {"uidvalidity": uidvalidity, "last_uid": last_uid, "highestmodseq": highestmodseq}
+            # Write to a temporary file first so a crash never leaves a half-written watermark
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.token_budget import estimate_tokens
+import config
+
+LLM_CALLS = metrics.counter("mailmind_llm_calls_total", "LLM requests by node and outcome (call, cache_hit, error)")
+LLM_SECONDS = metrics.histogram("mailmind_llm_seconds", "Latency of LLM calls that reached the API")
+LLM_TOKENS = metrics.counter("mailmind_llm_tokens_total", "Estimated tokens of LLM prompt inputs and completions")
+
+class LLMCache:
+    """
+    A persistent, content-addressed cache for LLM results backed by SQLite.
+
+    Entries are keyed by a hash of the prompt template, model name and inputs, expire
+    after `ttl_seconds`, and the least recently used entries are evicted once the cache
+    holds more than `max_entries` results. Hits do not write: their access times are
+    batched and written every `touch_batch` hits, on the next set() and on close().
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_entries: int = 10000, touch_batch: int = 100):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}  # key -> access time not written yet
+        self._lock = threading.Lock()
+        # Shared by worker processes: the timeout lets a writer wait for another's lock instead
+        # of failing, and WAL keeps readers from blocking on it
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        # LLM labels kept as training data for local models; unlike cache entries they are not evicted
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS labeled_examples ("
+            "task TEXT NOT NULL, key TEXT NOT NULL, text TEXT NOT NULL, label TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (task, key))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt, llm, inputs: dict, namespace: str = "") -> str:
+        """
+        Builds a cache key from the prompt template, the model name and the prompt inputs.
+        """
+        model_name = getattr(llm, "model_name", None) or type(llm).__name__
+        payload = json.dumps(
+            {
+                "namespace": namespace,
+                "prompt": prompt.pretty_repr() if hasattr(prompt, "pretty_repr") else repr(prompt),
+                "model": model_name,
+                "inputs": inputs,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touched()
+                self._conn.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def _flush_touched(self):
+        # Writes the batched access times, so eviction sees recently hit entries as recent
+        if self._touched:
+            self._conn.executemany("UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched.clear()
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._flush_touched()
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def add_example(self, task: str, text: str, label: str):
+        """
+        Records an LLM label for `text`, e.g. the category filter_email chose for an email.
+        """
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO labeled_examples (task, key, text, label, created_at) VALUES (?, ?, ?, ?, ?)",
+                (task, key, text, label, time.time()),
+            )
+            self._conn.commit()
+
+    def examples(self, task: str) -> list:
+        """
+        Returns the recorded (text, label) pairs for a task, oldest first.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT text, label FROM labeled_examples WHERE task = ? ORDER BY created_at", (task,)
+            ).fetchall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+def cached_invoke(cache: Optional[LLMCache], prompt, llm, inputs: dict, compute: Callable[[], Any], namespace: str = "") -> Any:
+    """
+    Returns the cached result for this prompt/model/inputs, or runs `compute` and caches it.
+    `compute` must return a JSON-serializable value. Without a cache, `compute` is always called.
+    """
+    if cache is None:
+        return _timed_call(inputs, compute, namespace)
+    key = LLMCache.make_key(prompt, llm, inputs, namespace)
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"LLM cache hit ({namespace})")
+        LLM_CALLS.inc(node=namespace, outcome="cache_hit")
+        return cached
+    value = _timed_call(inputs, compute, namespace)
+    cache.set(key, value)
+    return value
+
+def _timed_call(inputs: dict, compute: Callable[[], Any], namespace: str) -> Any:
+    start = time.perf_counter()
+    try:
+        value = compute()
+    except Exception:
+        LLM_CALLS.inc(node=namespace, outcome="error")
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start, node=namespace)
+    LLM_CALLS.inc(node=namespace, outcome="call")
+    LLM_TOKENS.inc(sum(estimate_tokens(str(v)) for v in inputs.values()), node=namespace, direction="prompt")
+    LLM_TOKENS.inc(estimate_tokens(json.dumps(value, default=str)), node=namespace, direction="completion")
+    return value
+
+def get_default_cache() -> Optional[LLMCache]:
+    """
+    Creates the cache configured in config.py, or returns None if caching is disabled.
+    """
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    return LLMCache(config.LLM_CACHE_PATH, ttl_seconds=config.LLM_CACHE_TTL_SECONDS, max_entries=config.LLM_CACHE_MAX_ENTRIES)
@@ -0,0 +1,315 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterator, List, Optional, TypeVar
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from utils.logger import logger
+from utils.metrics import metrics
+import config
+
+T = TypeVar("T")
+
+LLM_RETRIES = metrics.counter("mailmind_llm_retries_total", "LLM calls retried, by reason (rate_limited, transient)")
+LLM_REJECTED = metrics.counter("mailmind_llm_circuit_rejections_total", "LLM calls refused while the circuit breaker was open")
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while it is failing; the email is retried on a later run."""
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429 or "RateLimit" in type(error).__name__
+
+def is_transient(error: Exception) -> bool:
+    """
+    Rate limits, timeouts, dropped connections and 5xx replies are worth retrying;
+    other 4xx replies (bad request, auth) will fail the same way again.
+    """
+    if is_rate_limited(error) or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status in (408, 409)
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the server asked us to wait, from Retry-After (seconds or HTTP date) or retry-after-ms.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average with bursts of up to `capacity`.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0 and not self._paused_until:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Holds back every caller, e.g. after a 429 with Retry-After, so they do not all retry at once.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and refuses calls for
+    `reset_seconds`; then lets one probe call through and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+        LLM_REJECTED.inc()
+        raise CircuitOpenError(f"LLM circuit breaker is open; retrying in {max(0.0, remaining):.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Opening the LLM circuit breaker after {self._failures} consecutive failures.")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class AIMDLimiter:
+    """
+    Bounds concurrent LLM calls with a limit that grows by about one per round of
+    successful calls (additive increase) and halves on a rate limit, a transient error
+    or a call slower than `latency_target` (multiplicative decrease), like TCP congestion control.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16, latency_target: float = 20.0, decrease: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool):
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+class LLMClient:
+    """
+    Runs LLM calls through a token bucket, an AIMD concurrency limit and a circuit breaker,
+    retrying transient failures with exponential backoff and full jitter (or the server's
+    Retry-After). Shared by every node, so batch runs back off together.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, burst: int = 10, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0, breaker: Optional[CircuitBreaker] = None,
+                 limiter: Optional[AIMDLimiter] = None):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AIMDLimiter()
+        self.calls = 0
+        self.retries = 0
+        metrics.gauge("mailmind_llm_concurrency_limit", "Current AIMD limit on concurrent LLM calls", function=self.concurrency_limit)
+        metrics.gauge("mailmind_llm_circuit_open", "1 while the LLM circuit breaker is open", function=self.circuit_open)
+
+    def concurrency_limit(self) -> float:
+        return self.limiter.limit
+
+    def circuit_open(self) -> float:
+        return float(self.breaker.state == "open")
+
+    @classmethod
+    def from_config(cls) -> "LLMClient":
+        return cls(
+            requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+            burst=config.LLM_BURST,
+            max_retries=config.LLM_MAX_RETRIES,
+            base_delay=config.LLM_RETRY_BASE_SECONDS,
+            max_delay=config.LLM_RETRY_MAX_SECONDS,
+            breaker=CircuitBreaker(config.LLM_CIRCUIT_FAILURES, config.LLM_CIRCUIT_RESET_SECONDS),
+            limiter=AIMDLimiter(config.LLM_CONCURRENCY_INITIAL, config.LLM_CONCURRENCY_MIN, config.LLM_CONCURRENCY_MAX,
+                                config.LLM_LATENCY_TARGET_SECONDS),
+        )
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        requested = retry_after(error)
+        if requested is not None:
+            return min(self.max_delay, requested) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """
+        Runs `fn` (one API request) under the limits, retrying transient failures.
+        Raises the last error, or CircuitOpenError while the API is failing.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.breaker.before_call()
+            self.bucket.acquire()
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                transient = is_transient(e)
+                self.limiter.release(time.monotonic() - start, overloaded=transient)
+                if not transient:
+                    # The request itself was bad; the API is fine
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                reason = "rate_limited" if is_rate_limited(e) else "transient"
+                delay = self._backoff(attempt, e)
+                if reason == "rate_limited":
+                    self.bucket.pause(delay)
+                self.retries += 1
+                LLM_RETRIES.inc(reason=reason)
+                logger.warning(f"LLM call failed ({type(e).__name__}: {e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self.limiter.release(time.monotonic() - start, overloaded=False)
+            self.breaker.record_success()
+            self.calls += 1
+            return result
+        raise AssertionError("unreachable")
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "circuit": self.breaker.state,
+        }
+
+class ResilientChatModel(BaseChatModel):
+    """
+    Wraps a chat model so every request, including structured-output calls, goes through an LLMClient.
+    """
+    model: BaseChatModel
+    client: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"resilient-{self.model._llm_type}"
+
+    @property
+    def model_name(self) -> str:
+        # Same cache keys as the wrapped model
+        return getattr(self.model, "model_name", None) or type(self.model).__name__
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = self.client.call(lambda: self.model.invoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        def start():
+            chunks = iter(self.model.stream(messages, stop=stop, **kwargs))
+            return chunks, next(chunks, None)
+
+        # Only opening the stream goes through the client: it is retried until the first chunk
+        # arrives, but a stream that breaks halfway is not replayed, as its tokens were already shown
+        chunks, first = self.client.call(start)
+        if first is None:
+            return
+        yield ChatGenerationChunk(message=first)
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=chunk)
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        structured = self.model.with_structured_output(schema, **kwargs)
+        return RunnableLambda(lambda value: self.client.call(lambda: structured.invoke(value)))
+
+def with_resilience(llm: BaseChatModel) -> BaseChatModel:
+    """
+    Wraps the model in a ResilientChatModel configured from config.py, unless that is disabled.
+    """
+    if not config.LLM_RESILIENCE_ENABLED or isinstance(llm, ResilientChatModel):
+        return llm
+    return ResilientChatModel(model=llm, client=LLMClient.from_config())
@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from core.state import EmailState
+from utils.logger import logger
+
+REVIEW_ACTIONS = ("approve", "edit", "reject")
+
+class ReviewQueue:
+    """
+    A durable SQLite queue of drafts waiting for a human decision.
+
+    The pipeline enqueues drafts and moves on; a reviewer records decisions at their own
+    pace (see review.py), and decided items are claimed once so that the paused workflow
+    is resumed exactly once, even if several processes apply decisions.
+
+    Item lifecycle: pending -> decided -> applying -> applied.
+    """
+
+    def __init__(self, path: str, claim_timeout: float = 600.0):
+        self.path = path
+        # An item stuck in "applying" this long (e.g. after a crash) can be claimed again
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS review_queue ("
+            "email_id TEXT PRIMARY KEY, thread_id TEXT, state TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+            "decision TEXT, edited_response TEXT, final_status TEXT, "
+            "created_at REAL NOT NULL, decided_at REAL, claimed_at REAL, applied_at REAL)"
+        )
+        self._conn.commit()
+
+    def enqueue(self, email: EmailState, thread_id: Optional[str] = None) -> bool:
+        """
+        Adds a draft for review. Returns False if the email is already queued.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO review_queue (email_id, thread_id, state, created_at) VALUES (?, ?, ?, ?)",
+                (email.email_id, thread_id, email.model_dump_json(), time.time()),
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info(f"Draft for email {email.email_id} queued for human review.")
+        return bool(cursor.rowcount)
+
+    def get(self, email_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM review_queue WHERE email_id = ?", (email_id,)).fetchone()
+        return dict(row) if row else None
+
+    def pending(self, limit: Optional[int] = None) -> List[EmailState]:
+        """
+        Returns the queued drafts that still need a decision, oldest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state FROM review_queue WHERE status = 'pending' ORDER BY created_at LIMIT ?",
+                (limit if limit is not None else -1,),
+            ).fetchall()
+        return [EmailState.model_validate_json(row["state"]) for row in rows]
+
+    def decide(self, email_id: str, action: str, edited_response: Optional[str] = None) -> bool:
+        """
+        Records a reviewer's decision. Returns False if the email is not awaiting review.
+        """
+        if action not in REVIEW_ACTIONS:
+            raise ValueError(f"Unknown review action {action!r}; expected one of {', '.join(REVIEW_ACTIONS)}")
+        if action == "edit" and edited_response is None:
+            raise ValueError("An edit decision needs the edited response")
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE review_queue SET status = 'decided', decision = ?, edited_response = ?, decided_at = ? "
+                "WHERE email_id = ? AND status = 'pending'",
+                (action, edited_response, time.time(), email_id),
+            )
+            self._conn.commit()
+        return bool(cursor.rowcount)
+
+    def claim_decided(self, limit: int = 100) -> List[dict]:
+        """
+        Atomically claims decided items for resumption so no other process applies them too.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE review_queue SET status = 'applying', claimed_at = ? WHERE email_id IN ("
+                "SELECT email_id FROM review_queue WHERE status = 'decided' OR (status = 'applying' AND claimed_at < ?) "
+                "ORDER BY decided_at LIMIT ?) RETURNING email_id, thread_id, state, decision, edited_response",
+                (now, now - self.claim_timeout, limit),
+            ).fetchall()
+            self._conn.commit()
+        return [dict(row) for row in rows]
+
+    def mark_applied(self, email_id: str, final_status: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE review_queue SET status = 'applied', final_status = ?, applied_at = ? WHERE email_id = ?",
+                (final_status, time.time(), email_id),
+            )
+            self._conn.commit()
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM review_queue GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def pending_count(self) -> int:
+        return self.counts().get("pending", 0)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
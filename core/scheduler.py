@@ -0,0 +1,232 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parseaddr, parsedate_to_datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from agents.local_classifier import classification_text
+from core.state import EmailState
+from utils.logger import logger
+from utils.metrics import metrics
+import config
+
+# Seconds; from a few seconds for an idle run up to a day-long backlog
+TIME_TO_DRAFT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400)
+
+TIME_TO_DRAFT = metrics.histogram("mailmind_time_to_draft_seconds",
+                                  "Time from an email entering the scheduler to its result being ready", buckets=TIME_TO_DRAFT_BUCKETS)
+SLA_MISSED = metrics.counter("mailmind_sla_missed_total", "Emails whose result was ready after their SLA deadline")
+SCHEDULER_PROMOTIONS = metrics.counter("mailmind_scheduler_promotions_total", "Emails taken out of priority order because they waited too long")
+
+# Priority classes, most urgent first
+URGENT, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {URGENT: "urgent", NORMAL: "normal", LOW: "low"}
+
+DEFAULT_URGENT_KEYWORDS = (
+    "urgent", "asap", "immediately", "emergency", "escalation", "outage", "is down", "critical",
+    "blocked", "deadline", "action required",
+)
+
+@dataclass(order=True)
+class _Entry:
+    priority: int
+    deadline: float
+    seq: int
+    email: EmailState = field(compare=False)
+    enqueued_at: float = field(compare=False, default=0.0)
+
+def _parse_list(value: Optional[str]) -> set:
+    return {item.strip().lower().lstrip("@") for item in (value or "").split(",") if item.strip()}
+
+def received_at(email: EmailState, default: float) -> float:
+    """
+    The email's Date header as a timestamp, or `default` when it is missing or unparsable.
+    """
+    value = email.headers.get("Date")
+    if not value:
+        return default
+    try:
+        return min(default, parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        return default
+
+class PriorityScheduler:
+    """
+    Reorders incoming emails so urgent mail is drafted first.
+
+    Each email gets a priority class from cheap local signals: the rule-based prefilter,
+    the local classifier, a VIP sender list and subject keywords. Its SLA deadline is
+    the time it was received plus that class's SLA. Emails are handed out by class, and
+    within a class by deadline, so older mail goes first. An email that has waited more
+    than `max_wait` seconds is handed out next regardless of class, so a steady stream
+    of urgent mail cannot starve the rest.
+    """
+
+    def __init__(self, prefilter=None, classifier=None, vip_senders: Iterable[str] = (),
+                 urgent_keywords: Iterable[str] = DEFAULT_URGENT_KEYWORDS, sla_seconds: Optional[Dict[int, float]] = None,
+                 max_wait: float = 600.0, lookahead: int = 500):
+        self.prefilter = prefilter
+        self.classifier = classifier
+        self.vip_senders = {entry.lower().lstrip("@") for entry in vip_senders}
+        ordered = sorted({keyword.lower() for keyword in urgent_keywords}, key=len, reverse=True)
+        self.urgent_pattern = re.compile("|".join(re.escape(k) for k in ordered), re.IGNORECASE) if ordered else None
+        self.sla_seconds = sla_seconds or {URGENT: 900.0, NORMAL: 14400.0, LOW: 86400.0}
+        self.max_wait = max_wait
+        self.lookahead = max(1, lookahead)
+        self._heap = []
+        self._arrivals = deque()  # entries in the order they were queued, for starvation checks
+        self._taken = set()
+        self._seq = itertools.count()
+        self._size = 0
+        self._pending: Dict[str, _Entry] = {}
+        self._drafted: Dict[str, list] = {}
+        self.sla_missed = 0
+        self.promoted = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, prefilter=None, classifier=None) -> "PriorityScheduler":
+        return cls(
+            prefilter=prefilter,
+            classifier=classifier,
+            vip_senders=_parse_list(config.SCHEDULER_VIP_SENDERS),
+            urgent_keywords=[k.strip() for k in config.SCHEDULER_URGENT_KEYWORDS.split(",") if k.strip()],
+            sla_seconds={URGENT: config.SLA_URGENT_SECONDS, NORMAL: config.SLA_NORMAL_SECONDS, LOW: config.SLA_LOW_SECONDS},
+            max_wait=config.SCHEDULER_MAX_WAIT_SECONDS,
+            lookahead=config.SCHEDULER_LOOKAHEAD,
+        )
+
+    def _is_vip(self, email: EmailState) -> bool:
+        address = parseaddr(email.sender)[1].lower()
+        domain = address.rpartition("@")[2]
+        return address in self.vip_senders or domain in self.vip_senders
+
+    def priority(self, email: EmailState) -> Tuple[int, str]:
+        """
+        Returns the email's priority class and the signal that decided it.
+        """
+        if self.prefilter is not None:
+            category, rule = self.prefilter.evaluate(email)
+            if category in ("spam", "informational"):
+                return LOW, f"prefilter:{rule}"
+        vip = self._is_vip(email)
+        if self.urgent_pattern is not None and self.urgent_pattern.search(email.subject):
+            return URGENT, "subject_keyword"
+        if self.classifier is not None:
+            label, confidence = self.classifier.predict(classification_text(email))
+            if confidence >= self.classifier.threshold:
+                if label == "urgent":
+                    return URGENT, "local_classifier"
+                if label in ("spam", "informational") and not vip:
+                    return LOW, "local_classifier"
+        if vip:
+            return URGENT, "vip_sender"
+        return NORMAL, "default"
+
+    def push(self, email: EmailState):
+        now = time.time()
+        priority, signal = self.priority(email)
+        entry = _Entry(priority, received_at(email, now) + self.sla_seconds[priority], next(self._seq), email, now)
+        logger.debug(f"Scheduled email {email.email_id} as {PRIORITY_NAMES[priority]} ({signal})")
+        with self._lock:
+            heapq.heappush(self._heap, entry)
+            self._arrivals.append(entry)
+            self._size += 1
+            self._pending[email.email_id] = entry
+
+    def pop(self) -> Optional[EmailState]:
+        """
+        Returns the next email to process, or None when the queue is empty.
+        """
+        with self._lock:
+            while self._arrivals and self._arrivals[0].seq in self._taken:
+                self._taken.discard(self._arrivals.popleft().seq)
+            if self._arrivals and time.time() - self._arrivals[0].enqueued_at > self.max_wait:
+                entry = self._arrivals.popleft()
+                self._taken.add(entry.seq)
+                self._size -= 1
+                self.promoted += 1
+                SCHEDULER_PROMOTIONS.inc(priority=PRIORITY_NAMES[entry.priority])
+                return entry.email
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                if entry.seq in self._taken:
+                    self._taken.discard(entry.seq)
+                    continue
+                self._taken.add(entry.seq)
+                self._size -= 1
+                return entry.email
+            return None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, emails: Iterable[EmailState]) -> Iterator[EmailState]:
+        """
+        Reads up to `lookahead` emails ahead of the consumer and yields them in priority order.
+        Pulling lazily (e.g. from iter_process) lets urgent mail overtake a long backlog.
+
+        Reading ahead moves an IMAP source's watermark past emails that are not processed
+        yet, so the source must spool what it fetches (see EmailSupervisor.spool).
+        """
+        emails = iter(emails)
+        exhausted = False
+        while True:
+            while not exhausted and len(self) < self.lookahead:
+                email = next(emails, None)
+                if email is None:
+                    exhausted = True
+                else:
+                    self.push(email)
+            email = self.pop()
+            if email is None:
+                return
+            yield email
+
+    def complete(self, email: EmailState):
+        """
+        Records the time to draft of a finished email under its final category.
+        """
+        with self._lock:
+            entry = self._pending.pop(email.email_id, None)
+        if entry is None:
+            return
+        now = time.time()
+        elapsed = now - entry.enqueued_at
+        category = email.category or "unknown"
+        TIME_TO_DRAFT.observe(elapsed, category=category)
+        with self._lock:
+            self._drafted.setdefault(category, []).append(elapsed)
+            if now > entry.deadline:
+                self.sla_missed += 1
+                SLA_MISSED.inc(priority=PRIORITY_NAMES[entry.priority])
+
+    def stats(self) -> dict:
+        with self._lock:
+            per_category = {
+                category: {
+                    "emails": len(samples),
+                    "p50_s": round(sorted(samples)[len(samples) // 2], 2),
+                    "max_s": round(max(samples), 2),
+                }
+                for category, samples in sorted(self._drafted.items())
+            }
+            return {"time_to_draft": per_category, "sla_missed": self.sla_missed, "promoted": self.promoted}
+
+def get_default_scheduler(prefilter=None, classifier=None, spooled: bool = True) -> Optional[PriorityScheduler]:
+    """
+    The scheduler configured in config.py, or None if scheduling is disabled. Pass
+    spooled=False for an IMAP source whose fetched emails are not stored durably
+    (checkpointing off): reordering it would move the watermark up to `lookahead`
+    emails past the work done, and a crash would lose all of them.
+    """
+    if not config.SCHEDULER_ENABLED:
+        return None
+    if not spooled:
+        logger.warning("Priority scheduling is off: without checkpointing, fetched emails are not spooled "
+                       "and reading ahead of the IMAP source could lose them on a crash.")
+        return None
+    return PriorityScheduler.from_config(prefilter=prefilter, classifier=classifier)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class EmailState(BaseModel):
     """
@@ -9,10 +9,23 @@ class EmailState(BaseModel):
     subject: str
     sender: str
     body: str
+    account: str = ""  # mailbox the email was fetched from (multi-account workers); empty for the configured one
+    headers: Dict[str, str] = Field(default_factory=dict)  # selected raw headers, e.g. List-Unsubscribe, Precedence
+    message_id: str = ""
+    in_reply_to: str = ""
+    references: List[str] = Field(default_factory=list)
+    thread_id: str = ""  # Message-ID of the conversation's first message
+    thread_summary: str = ""  # summary of the conversation before this email
+    thread_version: int = 0  # version of thread_summary, to detect a summary stored concurrently
     cleaned_body: str = ""
+    body_tokens: int = 0  # estimated tokens in cleaned_body
+    tokens_saved: int = 0  # prompt tokens avoided by trimming the body to node budgets
     category: str = "new"
+    duplicate_of: Optional[str] = None  # email_id whose LLM result was reused for this near-duplicate
     summary: str = ""
     draft_response: str = ""
     needs_human_review: bool = False
     final_response: Optional[str] = None
-    status: str = "pending"  # e.g., pending, processed, rejected, sent
\ No newline at end of file
+    review_decision: Optional[str] = None  # set when a queued review decision is applied: approve, edit or reject
+    status: str = "pending"  # e.g., pending, processed, rejected, sent, error
+    error: Optional[str] = None  # why an LLM step failed; the email is retried on the next run
\ No newline at end of file
@@ -1,89 +1,408 @@
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated
-from langchain_deepseek import ChatDeepSeek
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, TypedDict, Iterable, Iterator, List, Optional, Tuple
 from core.state import EmailState
-from agents.filtering_agent import filter_email
-from agents.summarization_agent import summarize_email
-from agents.response_agent import generate_response
-from agents.human_review_agent import review_draft
+from agents.filtering_agent import filter_email, build_filter_chain
+from agents.summarization_agent import summarize_email, build_summary_chain
+from agents.response_agent import generate_response, build_response_chain, needs_draft, requires_review
+from agents.human_review_agent import review_draft, apply_review_decision
+from agents.fused_agent import analyze_email, build_analysis_chain
+from agents.prefilter_agent import RuleBasedPrefilter
+from agents.local_classifier import get_default_classifier
+from core.llm_cache import get_default_cache
+from core.checkpointing import delete_checkpoints, get_default_checkpointing
+from core.review_queue import ReviewQueue
+from core.draft_stream import DraftStreams
+from core.dedup import get_default_dedup_index
+from core.email_threads import get_default_thread_store
+from utils.token_budget import estimate_tokens
 from utils.logger import logger
+from utils.metrics import metrics, span
 import config
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+NODE_SECONDS = metrics.histogram("mailmind_node_seconds", "Time spent in each workflow node")
+NODE_ERRORS = metrics.counter("mailmind_node_errors_total", "Workflow node failures")
+EMAIL_SECONDS = metrics.histogram("mailmind_email_seconds", "End-to-end workflow time per email")
+EMAILS = metrics.counter("mailmind_emails_total", "Emails that finished the workflow by category and status")
+EMAIL_ERRORS = metrics.counter("mailmind_email_errors_total", "Emails whose workflow raised an error")
+IN_FLIGHT = metrics.gauge("mailmind_emails_in_flight", "Emails submitted to the batch worker pool and not yet finished")
+SPECULATIVE_SUMMARIES = metrics.counter("mailmind_speculative_summaries_total",
+                                        "Summaries computed in parallel with classification, by outcome (used, discarded)")
+THREAD_CONFLICTS = metrics.counter("mailmind_thread_summary_conflicts_total",
+                                   "Summaries redone because another reply in the thread was summarized at the same time")
+
+# Times an email is summarized again when other replies in its thread keep being stored first
+THREAD_UPDATE_ATTEMPTS = 3
+
 # Define the state for the graph
+# Only serializable data lives in the graph state so it can be checkpointed; nodes use self.llm
 class GraphState(TypedDict):
     email_state: EmailState
-    llm: Annotated[ChatDeepSeek, "LLM instance"]
+    # Parallel topology only: the summary computed while the email was being classified
+    speculative_summary: Optional[dict]
 
 class EmailSupervisor:
-    def __init__(self):
-        self.llm = ChatDeepSeek(api_key=config.DEEPSEEK_API_KEY, model="deepseek-chat")
+    def __init__(self, fused: Optional[bool] = None, llm: Optional["BaseChatModel"] = None, parallel: Optional[bool] = None):
+        # langchain and langgraph are imported here and in build_graph rather than at module
+        # level, so scripts and tests that only import this module start quickly
+        from core.llm_client import with_resilience
+
+        # Any LangChain chat model can be injected, e.g. the fake model used by the benchmarks.
+        # Retries are left to the shared client, which rate-limits and backs off across all nodes.
+        if llm is None:
+            if not config.DEEPSEEK_API_KEY:
+                raise ValueError("DEEPSEEK_API_KEY not found in environment variables.")
+            from langchain_deepseek import ChatDeepSeek
+            llm = ChatDeepSeek(api_key=config.DEEPSEEK_API_KEY, model="deepseek-chat", max_retries=0,
+                               request_timeout=config.LLM_TIMEOUT_SECONDS)
+        self.llm = with_resilience(llm)
+        # Prompt | model chains, built on first use and shared by every email
+        self._chains = {}
+        self.cache = get_default_cache()
+        # Fused mode does classify + summarize + draft in one LLM call, falling back to the three-node path
+        self.fused = config.FUSED_MODE if fused is None else fused
+        # Parallel mode summarizes alongside classification, taking one LLM latency off the critical path
+        self.parallel = config.PARALLEL_SUMMARY if parallel is None else parallel
+        # Local rules that classify obvious spam/notifications without calling the LLM
+        self.prefilter = RuleBasedPrefilter.from_config() if config.PREFILTER_ENABLED else None
+        # Local model trained on past LLM labels; escalates to the LLM when unsure
+        self.classifier = get_default_classifier()
+        # Near-duplicates of an already processed email reuse its result instead of calling the LLM
+        self.dedup = get_default_dedup_index()
+        # Running summary per conversation, so replies are summarized without their quoted history
+        self.threads = get_default_thread_store()
+        # Per-node checkpoints and a per-email ledger make interrupted runs resumable
+        self.checkpointer, self.ledger = get_default_checkpointing()
+        # Drafts are streamed to listeners and drafts/ as they are generated and can be cancelled early
+        self.drafts = DraftStreams(config.DRAFT_STREAM_DIR) if config.STREAM_DRAFTS else None
+        # Drafts that need a human wait here when processing is not interactive
+        self.review_queue = ReviewQueue(config.REVIEW_QUEUE_PATH)
+        metrics.gauge("mailmind_review_queue_pending", "Drafts waiting for a human decision", function=self.review_queue.pending_count)
         self.workflow = self.build_graph()
+        self.batch_workflow = None
 
-    def build_graph(self):
+    def build_graph(self, defer_review: bool = False):
+        """
+        Builds the email workflow. With defer_review, emails that need a human
+        stop after drafting instead of prompting, so they can be reviewed later.
+        With a checkpointer the graph is interrupted before human_review and resumed
+        from its saved state once a decision arrives; without one the node is omitted.
+        In parallel mode filter_email and speculate_summary run side by side and
+        join_summary keeps the summary unless the email turned out to be spam.
+        """
+        from langgraph.graph import StateGraph, END
+
+        interrupt_review = defer_review and self.checkpointer is not None
+        if interrupt_review:
+            defer_review = False
         workflow = StateGraph(GraphState)
 
         # Define nodes
-        workflow.add_node("filter_email", self.run_filter_email)
-        workflow.add_node("summarize_email", self.run_summarize_email)
-        workflow.add_node("generate_response", self.run_generate_response)
-        workflow.add_node("human_review", self.run_human_review)
+        workflow.add_node("filter_email", self._instrument("filter_email", self.run_filter_email))
+        workflow.add_node("summarize_email", self._instrument("summarize_email", self.run_summarize_email))
+        workflow.add_node("generate_response", self._instrument("generate_response", self.run_generate_response))
+        if not defer_review:
+            workflow.add_node("human_review", self._instrument("human_review", self.run_human_review))
+
+        filter_entry = "filter_email"
+        if self.parallel:
+            workflow.add_node("fan_out", lambda state: {})
+            workflow.add_node("speculate_summary", self._instrument("speculate_summary", self.run_speculate_summary))
+            workflow.add_node("join_summary", self._instrument("join_summary", self.run_join_summary))
+            workflow.add_edge("fan_out", "filter_email")
+            workflow.add_edge("fan_out", "speculate_summary")
+            workflow.add_edge(["filter_email", "speculate_summary"], "join_summary")
+            filter_entry = "fan_out"
+
+        classifier = "analyze_email" if self.fused else filter_entry
+        if self.fused:
+            workflow.add_node("analyze_email", self._instrument("analyze_email", self.run_analyze_email))
+            workflow.add_conditional_edges(
+                "analyze_email",
+                self.decide_after_analysis,
+                {"fallback": filter_entry, "review": END if defer_review else "human_review", "end": END}
+            )
+
+        classify = classifier
+        if self.dedup is not None:
+            workflow.add_node("dedup_email", self._instrument("dedup_email", self.run_dedup_email))
+            workflow.add_conditional_edges(
+                "dedup_email",
+                self.decide_after_dedup,
+                {"classify": classifier, "review": END if defer_review else "human_review", "end": END}
+            )
+            classify = "dedup_email"
 
         # Set entry point
-        workflow.set_entry_point("filter_email")
+        if self.prefilter is not None:
+            workflow.add_node("prefilter_email", self._instrument("prefilter_email", self.run_prefilter_email))
+            workflow.set_entry_point("prefilter_email")
+            workflow.add_conditional_edges(
+                "prefilter_email",
+                self.decide_after_prefilter,
+                {"classify": classify, "continue": "summarize_email", "end": END}
+            )
+        else:
+            workflow.set_entry_point(classify)
 
         # Define edges
+        if self.parallel:
+            workflow.add_conditional_edges(
+                "join_summary",
+                self.decide_after_filtering,
+                {"continue": "generate_response", "end": END}
+            )
+        else:
+            workflow.add_conditional_edges(
+                "filter_email",
+                self.decide_after_filtering,
+                {"continue": "summarize_email", "end": END}
+            )
         workflow.add_conditional_edges(
-            "filter_email",
-            self.decide_after_filtering,
-            {"continue": "summarize_email", "end": END}
+            "summarize_email",
+            self.decide_after_summary,
+            {"continue": "generate_response", "end": END}
         )
-        workflow.add_edge("summarize_email", "generate_response")
-        workflow.add_conditional_edges(
-            "generate_response",
-            self.decide_after_response_generation,
-            {"review": "human_review", "end": END}
-        )
-        workflow.add_edge("human_review", END)
+        if defer_review:
+            workflow.add_conditional_edges(
+                "generate_response",
+                self.decide_after_response_generation,
+                {"review": END, "end": END}
+            )
+        else:
+            workflow.add_conditional_edges(
+                "generate_response",
+                self.decide_after_response_generation,
+                {"review": "human_review", "end": END}
+            )
+            workflow.add_edge("human_review", END)
 
         # Compile the graph
-        return workflow.compile()
+        return workflow.compile(checkpointer=self.checkpointer, interrupt_before=["human_review"] if interrupt_review else None)
+
+    @staticmethod
+    def _instrument(node: str, run):
+        """
+        Wraps a node so its latency and failures are recorded (and traced when tracing is on).
+        """
+        def instrumented(state: GraphState):
+            with span(f"node.{node}", email_id=state['email_state'].email_id), NODE_SECONDS.time(node=node):
+                try:
+                    return run(state)
+                except Exception:
+                    NODE_ERRORS.inc(node=node)
+                    raise
+        return instrumented
+
+    def _chain(self, build: Callable):
+        chain = self._chains.get(build)
+        if chain is None:
+            chain = self._chains[build] = build(self.llm)
+        return chain
 
     # Node execution functions
+    def run_prefilter_email(self, state: GraphState):
+        logger.info("--- Running Prefilter Email Node ---")
+        category = self.prefilter.classify(state['email_state'])
+        if category:
+            state['email_state'].category = category
+        return state
+
+    def run_dedup_email(self, state: GraphState):
+        logger.info("--- Running Dedup Email Node ---")
+        email_state = state['email_state']
+        updates = self.dedup.lookup(email_state)
+        if updates:
+            email_state.category = updates['category']
+            email_state.summary = updates['summary']
+            email_state.draft_response = updates['draft_response']
+            # A reused draft is checked against this email's own content as well
+            email_state.needs_human_review = updates['needs_human_review'] or (
+                bool(updates['draft_response']) and requires_review(email_state, updates['category'])
+            )
+            email_state.duplicate_of = updates['duplicate_of']
+        return state
+
     def run_filter_email(self, state: GraphState):
         logger.info("--- Running Filter Email Node ---")
-        updates = filter_email(state['email_state'], state['llm'])
+        updates = filter_email(state['email_state'], self.llm, self.cache, self.classifier,
+                               chain=self._chain(build_filter_chain))
+        self._record_tokens(state['email_state'], updates)
         state['email_state'].category = updates.get('category', 'error')
-        return state
+        self._record_error(state['email_state'], updates)
+        # Only email_state is written, so this node can run alongside speculate_summary
+        return {"email_state": state['email_state']}
 
     def run_summarize_email(self, state: GraphState):
         logger.info("--- Running Summarize Email Node ---")
-        updates = summarize_email(state['email_state'], state['llm'])
-        state['email_state'].summary = updates.get('summary', '')
+        email_state = state['email_state']
+        self._summarize(email_state, threaded=email_state.category != "spam")
         return state
 
+    def run_speculate_summary(self, state: GraphState):
+        logger.info("--- Running Speculative Summarize Email Node ---")
+        # Works on a copy: filter_email is updating the real state at the same time
+        email_state = state['email_state'].model_copy()
+        self._load_thread(email_state)
+        updates = summarize_email(email_state, self.llm, self.cache, chain=self._chain(build_summary_chain))
+        updates.update(thread_id=email_state.thread_id, thread_summary=email_state.thread_summary,
+                       thread_version=email_state.thread_version)
+        return {"speculative_summary": updates}
+
+    def run_join_summary(self, state: GraphState):
+        logger.info("--- Running Join Summary Node ---")
+        email_state = state['email_state']
+        updates = state.get('speculative_summary') or {}
+        if email_state.category == "spam" or email_state.status == "error":
+            SPECULATIVE_SUMMARIES.inc(outcome="discarded")
+            logger.info(f"Discarding the speculative summary of email {email_state.email_id} ({email_state.category}).")
+        else:
+            SPECULATIVE_SUMMARIES.inc(outcome="used")
+            email_state.thread_id = updates.get('thread_id', email_state.thread_id)
+            email_state.thread_summary = updates.get('thread_summary', email_state.thread_summary)
+            email_state.thread_version = updates.get('thread_version', email_state.thread_version)
+            if not self._apply_summary(email_state, updates):
+                # Another reply in the thread was stored while this one was summarized
+                self._summarize(email_state)
+        return {"email_state": email_state, "speculative_summary": None}
+
+    def _load_thread(self, email_state: EmailState):
+        if self.threads is not None:
+            email_state.thread_id = self.threads.resolve(email_state)
+            email_state.thread_summary, email_state.thread_version = self.threads.get(email_state.thread_id, email_state.account)
+
+    def _summarize(self, email_state: EmailState, threaded: bool = True):
+        """
+        Summarizes an email and stores the result as its thread's new summary. If another
+        reply in the thread was stored in the meantime, the email is summarized again from
+        that newer summary, so neither reply's content is lost.
+        """
+        for attempt in range(THREAD_UPDATE_ATTEMPTS):
+            if threaded or attempt:
+                self._load_thread(email_state)
+            updates = summarize_email(email_state, self.llm, self.cache, chain=self._chain(build_summary_chain))
+            if self._apply_summary(email_state, updates):
+                return
+            THREAD_CONFLICTS.inc()
+            logger.info(f"Thread {email_state.thread_id} changed while email {email_state.email_id} was summarized; summarizing again.")
+        logger.warning(f"Thread {email_state.thread_id} kept changing; email {email_state.email_id} was not added to its summary.")
+
+    def _apply_summary(self, email_state: EmailState, updates: dict) -> bool:
+        """
+        Applies a summary to the email and its thread. Returns False if the thread summary
+        it was built from is out of date.
+        """
+        self._record_tokens(email_state, updates)
+        email_state.summary = updates.get('summary', '')
+        self._record_error(email_state, updates)
+        if self.threads is not None and email_state.summary:
+            return self.threads.update(email_state, email_state.summary)
+        return True
+
     def run_generate_response(self, state: GraphState):
         logger.info("--- Running Generate Response Node ---")
-        updates = generate_response(state['email_state'], state['llm'])
-        state['email_state'].draft_response = updates.get('draft_response', '')
-        state['email_state'].needs_human_review = updates.get('needs_human_review', False)
+        email_state = state['email_state']
+        if self.drafts is None or not needs_draft(email_state):
+            # Only drafts that will be generated get a stream; an unused one would stay open
+            updates = generate_response(email_state, self.llm, self.cache, chain=self._chain(build_response_chain))
+        else:
+            updates = generate_response(email_state, self.llm, self.cache, chain=self._chain(build_response_chain),
+                                        stream=self.drafts.open(email_state.email_id))
+        self._record_tokens(email_state, updates)
+        email_state.draft_response = updates.get('draft_response', '')
+        email_state.needs_human_review = updates.get('needs_human_review', False)
+        if updates.get('cancelled'):
+            # Rejected while it was still being written; there is nothing left to review
+            email_state.status = "rejected"
+        self._record_error(email_state, updates)
         return state
 
+    def run_analyze_email(self, state: GraphState):
+        logger.info("--- Running Analyze Email Node (fused) ---")
+        updates = analyze_email(state['email_state'], self.llm, self.cache, chain=self._chain(build_analysis_chain))
+        self._record_tokens(state['email_state'], updates)
+        if updates:
+            state['email_state'].category = updates['category']
+            state['email_state'].summary = updates['summary']
+            state['email_state'].draft_response = updates['draft_response']
+            state['email_state'].needs_human_review = updates['needs_human_review']
+        return state
+
+    @staticmethod
+    def _record_tokens(email_state: EmailState, updates: dict):
+        if not email_state.body_tokens:
+            email_state.body_tokens = estimate_tokens(email_state.cleaned_body)
+        email_state.tokens_saved += updates.get('tokens_saved', 0)
+
+    @staticmethod
+    def _record_error(email_state: EmailState, updates: dict):
+        # A failed LLM step ends the workflow instead of passing placeholder text downstream
+        if updates.get('error'):
+            email_state.error = updates['error']
+            email_state.status = "error"
+
     def run_human_review(self, state: GraphState):
         logger.info("--- Running Human Review Node ---")
-        updates = review_draft(state['email_state'])
+        email_state = state['email_state']
+        if email_state.review_decision:
+            # Resumed with a decision from the review queue; an edit has already replaced the draft
+            updates = apply_review_decision(email_state, email_state.review_decision, email_state.draft_response)
+        else:
+            updates = review_draft(email_state)
         state['email_state'].final_response = updates.get('final_response')
         state['email_state'].status = updates.get('status', 'reviewed')
         return state
 
     # Conditional edge logic
+    def decide_after_prefilter(self, state: GraphState):
+        category = state['email_state'].category
+        logger.info(f"--- Decision: After Prefilter (Category: {category}) ---")
+        if category == "new":
+            return "classify"
+        if category == "spam":
+            return "end"
+        return "continue"
+
+    def decide_after_dedup(self, state: GraphState):
+        duplicate_of = state['email_state'].duplicate_of
+        logger.info(f"--- Decision: After Dedup (Duplicate of: {duplicate_of}) ---")
+        if duplicate_of is None:
+            return "classify"
+        return self.decide_after_analysis(state)
+
     def decide_after_filtering(self, state: GraphState):
         logger.info(f"--- Decision: After Filtering (Category: {state['email_state'].category}) ---")
-        if state['email_state'].category == "spam":
+        if state['email_state'].category == "spam" or state['email_state'].status == "error":
             return "end"
         return "continue"
 
+    def decide_after_summary(self, state: GraphState):
+        if state['email_state'].status == "error":
+            return "end"
+        return "continue"
+
+    def decide_after_analysis(self, state: GraphState):
+        category = state['email_state'].category
+        logger.info(f"--- Decision: After Analysis (Category: {category}) ---")
+        if category == "new":
+            # The fused call failed or returned something unusable
+            logger.warning(f"Falling back to the three-node pipeline for email {state['email_state'].email_id}")
+            return "fallback"
+        if category == "spam":
+            return "end"
+        if category not in ["urgent", "needs_review"]:
+            state['email_state'].status = "processed"
+            return "end"
+        return self.decide_after_response_generation(state)
+
     def decide_after_response_generation(self, state: GraphState):
         logger.info(f"--- Decision: After Response Generation (Review needed: {state['email_state'].needs_human_review}) ---")
+        if state['email_state'].status in ("error", "rejected"):
+            return "end"
         if state['email_state'].needs_human_review:
             return "review"
         
@@ -93,6 +412,237 @@ class EmailSupervisor:
         return "end"
 
     def process_email(self, email: EmailState):
-        initial_state: GraphState = {"email_state": email, "llm": self.llm}
-        final_state = self.workflow.invoke(initial_state)
-        return final_state['email_state']
\ No newline at end of file
+        return self._run_graph(self.workflow, email, lane="interactive")
+
+    def cancel_draft(self, email_id: str) -> bool:
+        """
+        Stops generating an email's draft, e.g. because the reviewer rejected it while
+        watching it stream; the email ends as "rejected". Returns False if no draft is in progress.
+        """
+        return self.drafts is not None and self.drafts.cancel(email_id)
+
+    def _run_graph(self, workflow, email: EmailState, lane: str) -> EmailState:
+        """
+        Runs an email through a compiled graph and publishes its result to the dedup index,
+        so near-duplicates waiting on it (or arriving later) can reuse it.
+        """
+        try:
+            with span("email", email_id=email.email_id, lane=lane), EMAIL_SECONDS.time(lane=lane):
+                final_email = self._invoke_graph(workflow, email, lane)
+        except BaseException:
+            EMAIL_ERRORS.inc(lane=lane)
+            if self.dedup is not None:
+                self.dedup.release(email)
+            raise
+        EMAILS.inc(category=final_email.category, status=final_email.status)
+        if self.dedup is not None:
+            self.dedup.remember(final_email, llm_calls=self._estimate_llm_calls(final_email))
+        return final_email
+
+    def _invoke_graph(self, workflow, email: EmailState, lane: str) -> EmailState:
+        """
+        With checkpointing, each node's output is persisted under a per-email thread, so a run
+        interrupted by a crash or Ctrl-C resumes at the node where it stopped, and a graph
+        that already finished is not run again.
+        """
+        if self.checkpointer is None:
+            initial_state: GraphState = {"email_state": email}
+            return workflow.invoke(initial_state)['email_state']
+
+        run_config = {"configurable": {"thread_id": f"{lane}:{email.email_id}"}}
+        snapshot = workflow.get_state(run_config)
+        if snapshot.values and not snapshot.next:
+            logger.info(f"Email {email.email_id} already finished the workflow; reusing its checkpointed result.")
+            final_state = snapshot.values
+        elif snapshot.values and workflow is self.batch_workflow and snapshot.next == ("human_review",):
+            # Paused for review: only a review decision may resume it
+            logger.info(f"Email {email.email_id} is still waiting for human review.")
+            final_state = snapshot.values
+        else:
+            if snapshot.next:
+                logger.info(f"Resuming email {email.email_id} at {', '.join(snapshot.next)}.")
+            self.ledger.mark_started(email.email_id)
+            initial_state: Optional[GraphState] = None if snapshot.next else {"email_state": email}
+            final_state = workflow.invoke(initial_state, run_config)
+        self.ledger.mark_processed(final_state['email_state'])
+        return final_state['email_state']
+
+    def _review(self, email: EmailState, decision: Optional[str] = None, edited_response: Optional[str] = None) -> EmailState:
+        """
+        Completes the review of a draft that came out of the batch workflow: resumes its
+        paused graph (prompting on the calling thread unless a decision is given).
+        """
+        email.review_decision = decision
+        if decision == "edit":
+            email.draft_response = edited_response
+        if self.checkpointer is None:
+            return self.run_human_review({"email_state": email})['email_state']
+        run_config = {"configurable": {"thread_id": f"batch:{email.email_id}"}}
+        if self.batch_workflow.get_state(run_config).next != ("human_review",):
+            logger.warning(f"No paused workflow for email {email.email_id}; applying the review directly.")
+            return self.run_human_review({"email_state": email})['email_state']
+        self.batch_workflow.update_state(run_config, {"email_state": email})
+        final_state = self.batch_workflow.invoke(None, run_config)
+        self.ledger.mark_processed(final_state['email_state'])
+        return final_state['email_state']
+
+    def resume_reviews(self, limit: int = 100) -> List[EmailState]:
+        """
+        Applies the decisions recorded in the review queue and returns the finished emails.
+        """
+        if self.batch_workflow is None:
+            self.batch_workflow = self.build_graph(defer_review=True)
+        results = []
+        for item in self.review_queue.claim_decided(limit):
+            email = EmailState.model_validate_json(item["state"])
+            try:
+                final_state = self._review(email, item["decision"], item["edited_response"])
+            except Exception as e:
+                logger.error(f"Failed to apply review decision for email {email.email_id}: {e}")
+                continue
+            self.review_queue.mark_applied(email.email_id, final_state.status)
+            results.append(final_state)
+        return results
+
+    def _estimate_llm_calls(self, email: EmailState) -> int:
+        """
+        LLM calls an email of this category costs, used to report what deduplication saved.
+        """
+        if self.fused:
+            return 1
+        # In parallel mode spam has also been summarized
+        return {"spam": 2 if self.parallel else 1, "informational": 2}.get(email.category, 3)
+
+    def skip_done(self, emails: Iterable[EmailState]) -> Iterable[EmailState]:
+        """
+        Drops emails that a previous run already processed and handled.
+        """
+        return emails if self.ledger is None else self.ledger.skip_done(emails)
+
+    def spool(self, emails: List[EmailState]):
+        """
+        Stores freshly fetched emails in the ledger; pass it as the IMAP iterators' `spool`
+        so the mailbox's watermark and \\Seen flags only move past emails that a crashed
+        run can replay (see with_unfinished).
+        """
+        if self.ledger is not None and emails:
+            self.ledger.spool(emails)
+
+    def with_unfinished(self, emails: Iterable[EmailState]) -> Iterator[EmailState]:
+        """
+        Yields the spooled emails an earlier run fetched but did not finish, then `emails`,
+        each email once.
+        """
+        if self.ledger is None:
+            yield from emails
+            return
+        replayed = set()
+        unfinished = self.ledger.unfinished()
+        if unfinished:
+            logger.info(f"Retrying {len(unfinished)} emails an earlier run fetched but did not finish.")
+        for email in unfinished:
+            replayed.add(email.email_id)
+            yield email
+        for email in emails:
+            if email.email_id not in replayed:
+                yield email
+
+    def mark_done(self, email: EmailState):
+        """
+        Records that an email's result was sent or saved, so restarts skip it. Its
+        checkpoints are no longer needed and are deleted to keep the database small.
+        """
+        if self.ledger is None:
+            return
+        if email.status == "awaiting_review":
+            # Queued drafts are marked done by review.py once the decision has been applied
+            self.ledger.mark_awaiting_review(email)
+            return
+        if email.status != "error":
+            self.ledger.mark_done(email)
+        # A failed email keeps no checkpoints either, so the next run starts it from scratch
+        for lane in ("interactive", "batch"):
+            delete_checkpoints(self.checkpointer, f"{lane}:{email.email_id}")
+
+    def process_batch(self, emails: List[EmailState], max_concurrency: int = 4, interactive_review: bool = True) -> List[EmailState]:
+        """
+        Processes many emails concurrently and returns their final states in input order.
+
+        The automated lanes (filter, summarize, respond) run on a bounded worker pool.
+        Drafts that need human review are queued back to the calling thread and
+        reviewed there, so the interactive prompts never block the workers. Without
+        interactive_review they are stored in the review queue and returned with status
+        "awaiting_review"; review.py records decisions and resumes them later.
+        """
+        results: List[Optional[EmailState]] = [None] * len(emails)
+        for index, email_state in self._iter_indexed(emails, max_concurrency, interactive_review):
+            results[index] = email_state
+        return results
+
+    def iter_process(self, emails: Iterable[EmailState], max_concurrency: int = 4, interactive_review: bool = True) -> Iterator[EmailState]:
+        """
+        Like process_batch, but consumes `emails` lazily (e.g. from a streaming loader) and
+        yields each final state as soon as it is done. Only about 2 * max_concurrency emails
+        are held at once, so memory and time-to-first-result do not depend on the input size.
+        """
+        for _, email_state in self._iter_indexed(emails, max_concurrency, interactive_review):
+            yield email_state
+
+    def _iter_indexed(self, emails: Iterable[EmailState], max_concurrency: int, interactive_review: bool) -> Iterator[Tuple[int, EmailState]]:
+        if self.batch_workflow is None:
+            self.batch_workflow = self.build_graph(defer_review=True)
+
+        max_concurrency = max(1, max_concurrency)
+        logger.info(f"Processing emails with max_concurrency={max_concurrency}")
+        start = time.perf_counter()
+        count = 0
+        emails = iter(emails)
+        indexes = itertools.count()
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            futures = {}
+
+            def submit_next() -> bool:
+                email = next(emails, None)
+                if email is None:
+                    return False
+                futures[pool.submit(self._process_automated, email)] = next(indexes)
+                IN_FLIGHT.inc()
+                return True
+
+            # Keep the pool busy plus one spare email per worker, and no more
+            while len(futures) < 2 * max_concurrency and submit_next():
+                pass
+            while futures:
+                # The completed futures act as the review queue: finished drafts wait here while workers keep going
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures.pop(future)
+                    IN_FLIGHT.dec()
+                    email_state = future.result()
+                    if self._awaits_review(email_state):
+                        if interactive_review:
+                            email_state = self._review(email_state)
+                        else:
+                            self.review_queue.enqueue(email_state, thread_id=f"batch:{email_state.email_id}")
+                            email_state.status = "awaiting_review"
+                    count += 1
+                    yield index, email_state
+                while len(futures) < 2 * max_concurrency and submit_next():
+                    pass
+
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed * 60 if elapsed > 0 else float("inf")
+        logger.info(f"Batch complete: {count} emails in {elapsed:.1f}s ({rate:.1f} emails/min)")
+
+    def _process_automated(self, email: EmailState) -> EmailState:
+        try:
+            return self._run_graph(self.batch_workflow, email, lane="batch")
+        except Exception as e:
+            logger.error(f"Error processing email {email.email_id} in batch: {e}")
+            email.status = "error"
+            return email
+
+    @staticmethod
+    def _awaits_review(email: EmailState) -> bool:
+        return email.needs_human_review and email.final_response is None and email.status == "pending"
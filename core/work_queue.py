@@ -0,0 +1,184 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+from core.state import EmailState
+from utils.logger import logger
+from utils.metrics import metrics
+
+WORK_QUEUE_JOBS = metrics.counter("mailmind_work_queue_jobs_total", "Work queue jobs by outcome (enqueued, done, retried, failed, expired)")
+
+@dataclass
+class Job:
+    job_id: str
+    account: str
+    email: EmailState
+    attempts: int
+
+class WorkQueue:
+    """
+    A durable SQLite queue of emails shared by worker processes on one machine, so no
+    broker is needed.
+
+    A worker leases jobs for `lease_seconds` (the visibility timeout) and must complete,
+    retry or extend them before the lease runs out; the jobs of a worker that died
+    become visible again and are leased by another one. Each lease update is a single
+    write transaction, so two workers never hold the same job, and a worker whose lease
+    was taken over can no longer complete the job.
+
+    Job lifecycle: pending -> leased -> done (or back to pending for a retry, or failed).
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 5,
+                 base_delay: float = 30.0, max_delay: float = 3600.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # Autocommit, with explicit BEGIN IMMEDIATE where a read decides a write; the timeout
+        # lets other processes wait for the write lock instead of failing
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_queue ("
+            "job_id TEXT PRIMARY KEY, account TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 1, state TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, lease_owner TEXT, lease_expires REAL, last_error TEXT, final_status TEXT, "
+            "enqueued_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS work_queue_ready ON work_queue (status, priority, available_at)")
+        metrics.gauge("mailmind_work_queue_pending", "Jobs waiting in the work queue", function=self.pending_count)
+
+    def enqueue(self, account: str, email: EmailState, priority: int = 1) -> bool:
+        """
+        Adds an email for processing. Returns False if it was queued before, so an email
+        fetched twice (e.g. after a crash before the sync watermark was saved) runs once.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO work_queue (job_id, account, priority, state, available_at, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (email.email_id, account, priority, email.model_dump_json(), now, now),
+            )
+        if cursor.rowcount:
+            WORK_QUEUE_JOBS.inc(outcome="enqueued")
+        return bool(cursor.rowcount)
+
+    def lease(self, worker_id: str, limit: int = 1, accounts: Optional[Iterable[str]] = None) -> List[Job]:
+        """
+        Atomically leases up to `limit` ready jobs, most urgent and then oldest first, and
+        only from `accounts` if given. Expired leases are taken over.
+        """
+        now = time.time()
+        where = "((status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?))"
+        params = [now, now]
+        if accounts is not None:
+            accounts = list(accounts)
+            if not accounts:
+                return []
+            where += f" AND account IN ({', '.join('?' * len(accounts))})"
+            params += accounts
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                candidates = self._conn.execute(
+                    f"SELECT job_id, status FROM work_queue WHERE {where} ORDER BY priority, available_at LIMIT ?",
+                    params + [limit],
+                ).fetchall()
+                job_ids = [row["job_id"] for row in candidates]
+                rows = self._conn.execute(
+                    "UPDATE work_queue SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    f"WHERE job_id IN ({', '.join('?' * len(job_ids))}) RETURNING job_id, account, state, attempts",
+                    [worker_id, now + self.lease_seconds] + job_ids,
+                ).fetchall() if job_ids else []
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        expired = sum(row["status"] == "leased" for row in candidates)
+        if expired:
+            # The worker holding these died or stalled past its lease
+            logger.warning(f"Took over {expired} jobs whose lease expired.")
+            WORK_QUEUE_JOBS.inc(expired, outcome="expired")
+        return [Job(row["job_id"], row["account"], EmailState.model_validate_json(row["state"]), row["attempts"]) for row in rows]
+
+    def extend(self, job_ids: Iterable[str], worker_id: str) -> int:
+        """
+        Renews the leases a worker still holds. Returns how many were renewed.
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE work_queue SET lease_expires = ? WHERE status = 'leased' AND lease_owner = ? "
+                f"AND job_id IN ({', '.join('?' * len(job_ids))})",
+                [time.time() + self.lease_seconds, worker_id] + job_ids,
+            )
+        return cursor.rowcount
+
+    def complete(self, job_id: str, worker_id: str, final_status: str) -> bool:
+        """
+        Marks a leased job done. Returns False if the worker no longer holds the lease.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE work_queue SET status = 'done', final_status = ?, finished_at = ?, lease_owner = NULL "
+                "WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                (final_status, time.time(), job_id, worker_id),
+            )
+        if not cursor.rowcount:
+            logger.warning(f"Lease on job {job_id} was lost before it completed.")
+            return False
+        WORK_QUEUE_JOBS.inc(outcome="done")
+        return True
+
+    def retry(self, job_id: str, worker_id: str, error: str) -> bool:
+        """
+        Hands a failed job back with exponential backoff, or marks it failed once it has
+        used up its attempts. Returns False if the worker no longer holds the lease.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT attempts FROM work_queue WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                    (job_id, worker_id),
+                ).fetchone()
+                if row is not None:
+                    attempts = row["attempts"]
+                    failed = attempts >= self.max_attempts
+                    delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                    self._conn.execute(
+                        "UPDATE work_queue SET status = ?, available_at = ?, last_error = ?, lease_owner = NULL, "
+                        "finished_at = ? WHERE job_id = ?",
+                        ("failed" if failed else "pending", now + delay, error, now if failed else None, job_id),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return False
+        WORK_QUEUE_JOBS.inc(outcome="failed" if failed else "retried")
+        if failed:
+            logger.error(f"Job {job_id} failed after {attempts} attempts: {error}")
+        return True
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM work_queue GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def pending_count(self) -> int:
+        return self.counts().get("pending", 0)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
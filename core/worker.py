@@ -0,0 +1,169 @@
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+from core.accounts import Account, shard_accounts
+from core.email_imap import iter_new_emails
+from core.email_sender import SMTPClient, Outbox
+from core.imap_idle import handle_unattended_result
+from core.imap_sync_state import SyncStateStore
+from core.scheduler import NORMAL, get_default_scheduler
+from core.work_queue import Job, WorkQueue
+from utils.logger import logger
+from utils.metrics import metrics
+import config
+
+WORKER_EMAILS = metrics.counter("mailmind_worker_emails_total", "Emails finished by each worker process")
+
+class Worker:
+    """
+    One of `count` worker processes, each with its own EmailSupervisor.
+
+    Worker `index` polls the mailboxes of its shard of the accounts into the shared work
+    queue, then leases jobs: its own accounts' first and, when those run out, any other
+    account's, so a worker with quiet mailboxes helps a busy one. Throughput grows with
+    the number of workers, and the queue's leases make sure each email is processed by
+    one worker at a time, with a retry on another worker if its worker dies.
+    """
+
+    def __init__(self, supervisor, queue: WorkQueue, accounts: List[Account], index: int = 0, count: int = 1,
+                 max_concurrency: Optional[int] = None, poll_interval: Optional[float] = None, steal: Optional[bool] = None):
+        self.supervisor = supervisor
+        self.queue = queue
+        self.accounts = {account.name: account for account in accounts}
+        self.index = index
+        self.count = count
+        self.owned = shard_accounts(accounts, index, count)
+        self.max_concurrency = max_concurrency or max(1, config.MAX_CONCURRENCY)
+        self.batch_size = 2 * self.max_concurrency
+        self.poll_interval = config.IMAP_POLL_INTERVAL_SECONDS if poll_interval is None else poll_interval
+        self.steal = config.WORKER_STEAL if steal is None else steal
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+        # Cheap local signals order the queue so urgent mail is leased first
+        self.scheduler = get_default_scheduler(supervisor.prefilter, supervisor.classifier)
+        self._next_poll = 0.0
+        self._mailers: Dict[str, tuple] = {}
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.processed = 0
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self) -> int:
+        """
+        Fetches new mail from this worker's accounts into the work queue. Returns the number queued.
+        """
+        queued = 0
+        for account in self.owned:
+            mail = None
+            try:
+                mail = account.connect_imap()
+                for email in iter_new_emails(account.folder, mail=mail, state_store=SyncStateStore(account.sync_state_path)):
+                    email.email_id = account.email_id(email.email_id)
+                    email.account = account.name
+                    priority = self.scheduler.priority(email)[0] if self.scheduler is not None else NORMAL
+                    queued += self.queue.enqueue(account.name, email, priority)
+            except Exception as e:
+                logger.error(f"Failed to poll account {account.name}: {e}")
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+        if queued:
+            logger.info(f"Worker {self.index} queued {queued} new emails.")
+        return queued
+
+    def lease(self) -> List[Job]:
+        jobs = self.queue.lease(self.worker_id, self.batch_size, accounts=[account.name for account in self.owned])
+        if self.steal and len(jobs) < self.batch_size:
+            jobs += self.queue.lease(self.worker_id, self.batch_size - len(jobs))
+        return jobs
+
+    def _mailer(self, account_name: str) -> tuple:
+        # One SMTP session and outbox per account, opened on first use
+        if account_name not in self._mailers:
+            account = self.accounts.get(account_name)
+            if account is None:
+                logger.warning(f"Unknown account {account_name!r}; replying through the configured SMTP server.")
+                self._mailers[account_name] = (SMTPClient(), Outbox(config.OUTBOX_PATH))
+            else:
+                self._mailers[account_name] = (account.smtp_client(), account.outbox())
+        return self._mailers[account_name]
+
+    def _renew_leases(self):
+        # Leases are renewed well before they run out while a batch is being processed
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            with self._held_lock:
+                held = list(self._held)
+            self.queue.extend(held, self.worker_id)
+
+    def process(self, jobs: List[Job]) -> int:
+        """
+        Runs leased jobs through the supervisor and completes them in the queue.
+        """
+        by_id = {job.email.email_id: job for job in jobs}
+        with self._held_lock:
+            self._held.update(job.job_id for job in jobs)
+        try:
+            emails = list(self.supervisor.skip_done(job.email for job in jobs))
+            for job_id in set(by_id) - {email.email_id for email in emails}:
+                # Handled before, e.g. by a worker that died before completing the job
+                self.queue.complete(by_id[job_id].job_id, self.worker_id, "skipped")
+            for final_state in self.supervisor.iter_process(emails, max_concurrency=self.max_concurrency, interactive_review=False):
+                job = by_id[final_state.email_id]
+                if final_state.status == "error":
+                    self.supervisor.mark_done(final_state)
+                    self.queue.retry(job.job_id, self.worker_id, final_state.error or "processing failed")
+                    continue
+                # The job is completed before the reply goes out: a worker that stalled past its
+                # lease loses it to the worker that took the job over and must not send too
+                if not self.queue.complete(job.job_id, self.worker_id, final_state.status):
+                    continue
+                smtp_client, outbox = self._mailer(job.account)
+                handle_unattended_result(final_state, smtp_client, outbox)
+                self.supervisor.mark_done(final_state)
+                WORKER_EMAILS.inc(worker=str(self.index))
+                self.processed += 1
+        finally:
+            with self._held_lock:
+                self._held.difference_update(job.job_id for job in jobs)
+        for smtp_client, outbox in self._mailers.values():
+            if outbox.pending_count():
+                outbox.flush(smtp_client)
+        return len(jobs)
+
+    def run_once(self) -> int:
+        """
+        Polls the owned mailboxes if due, then processes one batch. Returns the number of jobs handled.
+        """
+        if self.owned and time.monotonic() >= self._next_poll:
+            self.poll()
+            self._next_poll = time.monotonic() + self.poll_interval
+        jobs = self.lease()
+        return self.process(jobs) if jobs else 0
+
+    def run(self, until_empty: bool = False):
+        """
+        Runs until stop() is called, or with `until_empty` until no job is left to lease.
+        """
+        logger.info(f"Worker {self.index}/{self.count} ({self.worker_id}) polling {len(self.owned)} accounts: "
+                    f"{', '.join(account.name for account in self.owned) or 'none'}")
+        renewer = threading.Thread(target=self._renew_leases, daemon=True)
+        renewer.start()
+        try:
+            while not self._stop.is_set():
+                if not self.run_once():
+                    if until_empty:
+                        break
+                    # Nothing to do: wait a little instead of hammering the queue
+                    self._stop.wait(min(1.0, self.poll_interval))
+        finally:
+            self._stop.set()
+            for smtp_client, _ in self._mailers.values():
+                smtp_client.close()
+        logger.info(f"Worker {self.index} stopped after {self.processed} emails.")
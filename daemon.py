@@ -0,0 +1,36 @@
+import os
+import signal
+from core.imap_idle import IMAPIdleDaemon
+from core.supervisor import EmailSupervisor
+from utils.logger import logger
+from utils.metrics import start_exporters
+import config
+
+def main():
+    """
+    Runs the email assistant as a long-lived IMAP daemon.
+    """
+    logger.info("🚀 Starting AI Email Assistant daemon...")
+    start_exporters()
+
+    if not all([config.IMAP_SERVER, config.IMAP_USERNAME, config.IMAP_PASSWORD]):
+        logger.error("IMAP credentials are not configured. Exiting.")
+        return
+
+    # Ensure drafts directory exists
+    if not os.path.exists('drafts'):
+        os.makedirs('drafts')
+
+    daemon = IMAPIdleDaemon(EmailSupervisor())
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}; shutting down.")
+        daemon.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,64 @@
 import os
-from core.email_ingestion import load_emails_from_json
-from core.email_imap import fetch_unread_emails
-from core.email_sender import send_email, save_draft
+from core.email_ingestion import iter_emails_from_json
+from core.email_imap import iter_unread_emails, iter_new_emails
+from core.email_sender import SMTPClient, Outbox, deliver, save_draft
+from core.scheduler import get_default_scheduler
 from core.supervisor import EmailSupervisor
+from agents.human_review_agent import DraftPrinter
 from utils.logger import logger
 from utils.formatter import format_email_preview
+from utils.metrics import metrics, start_exporters
 import config
 
+def handle_final_state(final_state, smtp_client: SMTPClient, outbox: Outbox):
+    """
+    Performs the post-processing actions (send, save draft, log) for a processed email.
+    """
+    logger.info(f"Finished processing email ID {final_state.email_id}. Final status: {final_state.status}")
+    if final_state.tokens_saved:
+        logger.info(f"Trimmed {final_state.tokens_saved} prompt tokens for email {final_state.email_id} (body: ~{final_state.body_tokens} tokens)")
+
+    # Post-processing actions
+    if final_state.status == "approved_for_sending" and final_state.final_response:
+        print("\n" + "-"*50)
+        print("📧 Action: Send Email")
+        print(f"To: {final_state.sender}")
+        print(f"Subject: Re: {final_state.subject}")
+        print("Body:\n" + final_state.final_response)
+        print("-" * 50)
+
+        confirm_send = input("Confirm sending this email? (y/n): ").strip().lower()
+        if confirm_send == 'y':
+            deliver(
+                smtp_client,
+                outbox,
+                to_email=final_state.sender,
+                subject=f"Re: {final_state.subject}",
+                body=final_state.final_response
+            )
+        else:
+            logger.warning("Sending cancelled by user.")
+            draft_filename = f"{final_state.email_id}_draft.txt"
+            save_draft(
+                subject=f"Re: {final_state.subject}",
+                body=final_state.final_response,
+                filename=draft_filename
+            )
+    elif final_state.status == "awaiting_review":
+        logger.info(f"Draft for email {final_state.email_id} queued for review. Run `python review.py` to approve, edit or reject it.")
+    elif final_state.status == "error":
+        logger.error(f"Email {final_state.email_id} failed ({final_state.error}); it will be retried on the next run.")
+    elif final_state.status == "rejected":
+        logger.info(f"Email {final_state.email_id} was rejected during review. No action taken.")
+    else:
+        logger.info(f"No response generated for email {final_state.email_id}. (Category: {final_state.category})")
+
 def main():
     """
     Main function to run the email assistant.
     """
     logger.info("🚀 Starting AI Email Assistant...")
+    start_exporters()
 
     # Ensure drafts directory exists
     if not os.path.exists('drafts'):
@@ -19,61 +66,94 @@ def main():
 
     # Choose ingestion method
     use_imap = input("Use live IMAP to fetch emails? (y/n): ").strip().lower() == 'y'
-    
-    if use_imap:
-        if not all([config.IMAP_SERVER, config.IMAP_USERNAME, config.IMAP_PASSWORD]):
-            logger.error("IMAP credentials are not configured. Exiting.")
-            return
-        emails = fetch_unread_emails()
-    else:
-        emails = load_emails_from_json("sample_emails.json")
-    
-    if not emails:
-        logger.info("No emails to process. Exiting.")
+    if use_imap and not all([config.IMAP_SERVER, config.IMAP_USERNAME, config.IMAP_PASSWORD]):
+        logger.error("IMAP credentials are not configured. Exiting.")
         return
 
-    logger.info(f"Found {len(emails)} emails to process.")
-    
     # Initialize the supervisor
     supervisor = EmailSupervisor()
-    
-    for email_state in emails:
-        print("\n" + "#"*70)
-        logger.info(f"Processing email: {format_email_preview(email_state.subject, email_state.sender, email_state.cleaned_body)}")
-        
-        # Run the email through the state graph
-        final_state = supervisor.process_email(email_state)
 
-        logger.info(f"Finished processing email ID {final_state.email_id}. Final status: {final_state.status}")
-        
-        # Post-processing actions
-        if final_state.status == "approved_for_sending" and final_state.final_response:
-            print("\n" + "-"*50)
-            print("📧 Action: Send Email")
-            print(f"To: {final_state.sender}")
-            print(f"Subject: Re: {final_state.subject}")
-            print("Body:\n" + final_state.final_response)
-            print("-" * 50)
-            
-            confirm_send = input("Confirm sending this email? (y/n): ").strip().lower()
-            if confirm_send == 'y':
-                send_email(
-                    to_email=final_state.sender,
-                    subject=f"Re: {final_state.subject}",
-                    body=final_state.final_response
-                )
-            else:
-                logger.warning("Sending cancelled by user.")
-                draft_filename = f"{final_state.email_id}_draft.txt"
-                save_draft(
-                    subject=f"Re: {final_state.subject}",
-                    body=final_state.final_response,
-                    filename=draft_filename
-                )
-        elif final_state.status == "rejected":
-            logger.info(f"Email {final_state.email_id} was rejected during review. No action taken.")
+    if use_imap:
+        # Fetched mail is spooled in the ledger before the mailbox moves past it, and what an
+        # interrupted run did not finish is retried first
+        if config.IMAP_INCREMENTAL_SYNC:
+            emails = iter_new_emails(spool=supervisor.spool)
         else:
-            logger.info(f"No response generated for email {final_state.email_id}. (Category: {final_state.category})")
+            emails = iter_unread_emails(spool=supervisor.spool)
+        emails = supervisor.with_unfinished(emails)
+    else:
+        emails = iter_emails_from_json("sample_emails.json")
+    # Emails are streamed from the source and processed as they arrive, not loaded up front
+
+    # One SMTP session is reused for every approved reply; failed sends are retried from the outbox
+    smtp_client = SMTPClient()
+    outbox = Outbox(config.OUTBOX_PATH)
+    
+    # Emails fully handled by an interrupted earlier run are skipped; partial ones resume
+    emails = supervisor.skip_done(emails)
+    # Urgent mail is drafted before the backlog of newsletters and notifications; the scheduler
+    # reads ahead, which is only safe when fetched IMAP mail is spooled in the ledger
+    scheduler = get_default_scheduler(supervisor.prefilter, supervisor.classifier,
+                                      spooled=not use_imap or supervisor.ledger is not None)
+    if scheduler is not None:
+        emails = scheduler.schedule(emails)
+    processed = 0
+    if config.MAX_CONCURRENCY > 1 or config.REVIEW_MODE == "queue":
+        # In queue mode drafts needing review are stored for review.py instead of blocking the run
+        final_states = supervisor.iter_process(emails, max_concurrency=config.MAX_CONCURRENCY,
+                                               interactive_review=config.REVIEW_MODE != "queue")
+        for final_state in final_states:
+            print("\n" + "#"*70)
+            if scheduler is not None:
+                scheduler.complete(final_state)
+            handle_final_state(final_state, smtp_client, outbox)
+            supervisor.mark_done(final_state)
+            processed += 1
+    else:
+        # Drafts are printed as they are generated, so reading starts before the review prompt
+        printer = DraftPrinter()
+        if supervisor.drafts is not None:
+            supervisor.drafts.subscribe(printer)
+        for email_state in emails:
+            print("\n" + "#"*70)
+            logger.info(f"Processing email: {format_email_preview(email_state.subject, email_state.sender, email_state.cleaned_body)}")
+
+            # Run the email through the state graph
+            final_state = supervisor.process_email(email_state)
+            printer.finish()
+            if scheduler is not None:
+                scheduler.complete(final_state)
+            handle_final_state(final_state, smtp_client, outbox)
+            supervisor.mark_done(final_state)
+            processed += 1
+
+    if not processed:
+        logger.info("No emails to process.")
+
+    if outbox.pending_count():
+        logger.info(f"Retrying queued emails: {outbox.flush(smtp_client)}")
+    smtp_client.close()
+    if smtp_client.sent or smtp_client.errors:
+        logger.info(f"SMTP stats: {smtp_client.stats()}")
+    if supervisor.prefilter is not None:
+        logger.info(f"Prefilter stats: {supervisor.prefilter.stats()}")
+    if supervisor.classifier is not None:
+        logger.info(f"Local classifier stats: {supervisor.classifier.stats()}")
+    if supervisor.dedup is not None:
+        logger.info(f"Dedup stats: {supervisor.dedup.stats()}")
+    if scheduler is not None:
+        logger.info(f"Scheduler stats (time to draft per category): {scheduler.stats()}")
+    if supervisor.cache is not None:
+        logger.info(f"LLM cache stats: {supervisor.cache.stats()}")
+    pending_reviews = supervisor.review_queue.pending_count()
+    if pending_reviews:
+        logger.info(f"{pending_reviews} drafts are waiting for review. Run `python review.py`.")
+    if supervisor.ledger is not None:
+        logger.info(f"Processing ledger: {supervisor.ledger.stats()}")
+
+    if config.METRICS_JSON_PATH:
+        metrics.dump_json(config.METRICS_JSON_PATH)
+        logger.info(f"Metrics written to {config.METRICS_JSON_PATH}")
 
     logger.info("✅ All emails processed. System shutting down.")
 
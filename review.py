@@ -0,0 +1,145 @@
+import argparse
+import os
+import time
+from agents.human_review_agent import print_review, read_edited_draft
+from core.email_sender import SMTPClient, Outbox, deliver, save_draft
+from core.accounts import load_accounts
+from core.draft_stream import read_partial_draft, request_cancel, streaming_drafts
+from core.supervisor import EmailSupervisor
+from utils.formatter import format_email_preview
+from utils.logger import logger
+import config
+
+def review_interactively(supervisor: EmailSupervisor) -> int:
+    """
+    Walks through the pending drafts one by one. Returns the number of decisions made.
+    """
+    decided = 0
+    for email_state in supervisor.review_queue.pending():
+        print_review(email_state)
+        while True:
+            action = input("Choose action: [A]pprove, [E]dit, [R]eject, [S]kip, [Q]uit: ").strip().lower()
+            if action in ['a', 'e', 'r', 's', 'q']:
+                break
+            print("Invalid choice. Please enter 'A', 'E', 'R', 'S' or 'Q'.")
+        if action == 'q':
+            break
+        if action == 's':
+            continue
+        if action == 'e':
+            supervisor.review_queue.decide(email_state.email_id, "edit", read_edited_draft())
+        else:
+            supervisor.review_queue.decide(email_state.email_id, "approve" if action == 'a' else "reject")
+        decided += 1
+    return decided
+
+def watch_draft(email_id: str, poll_seconds: float = 0.2) -> bool:
+    """
+    Prints a draft while it is being generated, until it is finished or stopped.
+    Returns False if no draft is being generated for the email.
+    """
+    shown = read_partial_draft(config.DRAFT_STREAM_DIR, email_id)
+    if shown is None:
+        return False
+    print(shown, end="", flush=True)
+    while True:
+        time.sleep(poll_seconds)
+        text = read_partial_draft(config.DRAFT_STREAM_DIR, email_id)
+        if text is None:
+            print()
+            return True
+        print(text[len(shown):], end="", flush=True)
+        shown = text
+
+def apply_decisions(supervisor: EmailSupervisor, send: bool):
+    """
+    Resumes the workflows of every decided draft, then sends or saves the approved replies.
+    """
+    accounts = {account.name: account for account in load_accounts()} if send else {}
+    # Replies go out through the mailbox the email came from (see workers.py); one SMTP session each
+    mailers = {}
+    for final_state in supervisor.resume_reviews():
+        subject = f"Re: {final_state.subject}"
+        if final_state.status == "approved_for_sending" and final_state.final_response:
+            if send:
+                if final_state.account not in mailers:
+                    account = accounts.get(final_state.account)
+                    mailers[final_state.account] = ((account.smtp_client(), account.outbox()) if account is not None
+                                                    else (SMTPClient(), Outbox(config.OUTBOX_PATH)))
+                smtp_client, outbox = mailers[final_state.account]
+                deliver(smtp_client, outbox, to_email=final_state.sender, subject=subject, body=final_state.final_response)
+            else:
+                save_draft(subject=subject, body=final_state.final_response, filename=f"{final_state.email_id}_draft.txt")
+        else:
+            logger.info(f"Email {final_state.email_id} was rejected during review. No action taken.")
+        supervisor.mark_done(final_state)
+    for smtp_client, _ in mailers.values():
+        smtp_client.close()
+
+def main():
+    """
+    Reviews drafts queued by the pipeline (REVIEW_MODE=queue or the daemon).
+    """
+    parser = argparse.ArgumentParser(description="Approve, edit or reject drafts waiting for human review.")
+    parser.add_argument("action", nargs="?", choices=["list", "watch", "approve", "reject", "edit"],
+                        help="Omit to review the pending drafts one by one; 'watch' follows a draft being generated")
+    parser.add_argument("email_ids", nargs="*", help="Email IDs to approve, reject or edit")
+    parser.add_argument("--all", action="store_true", help="Apply the action to every pending draft")
+    parser.add_argument("--file", help="With 'edit': read the revised draft from this file instead of stdin")
+    parser.add_argument("--send", action="store_true", help="Send approved replies instead of saving them to drafts/")
+    args = parser.parse_args()
+
+    if not os.path.exists('drafts'):
+        os.makedirs('drafts')
+
+    supervisor = EmailSupervisor()
+    queue = supervisor.review_queue
+
+    if args.action == "list":
+        pending = queue.pending()
+        for email_state in pending:
+            print(f"[{email_state.email_id}] {format_email_preview(email_state.subject, email_state.sender, email_state.draft_response)}\n")
+        print(f"{len(pending)} drafts awaiting review. Queue: {queue.counts()}")
+        drafting = streaming_drafts(config.DRAFT_STREAM_DIR)
+        if drafting:
+            print(f"Being drafted now (watch or reject them): {', '.join(drafting)}")
+        return
+
+    if args.action == "watch":
+        if len(args.email_ids) != 1:
+            parser.error("watch takes exactly one email ID")
+        if not watch_draft(args.email_ids[0]):
+            logger.warning(f"No draft is being generated for email {args.email_ids[0]}.")
+        return
+
+    if args.action is None:
+        review_interactively(supervisor)
+    else:
+        email_ids = [e.email_id for e in queue.pending()] if args.all else args.email_ids
+        if not email_ids:
+            parser.error("give one or more email IDs, or --all")
+        if args.action == "edit":
+            if len(email_ids) != 1:
+                parser.error("edit takes exactly one email ID")
+            if args.file:
+                with open(args.file, encoding="utf-8") as f:
+                    edited = f.read()
+            else:
+                edited = read_edited_draft()
+            decisions = {email_ids[0]: edited}
+        else:
+            decisions = {email_id: None for email_id in email_ids}
+        for email_id, edited in decisions.items():
+            if queue.decide(email_id, args.action, edited):
+                continue
+            if args.action == "reject" and request_cancel(config.DRAFT_STREAM_DIR, email_id):
+                # Still being written: stop the generation; the pipeline records the email as rejected
+                logger.info(f"Stopping the draft being generated for email {email_id}.")
+            else:
+                logger.warning(f"Email {email_id} is not awaiting review.")
+
+    apply_decisions(supervisor, send=args.send)
+    logger.info(f"Review queue: {queue.counts()}")
+
+if __name__ == "__main__":
+    main()
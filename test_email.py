@@ -1,4 +1,5 @@
 import pytest
+import time
 from unittest.mock import patch, MagicMock
 from core.state import EmailState
 from agents.filtering_agent import filter_email
@@ -18,6 +19,18 @@ class MockStructuredLLM:
         from agents.filtering_agent import EmailCategory
         return EmailCategory(category=self.category)
 
+@pytest.fixture(autouse=True)
+def isolated_state_files(tmp_path, monkeypatch):
+    # Keep objects created in tests from sharing the on-disk cache and queues
+    monkeypatch.setattr(config, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(config, "OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(config, "CHECKPOINT_PATH", str(tmp_path / "checkpoints.sqlite3"))
+    monkeypatch.setattr(config, "REVIEW_QUEUE_PATH", str(tmp_path / "review_queue.sqlite3"))
+    monkeypatch.setattr(config, "DEDUP_PATH", str(tmp_path / "dedup_index.sqlite3"))
+    monkeypatch.setattr(config, "THREAD_STORE_PATH", str(tmp_path / "threads.sqlite3"))
+    monkeypatch.setattr(config, "LOCAL_CLASSIFIER_PATH", str(tmp_path / "local_classifier.json"))
+    monkeypatch.setattr(config, "DRAFT_STREAM_DIR", str(tmp_path / "drafts"))
+
 @pytest.fixture
 def sample_email_state():
     return EmailState(
@@ -91,6 +104,30 @@ def test_imap_connection_failure(mock_imaplib):
     emails = fetch_unread_emails()
     assert emails == []
 
+def test_emails_that_fail_to_fetch_stay_unread(monkeypatch):
+    """Tests that only fetched emails are marked as read, so failed fetches are retried."""
+    from core.email_imap import fetch_emails_by_uid, fetch_unread_emails
+    from benchmarks.imap_standin import FakeIMAPServer
+
+    monkeypatch.setattr(config, "IMAP_FETCH_CHUNK_SIZE", 1)
+    for header_first in (False, True):
+        monkeypatch.setattr(config, "IMAP_HEADER_FIRST", header_first)
+        server = FakeIMAPServer()
+        for i in range(4):
+            server.add_message(f"Mail {i}")
+        server.failing_uids = {2}
+        with patch('core.email_imap.imaplib.IMAP4_SSL', side_effect=server.connect):
+            assert [e.email_id for e in fetch_unread_emails()] == ["inbox-1-1", "inbox-1-3", "inbox-1-4"]
+            assert not server.messages[2]["seen"]
+            server.failing_uids = set()
+            assert [e.email_id for e in fetch_unread_emails()] == ["inbox-1-2"]
+
+    # A message whose headers arrived but whose body did not is not returned without a body
+    mail = server.connect()
+    fetch = mail.uid
+    mail.uid = lambda command, *args: ("NO", []) if "BODY.PEEK[1]" in args[-1] else fetch(command, *args)
+    assert fetch_emails_by_uid(mail, [1, 2], header_first=True) == []
+
 @patch('core.email_sender.smtplib.SMTP')
 def test_smtp_send_success(mock_smtp):
     """Tests a successful SMTP call."""
@@ -103,4 +140,1010 @@ def test_smtp_send_success(mock_smtp):
     instance.starttls.assert_called_once()
     instance.login.assert_called_with(config.EMAIL_USERNAME, config.EMAIL_PASSWORD)
     instance.sendmail.assert_called_once()
-    instance.quit.assert_called_once()
\ No newline at end of file
+    instance.quit.assert_called_once()
+
+def test_process_batch_preserves_order_and_defers_review():
+    """Tests that batch processing keeps input order and reviews drafts on the calling thread."""
+    from core.supervisor import EmailSupervisor
+
+    def fake_filter(state, llm, cache=None, classifier=None, chain=None):
+        return {"category": "spam" if "sale" in state.subject else "urgent"}
+
+    def fake_response(state, llm, cache=None, chain=None, stream=None):
+        return {"draft_response": f"Reply to {state.email_id}", "needs_human_review": "review" in state.subject}
+
+    emails = [
+        EmailState(email_id=f"batch-{i}", subject=subject, sender="a@example.com", body="hi", cleaned_body="hi")
+        for i, subject in enumerate(["hello", "big sale", "please review", "status"])
+    ]
+    with patch('core.supervisor.filter_email', side_effect=fake_filter), \
+         patch('core.supervisor.summarize_email', return_value={"summary": "s"}), \
+         patch('core.supervisor.generate_response', side_effect=fake_response), \
+         patch('core.supervisor.review_draft', return_value={"final_response": "edited", "status": "approved_for_sending"}) as mock_review:
+        results = EmailSupervisor().process_batch(emails, max_concurrency=3)
+
+    assert [r.email_id for r in results] == ["batch-0", "batch-1", "batch-2", "batch-3"]
+    assert results[1].category == "spam"
+    assert results[0].final_response == "Reply to batch-0"
+    assert results[2].final_response == "edited"
+    mock_review.assert_called_once()
+
+def test_fused_mode_uses_single_call_and_falls_back(sample_email_state):
+    """Tests that fused mode skips the three-node path unless the fused call fails."""
+    from core.supervisor import EmailSupervisor
+
+    analysis = {"category": "urgent", "summary": "s", "draft_response": "Thanks!", "needs_human_review": False}
+    with patch('core.supervisor.analyze_email', return_value=analysis), \
+         patch('core.supervisor.filter_email') as mock_filter:
+        result = EmailSupervisor(fused=True).process_email(sample_email_state.copy())
+    mock_filter.assert_not_called()
+    assert result.final_response == "Thanks!"
+    assert result.status == "approved_for_sending"
+
+    with patch('core.supervisor.analyze_email', return_value={}), \
+         patch('core.supervisor.filter_email', return_value={"category": "informational"}) as mock_filter, \
+         patch('core.supervisor.summarize_email', return_value={"summary": "fallback summary"}):
+        other_email = sample_email_state.copy(update={"email_id": "test-456", "cleaned_body": "Could you share the agenda for the planning meeting tomorrow?"})
+        result = EmailSupervisor(fused=True).process_email(other_email)
+    mock_filter.assert_called_once()
+    assert result.category == "informational"
+    assert result.summary == "fallback summary"
+    assert not result.final_response
+
+def test_llm_cache_hits_ttl_and_lru(tmp_path):
+    """Tests cache hits/misses, TTL expiry and LRU eviction."""
+    from core.llm_cache import LLMCache, cached_invoke
+    from langchain_core.prompts import ChatPromptTemplate
+
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    prompt = ChatPromptTemplate.from_messages([("human", "{body}")])
+    llm = MagicMock(model_name="deepseek-chat")
+    compute = MagicMock(side_effect=lambda: "summary")
+
+    assert cached_invoke(cache, prompt, llm, {"body": "a"}, compute) == "summary"
+    assert cached_invoke(cache, prompt, llm, {"body": "a"}, compute) == "summary"
+    assert compute.call_count == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    # Hits are read-only; their access times are written in batches
+    writes = cache._conn.total_changes
+    cached_invoke(cache, prompt, llm, {"body": "a"}, compute)
+    assert cache._conn.total_changes == writes and compute.call_count == 1
+
+    # A different model must not share entries
+    other_llm = MagicMock(model_name="other-model")
+    cached_invoke(cache, prompt, other_llm, {"body": "a"}, compute)
+    assert compute.call_count == 2
+
+    # Re-opening the file keeps entries; inserting a third evicts the least recently used
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cached_invoke(cache, prompt, llm, {"body": "a"}, compute)
+    cached_invoke(cache, prompt, llm, {"body": "b"}, compute)
+    assert compute.call_count == 3
+    assert cache.get(LLMCache.make_key(prompt, other_llm, {"body": "a"})) is None
+
+    expired = LLMCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=-1)
+    assert expired.get(LLMCache.make_key(prompt, llm, {"body": "a"})) is None
+
+def test_prefilter_rules_and_stats():
+    """Tests that the rule-based prefilter only decides confident cases and counts rule hits."""
+    from agents.prefilter_agent import RuleBasedPrefilter
+
+    prefilter = RuleBasedPrefilter(allowlist=["partner.io"], denylist=["spammy.biz"])
+    make = lambda sender, subject, body, headers=None: EmailState(
+        email_id="p", subject=subject, sender=sender, body=body, cleaned_body=body, headers=headers or {}
+    )
+
+    assert prefilter.classify(make("x@spammy.biz", "Hi", "hello")) == "spam"
+    assert prefilter.classify(make("deals@shop.com", "50% OFF", "Click here. Limited time offer!")) == "spam"
+    assert prefilter.classify(make("News <no-reply@service.com>", "Weekly", "Stats", {"List-Unsubscribe": "<mailto:u@s.com>"})) == "informational"
+    assert prefilter.classify(make("ceo@partner.io", "50% OFF", "Click here. Limited time offer!")) is None
+    assert prefilter.classify(make("test@example.com", "Question", "Can you help?")) is None
+
+    stats = prefilter.stats()
+    assert stats["emails"] == 5
+    assert stats["decided_locally"] == 3
+    assert stats["rule_hits"]["denylist"] == 1
+    assert stats["rule_hits"]["allowlist"] == 1
+
+def test_prefilter_short_circuits_llm_classifier():
+    """Tests that a confident prefilter decision skips the LLM filter node."""
+    from core.supervisor import EmailSupervisor
+
+    spam = EmailState(email_id="s", subject="DON'T MISS OUT", sender="deals@shop.com",
+                      body="Buy now, 50% off!", cleaned_body="Buy now, 50% off!")
+    with patch('core.supervisor.filter_email') as mock_filter:
+        result = EmailSupervisor().process_email(spam)
+    mock_filter.assert_not_called()
+    assert result.category == "spam"
+
+def test_incremental_imap_sync_uses_uid_watermark(tmp_path, monkeypatch):
+    """Tests that UID-based sync fetches only new mail, independent of the \\Seen flag."""
+    from core.email_imap import fetch_new_emails
+    from core.imap_sync_state import SyncStateStore
+    from benchmarks.imap_standin import FakeIMAPServer
+
+    server = FakeIMAPServer(capabilities=("IMAP4REV1", "CONDSTORE"))
+    server.add_message("old read", seen=True)
+    server.add_message("unread 1")
+    server.add_message("unread 2")
+    store = SyncStateStore(str(tmp_path / "sync.json"))
+
+    with patch('core.email_imap.imaplib.IMAP4_SSL', side_effect=server.connect):
+        first = fetch_new_emails(state_store=store)
+        assert [e.subject for e in first] == ["unread 1", "unread 2"]
+
+        server.add_message("new 1", seen=True)  # read by another client before we polled
+        server.add_message("new 2")
+        second = fetch_new_emails(state_store=store)
+        assert [e.subject for e in second] == ["new 1", "new 2"]
+        assert [e.email_id for e in second] == ["inbox-1-4", "inbox-1-5"]
+
+        server.commands.clear()
+        assert fetch_new_emails(state_store=store) == []
+        assert server.commands == []  # unchanged HIGHESTMODSEQ skips SEARCH and FETCH
+
+        # The watermark stops before a message that failed to fetch, so it is fetched again
+        monkeypatch.setattr(config, "IMAP_FETCH_CHUNK_SIZE", 1)
+        for i in range(3):
+            server.add_message(f"late {i}")
+        server.failing_uids = {7}
+        assert [e.email_id for e in fetch_new_emails(state_store=store)] == ["inbox-1-6", "inbox-1-8"]
+        assert store.get("inbox")["last_uid"] == 6 and store.get("inbox")["highestmodseq"] is None
+        server.failing_uids = set()
+        assert [e.email_id for e in fetch_new_emails(state_store=store)] == ["inbox-1-7", "inbox-1-8"]
+        assert store.get("inbox")["last_uid"] == 8
+
+        server.reset(uidvalidity=2)
+        server.add_message("after reset")
+        assert [(e.subject, e.email_id) for e in fetch_new_emails(state_store=store)] == [("after reset", "inbox-2-1")]
+    assert store.get("inbox") == {"uidvalidity": 2, "last_uid": 1, "highestmodseq": server.modseq}
+
+def test_emails_fetched_by_an_interrupted_run_are_not_lost(tmp_path):
+    """Tests that emails fetched ahead of the work done are spooled and finished by the next run."""
+    from core.email_imap import iter_new_emails
+    from core.imap_sync_state import SyncStateStore
+    from core.scheduler import PriorityScheduler
+    from core.supervisor import EmailSupervisor
+    from benchmarks.imap_standin import FakeIMAPServer
+
+    server = FakeIMAPServer()
+    for i in range(6):
+        server.add_message(f"Mail {i}")
+    store = SyncStateStore(str(tmp_path / "sync.json"))
+
+    def run(stop_after=None):
+        supervisor = EmailSupervisor()
+        emails = supervisor.with_unfinished(iter_new_emails(state_store=store, window=2, spool=supervisor.spool))
+        # The scheduler reads the whole mailbox ahead of the work done
+        emails = PriorityScheduler(lookahead=500).schedule(emails)
+        finished = []
+        for final_state in supervisor.iter_process(supervisor.skip_done(emails), max_concurrency=2):
+            supervisor.mark_done(final_state)
+            finished.append(final_state.email_id)
+            if len(finished) == stop_after:
+                break  # Ctrl-C
+        return finished
+
+    with patch('core.email_imap.imaplib.IMAP4_SSL', side_effect=server.connect), \
+         patch('core.supervisor.filter_email', return_value={"category": "spam"}):
+        first = run(stop_after=1)
+        assert store.get("inbox")["last_uid"] > len(first)  # the watermark ran ahead of the finished emails
+        second = run()
+        assert run() == []
+        assert sorted(first + second) == [f"inbox-1-{uid}" for uid in range(1, 7)]
+
+        # After a UIDVALIDITY change, a reused UID is a new email, not one the ledger has done
+        server.reset(uidvalidity=2)
+        server.add_message("After reset")
+        assert run() == ["inbox-2-1"]
+
+def test_batched_header_first_fetch_skips_attachments():
+    """Tests that UID fetches are batched and header-first mode never downloads attachments."""
+    from email.mime.application import MIMEApplication
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from core.email_imap import fetch_emails_by_uid
+    from benchmarks.imap_standin import FakeIMAPServer
+
+    server = FakeIMAPServer()
+    attachment = b"%PDF" + b"x" * 50000
+    for i in range(5):
+        msg = MIMEMultipart("mixed")
+        msg["From"] = f"client{i}@example.com"
+        msg["Subject"] = f"Report {i}"
+        msg["List-Unsubscribe"] = "<mailto:unsubscribe@example.com>"
+        alternative = MIMEMultipart("alternative")
+        alternative.attach(MIMEText(f"Plain body {i} caf\u00e9", "plain", "utf-8"))
+        alternative.attach(MIMEText(f"<p>HTML body {i}</p>", "html", "utf-8"))
+        msg.attach(alternative)
+        msg.attach(MIMEApplication(attachment, Name="report.pdf"))
+        msg.get_payload()[1]["Content-Disposition"] = 'attachment; filename="report.pdf"'
+        server.add_raw(msg.as_bytes())
+
+    mail = server.connect()
+    full = fetch_emails_by_uid(mail, [1, 2, 3, 4, 5], chunk_size=2, header_first=False)
+    assert len([c for c in server.commands if c[0] == "FETCH"]) == 3
+    full_bytes = server.bytes_sent
+
+    server.commands.clear()
+    server.bytes_sent = 0
+    emails = fetch_emails_by_uid(mail, [5, 1, 2, 3, 4], chunk_size=10, header_first=True)
+    fetches = [c for c in server.commands if c[0] == "FETCH"]
+    assert len(fetches) == 2  # one header/structure round-trip, one for the shared text section
+    assert fetches[0][1] == "1:5"
+    assert "BODY.PEEK[1.1]" in fetches[1][2]
+    assert server.bytes_sent < full_bytes / 20
+
+    assert [e.email_id for e in emails] == ["1", "2", "3", "4", "5"]
+    assert emails[0].subject == "Report 0"
+    assert emails[0].cleaned_body == "Plain body 0 caf\u00e9"
+    assert emails[0].headers["List-Unsubscribe"] == "<mailto:unsubscribe@example.com>"
+    assert [e.cleaned_body for e in full] == [e.cleaned_body for e in emails]
+
+def test_idle_daemon_reconnects_and_processes_new_mail(tmp_path, monkeypatch):
+    """Tests that the daemon retries a failed connection, then polls and processes new mail."""
+    from core.imap_idle import IMAPIdleDaemon
+    from benchmarks.imap_standin import FakeIMAPServer
+
+    monkeypatch.setattr(config, "IMAP_SYNC_STATE_PATH", str(tmp_path / "sync.json"))
+    server = FakeIMAPServer()  # no IDLE capability: exercises the NOOP polling fallback
+    server.add_message("first")
+    attempts = []
+
+    def connect(host, port):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        return server.connect()
+
+    supervisor = MagicMock(prefilter=None, classifier=None)
+    processed = []
+    supervisor.iter_process.side_effect = lambda emails, **kwargs: [
+        e.copy(update={"status": "processed"}) for e in emails if not processed.append(e.subject)
+    ]
+    supervisor.skip_done.side_effect = lambda emails: emails
+    supervisor.with_unfinished.side_effect = lambda emails: emails
+    daemon = IMAPIdleDaemon(supervisor)
+    daemon.initial_backoff = 0.01
+    daemon.poll_interval = 0
+    original_sync = daemon.sync_and_process
+
+    def sync_and_add(mail):
+        original_sync(mail)
+        if len(server.messages) == 1:
+            server.add_message("second")
+
+    daemon.sync_and_process = sync_and_add
+    with patch('core.email_imap.imaplib.IMAP4_SSL', side_effect=connect):
+        daemon.run(max_cycles=1)
+
+    assert len(attempts) == 2
+    assert processed == ["first", "second"]
+    # Each fetched window is spooled before the watermark moves past it
+    assert [[e.subject for e in call.args[0]] for call in supervisor.spool.call_args_list] == [["first"], ["second"]]
+    assert all(call.kwargs["interactive_review"] is False for call in supervisor.iter_process.call_args_list)
+
+def test_idle_wait_returns_on_exists():
+    """Tests the IDLE/DONE exchange against a socket-backed stand-in."""
+    import socket
+    import threading
+    from core.imap_idle import IMAPIdleDaemon
+
+    client, server = socket.socketpair()
+    reader = client.makefile("rb")
+    mail = MagicMock()
+    mail.sock = client
+    mail._new_tag.return_value = b"A001"
+    mail.send.side_effect = client.sendall
+    mail.readline.side_effect = reader.readline
+
+    def serve():
+        server_file = server.makefile("rb")
+        assert server_file.readline() == b"A001 IDLE\r\n"
+        server.sendall(b"+ idling\r\n")
+        server.sendall(b"* 4 EXISTS\r\n")
+        assert server_file.readline() == b"DONE\r\n"
+        server.sendall(b"A001 OK IDLE terminated\r\n")
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    assert IMAPIdleDaemon(MagicMock())._idle_wait(mail, timeout=5) is True
+    thread.join(timeout=5)
+    client.close()
+    server.close()
+
+def test_smtp_client_reuses_connection_and_retries_from_outbox(tmp_path):
+    """Tests bulk sending over one connection and outbox retries against a local SMTP stand-in."""
+    from core.email_sender import SMTPClient, Outbox, deliver
+    from benchmarks.smtp_standin import SMTPStandin
+
+    with SMTPStandin() as server:
+        client = SMTPClient(host=server.host, port=server.port, username="bot@example.com", password="")
+        results = client.send_many([(f"user{i}@example.com", f"Re: {i}", "Thanks!") for i in range(5)])
+        assert results == [None] * 5
+        assert len(server.messages) == 5
+        assert server.connections == 1
+
+        outbox = Outbox(str(tmp_path / "outbox.sqlite3"), base_delay=0)
+        server.reject_next = 1
+        assert deliver(client, outbox, "later@example.com", "Re: later", "Body") is False
+        assert outbox.pending_count() == 1
+        assert outbox.flush(client) == {"sent": 1, "retrying": 0, "failed": 0}
+        assert outbox.pending_count() == 0
+        assert server.messages[-1]["to"] == ["<later@example.com>"]
+
+        stats = client.stats()
+        client.close()
+    assert stats["sent"] == 6 and stats["errors"] == 1
+    assert stats["connections_opened"] == 1
+    assert stats["latency_p50_s"] > 0
+
+def test_clean_email_body_fast_path_and_quote_stripping():
+    """Tests HTML extraction, the plain-text fast path and removal of quoted history and signatures."""
+    from utils.formatter import clean_email_body
+
+    html_body = (
+        "<html><head><style>p{color:red}</style><script>track()</script></head>"
+        "<body><p>Hello&nbsp;team &amp; friends</p><div>Status: on track</div>"
+        '<div class="gmail_quote">On Mon, Bob wrote:<blockquote>old thread</blockquote></div></body></html>'
+    )
+    assert clean_email_body(html_body) == "Hello\xa0team & friends\nStatus: on track"
+
+    plain = "Hi <bob@example.com>, a < b.\n\nThanks,\n-- \nAnna\nCEO"
+    assert clean_email_body(plain) == "Hi <bob@example.com>, a < b.\nThanks,"
+
+    reply = "Sounds good.\n\nOn Tue, 8 Jul 2025 at 10:00, Tom <tom@example.com>\nwrote:\n> Can we meet?\n> Tom"
+    assert clean_email_body(reply) == "Sounds good."
+    assert "> Can we meet?" in clean_email_body(reply, strip_quotes=False)
+
+    forwarded = "FYI\n---------- Forwarded message ---------\nFrom: Ops <ops@example.com>\nDate: Mon\nSubject: Outage\nTo: me\n\nThe database is down."
+    assert "The database is down." in clean_email_body(forwarded)
+    assert clean_email_body("> only quoted text") == "> only quoted text"
+
+    # Text the sender wrote is kept: a reported quote, a "--" mid-message and a bare blockquote
+    reported = "Hi team,\nOn Friday the vendor wrote:\nwe will ship late.\nPlease advise on the refund."
+    assert clean_email_body(reported) == reported
+    sections = "Part one\n--\n" + "\n".join(f"Step {i}" for i in range(8))
+    assert clean_email_body(sections) == sections
+    terms = '<p>Our terms:</p><blockquote>Payment within 30 days.</blockquote><blockquote type="cite">Old reply</blockquote>'
+    assert clean_email_body(terms) == "Our terms:\nPayment within 30 days."
+
+def test_token_budget_trims_body_per_node(monkeypatch):
+    """Tests quote/table trimming, head+tail truncation and per-node tokens_saved accounting."""
+    from utils.formatter import clean_email_body
+    from utils.token_budget import collapse_tables, estimate_tokens, fit_to_budget, keep_head_and_tail
+    from agents.filtering_agent import EmailCategory
+
+    quoted = "Please approve the Q3 budget.\n\nOn Mon, Bob wrote:\n" + "\n".join(f"> old line {i}" for i in range(200))
+    trimmed, saved = fit_to_budget(quoted, 50)
+    assert trimmed == "Please approve the Q3 budget." and saved > 0
+
+    rows = "".join(f"<tr><td>Item {i}</td><td>${i}.99</td></tr>" for i in range(100))
+    table = clean_email_body(f"<p>Order summary:</p><table>{rows}</table><p>Thanks for your order.</p>")
+    assert table.split("\n")[1] == "Item 0 | $0.99"
+    trimmed, _ = fit_to_budget(table, 60)
+    assert "table rows omitted" in trimmed and trimmed.endswith("Thanks for your order.")
+    # Short prose lines (lists, addresses, sign-offs) are not a table
+    prose = "Packing list:\n" + "\n".join(f"- item {i}" for i in range(40)) + "\nBest regards\nAnna\n12 Main Street\nSpringfield"
+    assert collapse_tables(prose) == prose
+    # A cut that lands on whitespace only does not fail
+    assert keep_head_and_tail(" " * 400 + "Thanks", 40).endswith("Thanks")
+
+    long_body = "Hello team. " + "Lorem ipsum dolor sit amet. " * 2000 + "Please reply by Friday."
+    trimmed, saved = fit_to_budget(long_body, 100)
+    assert trimmed.startswith("Hello team.") and trimmed.endswith("Please reply by Friday.")
+    assert estimate_tokens(trimmed) <= 100 and "tokens omitted" in trimmed
+    assert saved == estimate_tokens(long_body) - estimate_tokens(trimmed)
+    assert fit_to_budget(long_body, 0) == (long_body, 0)
+
+    monkeypatch.setattr(config, "TOKEN_BUDGET_FILTER", 100)
+    state = EmailState(email_id="big", subject="Hi", sender="a@example.com", body=long_body, cleaned_body=long_body)
+    llm = MagicMock()
+    llm.with_structured_output.return_value = lambda _: EmailCategory(category="urgent")
+    updates = filter_email(state, llm)
+    assert updates["category"] == "urgent" and updates["tokens_saved"] == saved
+
+def test_parallel_parsing_matches_inline(monkeypatch):
+    """Tests that process-pool parsing produces the same EmailStates as inline parsing."""
+    import core.email_imap as email_imap
+    from benchmarks.imap_standin import FakeIMAPServer
+
+    server = FakeIMAPServer()
+    for i in range(12):
+        server.add_message(f"Subject {i}", body=f"<p>Body {i}</p><blockquote type=\"cite\">quoted</blockquote>")
+    monkeypatch.setattr(email_imap, "PARALLEL_PARSE_MIN_MESSAGES", 1)
+
+    uids = list(range(1, 13))
+    for header_first in (False, True):
+        inline = email_imap.fetch_emails_by_uid(server.connect(), uids, chunk_size=5, header_first=header_first, parse_workers=1)
+        parallel = email_imap.fetch_emails_by_uid(server.connect(), uids, chunk_size=5, header_first=header_first, parse_workers=2)
+        assert [e.email_id for e in parallel] == [str(uid) for uid in uids]
+        assert [e.model_dump() for e in parallel] == [e.model_dump() for e in inline]
+        assert parallel[3].cleaned_body == "Body 3"
+
+def test_streaming_ingestion_and_lazy_processing(tmp_path, monkeypatch):
+    """Tests the incremental JSON reader and that iter_process pulls emails lazily."""
+    import asyncio
+    import json
+    import core.email_ingestion as ingestion
+    from core.supervisor import EmailSupervisor
+
+    items = [{"email_id": f"e{i}", "subject": f"S{i}", "sender": "a@example.com", "body": f"<p>Body {i} é ]</p>"}
+             for i in range(50)]
+    path = tmp_path / "emails.json"
+    path.write_text(json.dumps(items, indent=2), encoding="utf-8")
+    monkeypatch.setattr(ingestion, "ijson", None)
+    monkeypatch.setattr(ingestion, "READ_SIZE", 7)  # items straddle many read blocks
+
+    emails = list(ingestion.iter_emails_from_json(str(path)))
+    assert [e.email_id for e in emails] == [f"e{i}" for i in range(50)]
+    assert emails[3].cleaned_body == "Body 3 é ]"
+    assert ingestion.load_emails_from_json(str(tmp_path / "missing.json")) == []
+
+    async def collect():
+        return [e.email_id async for e in ingestion.aiter_emails_from_json(str(path))]
+    assert asyncio.run(collect())[:2] == ["e0", "e1"]
+
+    pulled = []
+    def source():
+        for email in emails:
+            pulled.append(email.email_id)
+            yield email
+
+    with patch('core.supervisor.filter_email', return_value={"category": "spam"}):
+        stream = EmailSupervisor().iter_process(source(), max_concurrency=2)
+        first = next(stream)
+        assert first.category == "spam"
+        assert len(pulled) <= 5  # only the in-flight window has been read
+        assert len(list(stream)) == 49
+
+def test_checkpointed_run_resumes_and_skips_done_emails(sample_email_state):
+    """Tests that an interrupted email resumes at the failed node and handled emails are skipped."""
+    from core.supervisor import EmailSupervisor
+
+    with patch('core.supervisor.filter_email', return_value={"category": "informational"}) as mock_filter, \
+         patch('core.supervisor.summarize_email', side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            EmailSupervisor().process_email(sample_email_state.copy())
+    mock_filter.assert_called_once()
+
+    # A new process: the classification is restored from the checkpoint, not recomputed
+    supervisor = EmailSupervisor()
+    assert supervisor.ledger.get("test-123") == "in_progress"
+    with patch('core.supervisor.filter_email') as mock_filter, \
+         patch('core.supervisor.summarize_email', return_value={"summary": "resumed"}):
+        result = supervisor.process_email(sample_email_state.copy())
+    mock_filter.assert_not_called()
+    assert result.category == "informational" and result.summary == "resumed"
+    assert supervisor.ledger.get("test-123") == "processed"
+
+    supervisor.mark_done(result)
+    assert not supervisor.workflow.get_state({"configurable": {"thread_id": "interactive:test-123"}}).values
+    other = sample_email_state.copy(update={"email_id": "test-456"})
+    assert [e.email_id for e in EmailSupervisor().skip_done([sample_email_state, other])] == ["test-456"]
+
+def test_review_queue_decouples_review_from_processing():
+    """Tests that drafts needing review are queued without blocking and resumed once decided."""
+    from core.supervisor import EmailSupervisor
+
+    def fake_response(state, llm, cache=None, chain=None, stream=None):
+        return {"draft_response": f"Draft {state.email_id}", "needs_human_review": "review" in state.subject}
+
+    emails = [
+        EmailState(email_id=f"q-{i}", subject=subject, sender="a@example.com", body="hi", cleaned_body="hi")
+        for i, subject in enumerate(["hello", "please review", "review too"])
+    ]
+    with patch('core.supervisor.filter_email', return_value={"category": "urgent"}), \
+         patch('core.supervisor.summarize_email', return_value={"summary": "s"}), \
+         patch('core.supervisor.generate_response', side_effect=fake_response), \
+         patch('core.supervisor.review_draft') as mock_prompt:
+        supervisor = EmailSupervisor()
+        results = supervisor.process_batch(emails, max_concurrency=2, interactive_review=False)
+        assert [r.status for r in results] == ["approved_for_sending", "awaiting_review", "awaiting_review"]
+        assert [e.email_id for e in supervisor.review_queue.pending()] == ["q-1", "q-2"]
+
+        # Decisions arrive later, e.g. from review.py in another process
+        reviewer = EmailSupervisor()
+        assert reviewer.review_queue.decide("q-1", "edit", "Edited reply")
+        assert reviewer.review_queue.decide("q-2", "reject")
+        assert not reviewer.review_queue.decide("q-0", "approve")
+        resumed = {e.email_id: e for e in reviewer.resume_reviews()}
+        assert resumed["q-1"].final_response == "Edited reply" and resumed["q-1"].status == "approved_for_sending"
+        assert resumed["q-2"].status == "rejected"
+        assert reviewer.resume_reviews() == []  # each decision is applied once
+    mock_prompt.assert_not_called()
+    assert reviewer.review_queue.counts() == {"applied": 2}
+
+def test_near_duplicates_reuse_one_llm_result():
+    """Tests SimHash clustering, concurrent duplicate coordination, draft adaptation and persistence."""
+    from core.dedup import adapt_draft, simhash, hamming_distance
+    from core.supervisor import EmailSupervisor
+
+    body = "Hi, I cannot log in to my account number {} since this morning. Can you help me get access again please?"
+    assert hamming_distance(simhash(body.format(1234)), simhash(body.format(98765))) <= 3
+    assert hamming_distance(simhash(body.format(1)), simhash("Quarterly results are attached; revenue grew in every region this year.")) > 3
+    assert simhash("Thanks!") is None
+
+    def slow_filter(state, llm, cache=None, classifier=None, chain=None):
+        time.sleep(0.2)  # duplicates arrive while the first email is still being classified
+        return {"category": "urgent"}
+
+    def fake_response(state, llm, cache=None, chain=None, stream=None):
+        return {"draft_response": f"Hi {state.sender.split()[0]}, we have sent you a reset link.", "needs_human_review": False}
+
+    senders = ["Alice Smith <alice@example.com>", "Bob Jones <bob@example.com>", "Carol <carol@example.com>"]
+    emails = [EmailState(email_id=f"d-{i}", subject="Login help", sender=sender, body=body.format(i), cleaned_body=body.format(i))
+              for i, sender in enumerate(senders)]
+    with patch('core.supervisor.filter_email', side_effect=slow_filter) as mock_filter, \
+         patch('core.supervisor.summarize_email', return_value={"summary": "Login help request"}), \
+         patch('core.supervisor.generate_response', side_effect=fake_response) as mock_response:
+        supervisor = EmailSupervisor()
+        results = supervisor.process_batch(emails, max_concurrency=3, interactive_review=False)
+        assert mock_filter.call_count == 1 and mock_response.call_count == 1
+        # Whichever email claimed the cluster first is its representative
+        representative = next(r.email_id for r in results if r.duplicate_of is None)
+        assert sorted(r.duplicate_of or "" for r in results) == ["", representative, representative]
+        assert [r.draft_response for r in results] == [f"Hi {name}, we have sent you a reset link." for name in ("Alice", "Bob", "Carol")]
+        # Drafts reused for other names and account numbers wait for a human instead of being sent
+        assert [r.status for r in results if r.duplicate_of] == ["awaiting_review", "awaiting_review"]
+        assert next(r for r in results if r.duplicate_of is None).status == "approved_for_sending"
+        assert all(r.summary == "Login help request" for r in results)
+        assert supervisor.dedup.stats()["duplicates"] == 2 and supervisor.dedup.stats()["llm_calls_avoided"] == 6
+
+        # The index survives a restart; an exact resend from the same person is answered as is
+        original = next(e for e in emails if e.email_id == representative)
+        resend = EmailState(email_id="d-9", subject="Login help", sender=original.sender, body=original.body, cleaned_body=original.body)
+        result = EmailSupervisor().process_email(resend)
+        # The same body under another subject may not be the same request
+        other_subject = EmailState(email_id="d-10", subject="Account closure", sender=original.sender, body=original.body,
+                                   cleaned_body=original.body)
+        [renamed] = EmailSupervisor().process_batch([other_subject], interactive_review=False)
+    assert mock_filter.call_count == 1
+    assert result.duplicate_of == representative and result.status == "approved_for_sending"
+    assert renamed.duplicate_of == representative and renamed.status == "awaiting_review"
+
+    # Only the greeting is re-addressed; names that are also words stay untouched
+    draft = "Hi May,\nWe will ship in May. Will Mark call you?"
+    assert adapt_draft(draft, "May Lee <may@example.com>", "Bob <bob@example.com>") == "Hi Bob,\nWe will ship in May. Will Mark call you?"
+    assert adapt_draft(draft, "May Lee <may@example.com>", "bob@example.com") == "Hello,\nWe will ship in May. Will Mark call you?"
+
+def test_replies_are_summarized_from_the_thread_summary():
+    """Tests thread reconstruction from headers and incremental per-thread summaries."""
+    from core.email_imap import parse_email_message
+    from core.email_ingestion import _to_email_state
+    from core.supervisor import EmailSupervisor
+
+    first = parse_email_message(
+        b"From: Alice <alice@example.com>\r\nTo: me@example.com\r\nCc: Bob <bob@example.com>, carol@example.com\r\n"
+        b"Subject: Offsite\r\nMessage-ID: <a1@example.com>\r\n\r\nCan we plan the offsite for May?",
+        "t-1",
+    )
+    assert first.message_id == "<a1@example.com>" and first.thread_id == "<a1@example.com>"
+    second = _to_email_state({
+        "email_id": "t-2", "subject": "Re: Offsite", "sender": "bob@example.com",
+        "body": "May 12 works for me.\n\nOn Mon, Alice wrote:\n> Can we plan the offsite for May?",
+        "headers": {"Message-ID": "<b2@example.com>", "In-Reply-To": "<a1@example.com>", "References": "<a1@example.com>"},
+    })
+    assert second.references == ["<a1@example.com>"] and second.thread_id == "<a1@example.com>"
+    # A client that dropped References is still linked through In-Reply-To
+    third = EmailState(email_id="t-3", subject="Re: Offsite", sender="alice@example.com", body="Booked.", cleaned_body="Booked.",
+                       message_id="<c3@example.com>", in_reply_to="<b2@example.com>", thread_id="<b2@example.com>")
+
+    prompts = []
+    def fake_summarize(state, llm, cache=None, chain=None):
+        prompts.append((state.thread_summary, state.cleaned_body))
+        return {"summary": f"summary {len(prompts)}"}
+
+    with patch('core.supervisor.filter_email', return_value={"category": "informational"}), \
+         patch('core.supervisor.summarize_email', side_effect=fake_summarize):
+        supervisor = EmailSupervisor(fused=False)
+        for email_state in (first, second, third):
+            supervisor.process_email(email_state)
+    assert prompts == [("", "Can we plan the offsite for May?"), ("summary 1", "May 12 works for me."), ("summary 2", "Booked.")]
+    assert third.thread_id == "<a1@example.com>"
+    assert supervisor.threads.get_summary("<a1@example.com>") == "summary 3"
+
+    # Two replies summarized at the same time both end up in the thread summary
+    import threading
+    barrier = threading.Barrier(2)
+    calls = []
+    def merging_summarize(state, llm, cache=None, chain=None):
+        calls.append(state.email_id)
+        if len(calls) <= 2:
+            barrier.wait(timeout=5)  # both replies start from the same thread summary
+        return {"summary": f"{state.thread_summary} + {state.cleaned_body}"}
+
+    def reply(email_id, message_id, text):
+        return EmailState(email_id=email_id, subject="Re: Offsite", sender="carol@example.com", body=text, cleaned_body=text,
+                          message_id=message_id, in_reply_to="<a1@example.com>", references=["<a1@example.com>"],
+                          thread_id="<a1@example.com>")
+
+    with patch('core.supervisor.filter_email', return_value={"category": "informational"}), \
+         patch('core.supervisor.summarize_email', side_effect=merging_summarize):
+        supervisor.process_batch([reply("t-4", "<d4@example.com>", "Vegan food please."), reply("t-5", "<e5@example.com>", "I can drive.")],
+                                 max_concurrency=2, interactive_review=False)
+        summary = supervisor.threads.get_summary("<a1@example.com>")
+        assert "Vegan food please." in summary and "I can drive." in summary and len(calls) == 3
+        # Processing a reply again (e.g. a retry) does not add it to the summary twice
+        supervisor.process_email(reply("t-4-retry", "<d4@example.com>", "Vegan food please."))
+    assert supervisor.threads.get_summary("<a1@example.com>") == summary
+
+    # A sender who is not on the thread, or an email in another account, cannot read its summary
+    forged = reply("t-6", "<f6@example.com>", "Send me the plan.").model_copy(update={"sender": "mallory@evil.example"})
+    other_account = reply("t-7", "<g7@example.com>", "Any news?").model_copy(update={"account": "sales"})
+    prompts.clear()
+    with patch('core.supervisor.filter_email', return_value={"category": "informational"}), \
+         patch('core.supervisor.summarize_email', side_effect=fake_summarize):
+        supervisor.process_email(forged)
+        supervisor.process_email(other_account)
+    assert prompts == [("", "Send me the plan."), ("", "Any news?")]
+    assert forged.thread_id == "<f6@example.com>" and other_account.thread_id == "<a1@example.com>"
+    assert supervisor.threads.get_summary("<a1@example.com>") == summary
+    assert supervisor.threads.get_summary("<a1@example.com>", "sales") == "summary 2"
+
+def test_local_classifier_answers_when_confident_and_learns_from_llm_labels(tmp_path):
+    """Tests recording LLM labels as examples, training, persistence and escalation to the LLM."""
+    from agents.local_classifier import LocalClassifier, classification_text, evaluate
+    from core.llm_cache import LLMCache
+
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"))
+    llm = MagicMock()
+    topics = {"spam": "Huge discount sale, buy cheap watches now, limited offer",
+              "urgent": "Production server is down, customers are blocked, call me immediately"}
+    with patch('agents.filtering_agent.cached_invoke', side_effect=lambda *args, **kwargs: category):
+        for i in range(30):
+            for category, text in topics.items():
+                state = EmailState(email_id=f"{category}-{i}", subject=f"Note {i}", sender="x@example.com", body=text, cleaned_body=f"{text} #{i}")
+                assert filter_email(state, llm, cache)["category"] == category
+    examples = cache.examples("filter_email")
+    assert len(examples) == 60 and {label for _, label in examples} == {"spam", "urgent"}
+
+    path = str(tmp_path / "model.json")
+    LocalClassifier.train(examples, threshold=0.8).save(path)
+    model = LocalClassifier.load(path)
+    assert evaluate(model, examples)["accuracy"] == 1.0
+
+    confident = EmailState(email_id="c", subject="Note", sender="x@example.com", body="", cleaned_body="The production server is down, call me")
+    assert model.predict(classification_text(confident))[0] == "urgent"
+    with patch('agents.filtering_agent.cached_invoke') as mock_llm_call:
+        assert filter_email(confident, llm, cache, model) == {"category": "urgent"}
+        assert not mock_llm_call.called
+        unsure = EmailState(email_id="u", subject="Lunch", sender="y@other.org", body="", cleaned_body="Are we still meeting for lunch?")
+        mock_llm_call.return_value = "informational"
+        assert filter_email(unsure, llm, cache, model)["category"] == "informational"
+    assert model.stats() == {"emails": 2, "decided_locally": 1, "llm_calls_avoided_ratio": 0.5}
+
+def test_metrics_record_nodes_llm_calls_and_export(tmp_path):
+    """Tests node/LLM instrumentation and the Prometheus and JSON exports."""
+    import json
+    import urllib.request
+    from core.llm_cache import LLMCache, cached_invoke, LLM_CALLS
+    from core.supervisor import EmailSupervisor, NODE_SECONDS, EMAILS
+    from utils.metrics import MetricsRegistry, metrics, start_http_server
+
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, node="a")
+    registry.counter("demo_total", "Demo counter").inc(2, kind='quote"d')
+    text = registry.render_prometheus()
+    assert 'demo_seconds_bucket{node="a",le="0.1"} 1' in text and 'demo_seconds_bucket{node="a",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{node="a"} 4' in text and 'demo_total{kind="quote\\"d"} 2' in text
+    assert latency.quantile(0.5, node="a") == 1.0
+
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"))
+    calls_before = LLM_CALLS.value(node="demo", outcome="call")
+    for _ in range(2):
+        assert cached_invoke(cache, "prompt", MagicMock(model_name="m"), {"body": "hello"}, lambda: "hi", namespace="demo") == "hi"
+    assert LLM_CALLS.value(node="demo", outcome="call") == calls_before + 1
+    assert LLM_CALLS.value(node="demo", outcome="cache_hit") >= 1
+
+    filter_before = NODE_SECONDS.count(node="filter_email")
+    with patch('core.supervisor.filter_email', return_value={"category": "spam"}):
+        EmailSupervisor(fused=False).process_email(
+            EmailState(email_id="m-1", subject="Hi", sender="a@example.com", body="Hello there", cleaned_body="Hello there"))
+    assert NODE_SECONDS.count(node="filter_email") == filter_before + 1
+    assert EMAILS.value(category="spam", status="pending") >= 1
+
+    # Gauges registered by each new client or queue do not keep the replaced ones alive
+    import gc
+    import weakref
+    from core.llm_client import LLMClient
+    from core.work_queue import WorkQueue
+    replaced = [weakref.ref(LLMClient()), weakref.ref(WorkQueue(str(tmp_path / "queue.sqlite3")))]
+    gc.collect()
+    assert [ref() for ref in replaced] == [None, None]
+    assert "mailmind_llm_concurrency_limit" in metrics.render_prometheus()
+
+    server = start_http_server(0, host="127.0.0.1")
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        exposition = urllib.request.urlopen(f"{base}/metrics").read().decode()
+        assert 'mailmind_node_seconds_count{node="filter_email"}' in exposition
+        assert "mailmind_review_queue_pending" in exposition
+        assert "mailmind_node_seconds" in json.loads(urllib.request.urlopen(f"{base}/metrics.json").read())
+    finally:
+        server.shutdown()
+    metrics.dump_json(str(tmp_path / "metrics.json"))
+    with open(tmp_path / "metrics.json") as f:
+        assert "mailmind_llm_calls_total" in json.load(f)["metrics"]
+
+def test_offline_pipeline_with_fake_llm_and_synthetic_mailbox():
+    """Tests the benchmark harness pieces: seeded mailbox, IMAP stand-in and an injected fake chat model."""
+    from benchmarks.fake_llm import FakeChatModel
+    from benchmarks.imap_standin import FakeIMAPServer
+    from benchmarks.mailbox import generate_mailbox, load_into
+    from core.email_imap import fetch_emails_by_uid
+    from core.supervisor import EmailSupervisor
+
+    messages = generate_mailbox(40, html_ratio=0.5, thread_ratio=0.3, spam_ratio=0.2, seed=7)
+    assert messages == generate_mailbox(40, html_ratio=0.5, thread_ratio=0.3, spam_ratio=0.2, seed=7)
+    assert any(m["html"] for m in messages) and any("References" in m["headers"] for m in messages)
+
+    server = FakeIMAPServer()
+    uids = load_into(server, messages)
+    connection = server.connect()
+    connection.select("INBOX")
+    emails = fetch_emails_by_uid(connection, uids, header_first=True)
+    assert len(emails) == 40 and all("<html" not in e.cleaned_body for e in emails)
+
+    llm = FakeChatModel(output_tokens=5)
+    supervisor = EmailSupervisor(fused=False, llm=llm)
+    results = supervisor.process_batch(emails, max_concurrency=4, interactive_review=False)
+    assert [r.email_id for r in results] == [str(uid) for uid in uids]
+    assert all(r.category in ("spam", "urgent", "informational", "needs_review") for r in results)
+    assert llm.calls > 0 and any(r.summary for r in results)
+
+def test_llm_client_retries_rate_limits_and_fails_emails_cleanly(monkeypatch):
+    """Tests Retry-After backoff, the circuit breaker, AIMD concurrency and error routing for LLM failures."""
+    from benchmarks.fake_llm import FakeChatModel
+    from core import llm_client
+    from core.llm_client import AIMDLimiter, CircuitBreaker, CircuitOpenError, LLMClient, ResilientChatModel, retry_after
+    from core.supervisor import EmailSupervisor
+
+    class RateLimitError(Exception):
+        def __init__(self, headers):
+            super().__init__("429 Too Many Requests")
+            self.status_code = 429
+            self.response = MagicMock(status_code=429, headers=headers)
+
+    sleeps = []
+    monkeypatch.setattr(llm_client.time, "sleep", sleeps.append)
+    assert retry_after(RateLimitError({"retry-after": "3"})) == 3.0
+    assert retry_after(RateLimitError({"retry-after-ms": "250"})) == 0.25
+
+    client = LLMClient(max_retries=3, base_delay=0.0, limiter=AIMDLimiter(initial=4, maximum=8))
+    attempts = iter([RateLimitError({"retry-after": "2"}), None])
+
+    def flaky():
+        error = next(attempts)
+        if error:
+            raise error
+        return "ok"
+
+    assert client.call(flaky) == "ok"
+    assert client.retries == 1 and 2.0 in sleeps
+    assert client.limiter.limit < 4  # halved on the 429, then grew back slightly
+
+    with pytest.raises(ValueError):  # a bad request is not retried
+        client.call(lambda: (_ for _ in ()).throw(ValueError("bad request")))
+    assert client.retries == 1
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    failing = LLMClient(max_retries=5, base_delay=0.0, breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        failing.call(lambda: (_ for _ in ()).throw(TimeoutError("read timed out")))
+    assert breaker.state == "open" and failing.retries == 2
+
+    # The wrapped model keeps the inner model's name (and cache keys) and still works end to end
+    wrapped = ResilientChatModel(model=FakeChatModel(output_tokens=3), client=LLMClient())
+    assert wrapped.model_name == "fake-chat" and len(wrapped.invoke("hello").content.split()) == 3
+
+    email = EmailState(email_id="e-1", subject="Help", sender="a@example.com", body="The site is down", cleaned_body="The site is down")
+    supervisor = EmailSupervisor(fused=False, llm=ResilientChatModel(model=FakeChatModel(), client=failing))
+    result = supervisor.process_email(email)
+    assert result.status == "error" and "circuit breaker" in result.error
+    assert result.summary == "" and result.draft_response == ""
+
+def test_parallel_graph_summarizes_while_classifying(monkeypatch):
+    """Tests the parallel topology: summaries are kept for real mail and discarded for spam."""
+    from benchmarks.fake_llm import FakeChatModel
+    from core.supervisor import EmailSupervisor, SPECULATIVE_SUMMARIES
+
+    monkeypatch.setattr(config, "PREFILTER_ENABLED", False)
+    monkeypatch.setattr(config, "DEDUP_ENABLED", False)
+    llm = FakeChatModel(latency=0.2, output_tokens=5)
+    supervisor = EmailSupervisor(fused=False, llm=llm, parallel=True)
+    supervisor.workflow = supervisor.build_graph(defer_review=True)
+    assert {"speculate_summary", "join_summary"} <= set(supervisor.workflow.get_graph().nodes)
+
+    urgent = EmailState(email_id="p-1", subject="Outage", sender="a@example.com",
+                        body="The API is down, please help immediately", cleaned_body="The API is down, please help immediately")
+    start = time.perf_counter()
+    result = supervisor.process_email(urgent)
+    # Classification and summary overlap: two LLM latencies in sequence, not three
+    assert time.perf_counter() - start < 0.55
+    assert result.category == "urgent" and result.summary and result.draft_response and llm.calls == 3
+
+    discarded_before = SPECULATIVE_SUMMARIES.value(outcome="discarded")
+    spam = EmailState(email_id="p-2", subject="Deal", sender="b@example.com",
+                      body="Limited time offer, buy now", cleaned_body="Limited time offer, buy now")
+    result = supervisor.process_email(spam)
+    assert result.category == "spam" and result.summary == "" and result.draft_response == ""
+    assert SPECULATIVE_SUMMARIES.value(outcome="discarded") == discarded_before + 1
+
+def test_scheduler_drafts_urgent_mail_first_without_starving_the_rest():
+    """Tests priority signals, deadline order within a class, starvation protection and time-to-draft."""
+    from agents.prefilter_agent import RuleBasedPrefilter
+    from core.scheduler import PriorityScheduler, LOW, NORMAL, URGENT, TIME_TO_DRAFT
+
+    def email(email_id, subject, sender="someone@example.com", body="Hello", **headers):
+        return EmailState(email_id=email_id, subject=subject, sender=sender, body=body, cleaned_body=body, headers=headers)
+
+    scheduler = PriorityScheduler(prefilter=RuleBasedPrefilter(), vip_senders=["bigcustomer.com"])
+    newsletter = email("n-1", "Weekly update", sender="newsletter@news.example.org",
+                       body="Your weekly digest", **{"List-Unsubscribe": "<https://x>"})
+    assert scheduler.priority(newsletter)[0] == LOW
+    assert scheduler.priority(email("u-1", "URGENT: production outage"))[0] == URGENT
+    assert scheduler.priority(email("v-1", "Quick question", sender="Ann <ann@bigcustomer.com>"))[0] == URGENT
+    assert scheduler.priority(email("q-1", "Quick question"))[0] == NORMAL
+
+    backlog = [email(f"n-{i}", "Weekly update", sender="newsletter@news.example.org", body="Your weekly digest",
+                     **{"List-Unsubscribe": "<https://x>"}) for i in range(5)]
+    backlog += [email("q-old", "Question", Date="Mon, 06 Jan 2025 09:00:00 +0000"),
+                email("q-new", "Question", Date="Tue, 07 Jan 2025 09:00:00 +0000"),
+                email("u-1", "Server is down, help ASAP")]
+    order = [e.email_id for e in scheduler.schedule(reversed(backlog))]
+    assert order[:3] == ["u-1", "q-old", "q-new"] and len(order) == 8
+
+    # Everything past max_wait goes out in arrival order, ahead of newer urgent mail
+    patient = PriorityScheduler(max_wait=0.0)
+    patient.push(email("old", "Newsletter"))
+    patient.push(email("hot", "urgent"))
+    time.sleep(0.01)
+    assert patient.pop().email_id == "old" and patient.promoted == 1 and patient.pop().email_id == "hot"
+    assert patient.pop() is None and len(patient) == 0
+
+    before = TIME_TO_DRAFT.count(category="urgent")
+    scheduler.complete(backlog[-1].model_copy(update={"category": "urgent"}))
+    assert TIME_TO_DRAFT.count(category="urgent") == before + 1
+    assert scheduler.stats()["time_to_draft"]["urgent"]["emails"] == 1
+
+    # Reading ahead of an IMAP source is only allowed when its fetched mail is spooled
+    from core.scheduler import get_default_scheduler
+    assert get_default_scheduler(spooled=True) is not None
+    assert get_default_scheduler(spooled=False) is None
+
+def test_light_imports_and_chains_built_once(monkeypatch):
+    """Tests that importing the pipeline defers langchain/langgraph and that chains are reused across emails."""
+    import os
+    import subprocess
+    import sys
+    from benchmarks.fake_llm import FakeChatModel
+    from core import supervisor as supervisor_module
+    from core.supervisor import EmailSupervisor
+
+    code = ("import sys, config, main, core.supervisor; "
+            "print(sorted(m for m in sys.modules if m.startswith(('langchain', 'langgraph', 'openai'))))")
+    env = {key: value for key, value in os.environ.items() if key != "DEEPSEEK_API_KEY"}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+    builds = []
+    original = supervisor_module.build_filter_chain
+    monkeypatch.setattr(supervisor_module, "build_filter_chain", lambda llm: builds.append(1) or original(llm))
+    monkeypatch.setattr(config, "PREFILTER_ENABLED", False)
+    monkeypatch.setattr(config, "DEDUP_ENABLED", False)
+    supervisor = EmailSupervisor(fused=False, llm=FakeChatModel(output_tokens=3))
+    for i in range(3):
+        supervisor.process_email(EmailState(email_id=f"c-{i}", subject="Deal", sender="a@example.com",
+                                            body=f"Buy now, offer {i}", cleaned_body=f"Buy now, offer {i}"))
+    assert len(builds) == 1
+
+def test_streamed_draft_can_be_cancelled(monkeypatch):
+    """Tests that drafts stream chunk by chunk into listeners and drafts/, and that a rejection stops generation."""
+    import os
+    from benchmarks.fake_llm import FakeChatModel
+    from core.draft_stream import DRAFT_SECONDS, DraftStreams, read_partial_draft, request_cancel
+    from core import supervisor as supervisor_module
+    from core.llm_client import with_resilience
+    from core.supervisor import EmailSupervisor
+
+    email = EmailState(email_id="s-1", subject="Outage", sender="a@example.com", category="urgent",
+                       body="The site is down", cleaned_body="The site is down", summary="Site down")
+    drafts = DraftStreams(config.DRAFT_STREAM_DIR, poll_seconds=0.0)
+    received, partial = [], []
+    drafts.subscribe(lambda email_id, chunk: received.append(chunk) or partial.append(read_partial_draft(config.DRAFT_STREAM_DIR, email_id)))
+    llm = with_resilience(FakeChatModel(output_tokens=6))
+    before = DRAFT_SECONDS.count(outcome="complete")
+    result = generate_response(email, llm, stream=drafts.open(email.email_id))
+    assert len(received) == 6 and "".join(received) == result["draft_response"]
+    assert partial[-1] == result["draft_response"]
+    assert DRAFT_SECONDS.count(outcome="complete") == before + 1
+    assert not os.listdir(config.DRAFT_STREAM_DIR) and drafts.active() == []
+
+    # Another process (review.py reject) asks for the draft to stop after its second chunk
+    stream = drafts.open(email.email_id)
+    stream.listeners = [lambda email_id, chunk: len(stream.chunks) == 2 and request_cancel(config.DRAFT_STREAM_DIR, email_id)]
+    result = generate_response(email, llm, stream=stream)
+    assert result["cancelled"] and len(stream.chunks) == 2 and not os.listdir(config.DRAFT_STREAM_DIR)
+
+    monkeypatch.setattr(config, "PREFILTER_ENABLED", False)
+    supervisor = EmailSupervisor(fused=False, llm=FakeChatModel(output_tokens=20))
+    monkeypatch.setattr(supervisor_module, "filter_email", lambda state, *args, **kwargs: {"category": "urgent"})
+    supervisor.drafts.subscribe(lambda email_id, chunk: supervisor.cancel_draft(email_id))
+    final_state = supervisor.process_email(email.model_copy(update={"email_id": "s-2", "category": None}))
+    assert final_state.status == "rejected" and final_state.final_response is None
+
+    # Emails that get no draft leave no stream behind
+    monkeypatch.setattr(supervisor_module, "filter_email", lambda state, *args, **kwargs: {"category": "informational"})
+    final_state = supervisor.process_email(email.model_copy(update={"email_id": "s-3", "category": "new"}))
+    assert final_state.category == "informational" and not final_state.draft_response
+    assert supervisor.drafts.active() == [] and not os.listdir(config.DRAFT_STREAM_DIR)
+
+def test_work_queue_leases_and_sharded_workers(tmp_path, monkeypatch):
+    """Tests that workers lease disjoint jobs, expired leases are taken over, and accounts are sharded."""
+    from benchmarks.fake_llm import FakeChatModel
+    from core.accounts import Account, load_accounts, shard_accounts
+    from core.supervisor import EmailSupervisor
+    from core.work_queue import WorkQueue
+    from core.worker import Worker
+    import core.worker as worker_module
+
+    def email(email_id, account):
+        return EmailState(email_id=email_id, subject="Quick question", sender="a@example.com", account=account,
+                          body="Can we meet on Thursday?", cleaned_body="Can we meet on Thursday?")
+
+    path = str(tmp_path / "work_queue.sqlite3")
+    queue, other = WorkQueue(path, lease_seconds=60), WorkQueue(path, lease_seconds=60)
+    for i in range(6):
+        assert queue.enqueue("sales" if i % 2 else "support", email(f"j-{i}", "sales" if i % 2 else "support"))
+    assert not queue.enqueue("support", email("j-0", "support"))  # fetched twice, queued once
+
+    first = queue.lease("w1", limit=2, accounts=["support"])
+    second = other.lease("w2", limit=10)
+    assert {job.account for job in first} == {"support"}
+    assert not {job.job_id for job in first} & {job.job_id for job in second} and len(first) + len(second) == 6
+
+    # w1 stalls past its lease: w2 takes the job over and w1 can no longer complete it
+    with monkeypatch.context() as later:
+        later.setattr(time, "time", lambda real=time.time: real() + 120)
+        taken = other.lease("w2", limit=1)
+    assert taken and taken[0].job_id in {job.job_id for job in first} and taken[0].attempts == 2
+    assert not queue.complete(taken[0].job_id, "w1", "processed")
+    assert other.complete(taken[0].job_id, "w2", "processed")
+
+    accounts = [Account(name=name, imap_server="imap.example.com", imap_username=name, imap_password="x")
+                for name in ("c", "a", "d", "b", "e")]
+    shards = [shard_accounts(accounts, index, 2) for index in range(2)]
+    assert [[a.name for a in shard] for shard in shards] == [["a", "c", "e"], ["b", "d"]]
+    monkeypatch.setattr(config, "ACCOUNTS_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(config, "IMAP_SERVER", None)
+    assert load_accounts() == []
+
+    # A worker runs the jobs it leases through its own supervisor and completes them
+    monkeypatch.setattr(config, "PREFILTER_ENABLED", False)
+    monkeypatch.setattr(config, "DAEMON_AUTO_SEND", False)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "drafts").mkdir(exist_ok=True)
+    fresh = WorkQueue(str(tmp_path / "fresh.sqlite3"))
+    for i in range(3):
+        fresh.enqueue("support", email(f"support-{i}", "support"))
+    handled = []
+    monkeypatch.setattr(worker_module, "handle_unattended_result", lambda final_state, *args: handled.append(final_state.email_id))
+    worker = Worker(EmailSupervisor(fused=False, llm=FakeChatModel(output_tokens=5)), fresh, [], max_concurrency=2)
+    worker.run(until_empty=True)
+    assert worker.processed == 3 and fresh.counts() == {"done": 3}
+    assert sorted(handled) == [f"support-{i}" for i in range(3)]
+
+    # A worker that stalled past its lease does not reply to an email another worker took over
+    fresh.enqueue("support", email("support-3", "support"))
+    stalled = worker.lease()
+    with monkeypatch.context() as later:
+        later.setattr(time, "time", lambda real=time.time: real() + 600)
+        assert WorkQueue(str(tmp_path / "fresh.sqlite3")).lease("w2", limit=1)
+    worker.process(stalled)
+    assert worker.processed == 3 and "support-3" not in handled
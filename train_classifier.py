@@ -0,0 +1,54 @@
+import argparse
+import random
+from agents.local_classifier import LocalClassifier, evaluate
+from core.llm_cache import LLMCache
+from utils.logger import logger
+import config
+
+def split_examples(examples: list, test_fraction: float, seed: int = 0) -> tuple:
+    """
+    Shuffles the examples and splits them into (train, test).
+    """
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    test_size = int(len(examples) * test_fraction)
+    return examples[test_size:], examples[:test_size]
+
+def main():
+    """
+    Trains (or refreshes) the local email classifier from the labels the LLM gave in earlier runs.
+    """
+    parser = argparse.ArgumentParser(description="Train the local email classifier on past LLM classifications.")
+    parser.add_argument("--cache", default=config.LLM_CACHE_PATH, help="LLM cache database holding the labeled examples")
+    parser.add_argument("--output", default=config.LOCAL_CLASSIFIER_PATH)
+    parser.add_argument("--threshold", type=float, default=config.LOCAL_CLASSIFIER_THRESHOLD)
+    parser.add_argument("--test-fraction", type=float, default=0.2, help="Share of examples held out to evaluate against the LLM")
+    parser.add_argument("--min-examples", type=int, default=50)
+    parser.add_argument("--epochs", type=int, default=15)
+    args = parser.parse_args()
+
+    cache = LLMCache(args.cache)
+    examples = cache.examples("filter_email")
+    cache.close()
+    if len(examples) < args.min_examples:
+        logger.warning(f"Only {len(examples)} labeled emails in {args.cache}; need at least {args.min_examples}. "
+                       "Run the assistant with the LLM cache enabled to collect more.")
+        return
+
+    train, test = split_examples(examples, args.test_fraction)
+    if test:
+        model = LocalClassifier.train(train, epochs=args.epochs, threshold=args.threshold)
+        report = evaluate(model, test)
+        logger.info(
+            f"Held-out evaluation on {report['examples']} emails: accuracy vs LLM {report['accuracy']:.1%}, "
+            f"answered locally {report['coverage']:.1%} at threshold {args.threshold} "
+            f"with {report['confident_accuracy']:.1%} agreement, {report['ms_per_email']:.2f} ms/email"
+        )
+
+    # The saved model uses every example
+    model = LocalClassifier.train(examples, epochs=args.epochs, threshold=args.threshold)
+    model.save(args.output)
+    logger.info(f"Saved local classifier trained on {len(examples)} emails to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,205 @@
+import html
 import re
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 
-def clean_email_body(body: str) -> str:
+# Cheap check for markup; plain-text bodies skip HTML parsing entirely
+# ("<bob@example.com>" in a plain-text body is not markup)
+TAG_PATTERN = re.compile(r"<(?:/?[a-zA-Z][a-zA-Z0-9]*(?:\s[^>]*)?/?|!--.*?--|![a-zA-Z][^>]*)>", re.DOTALL)
+
+# Elements whose content is never user-visible text
+SKIPPED_TAGS = {"script", "style", "head", "title", "noscript", "template", "svg", "object"}
+# Elements that start a new line in rendered text
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "form", "h1", "h2",
+    "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "tr", "ul",
+}
+# Table cells stay on their row's line, separated like a plain-text table
+CELL_TAGS = {"td", "th"}
+CELL_SEPARATOR = " | "
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Containers mail clients use for the quoted previous message
+QUOTE_CLASSES = ("gmail_quote", "yahoo_quoted", "moz-cite-prefix", "protonmail_quote")
+QUOTE_IDS = ("divrplyfwdmsg", "appendonsend", "mail-editor-reference-message-container")
+
+# Plain-text markers for the start of quoted history
+REPLY_HEADER_PATTERNS = [
+    re.compile(r"^On\b.{0,300}\bwrote:\s*$", re.IGNORECASE | re.DOTALL),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Reply message\s*-{2,}\s*$", re.IGNORECASE),
+]
+OUTLOOK_HEADER = re.compile(r"^(From|Sent|Date|To|Subject|Cc):\s", re.IGNORECASE)
+# Forwarded content is the point of the email, so the header block after these markers is kept
+FORWARD_MARKER = re.compile(r"^(-+\s*Forwarded message\s*-+|Begin forwarded message:)\s*$", re.IGNORECASE)
+SEPARATOR_LINE = re.compile(r"^[_=-]{5,}$")
+SIGNATURE_PATTERNS = [
+    re.compile(r"^--\s?$"),
+    re.compile(r"^(Sent from my|Sent from Mail for|Get Outlook for)\b", re.IGNORECASE),
+]
+# A signature marker with more than this many lines of text after it is part of the message
+SIGNATURE_MAX_LINES = 6
+
+class _TextExtractor(HTMLParser):
+    """
+    Streams text out of HTML, dropping invisible elements and, optionally, quoted replies.
+    """
+
+    def __init__(self, strip_quotes: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.strip_quotes = strip_quotes
+        self.parts = []
+        self.skip_depth = 0
+        self.quote_depth = 0  # open elements inside the current quoted block
+        self.row_has_cell = False
+
+    def _is_quote(self, tag, attrs) -> bool:
+        if not self.strip_quotes:
+            return False
+        attributes = dict(attrs)
+        # A bare <blockquote> may be quoted terms in a fresh email; Apple Mail and
+        # Thunderbird mark quoted replies with type="cite"
+        if tag == "blockquote" and (attributes.get("type") or "").lower() == "cite":
+            return True
+        classes = (attributes.get("class") or "").lower()
+        element_id = (attributes.get("id") or "").lower()
+        return any(name in classes for name in QUOTE_CLASSES) or element_id in QUOTE_IDS
+
+    def handle_starttag(self, tag, attrs):
+        if self.quote_depth:
+            if tag not in VOID_TAGS:
+                self.quote_depth += 1
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag not in VOID_TAGS and self._is_quote(tag, attrs):
+            self.quote_depth = 1
+        elif tag in CELL_TAGS:
+            if self.row_has_cell:
+                self.parts.append(CELL_SEPARATOR)
+            self.row_has_cell = True
+        elif tag in BLOCK_TAGS:
+            if tag == "tr":
+                self.row_has_cell = False
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.quote_depth and tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if self.quote_depth:
+            if tag not in VOID_TAGS:
+                self.quote_depth -= 1
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth and not self.quote_depth:
+            self.parts.append(data)
+
+def html_to_text(body: str, strip_quotes: bool = True) -> str:
+    """
+    Extracts visible text from HTML with the standard library's incremental parser.
+    """
+    extractor = _TextExtractor(strip_quotes=strip_quotes)
+    extractor.feed(body)
+    extractor.close()
+    return "".join(extractor.parts)
+
+def _is_outlook_header(lines, index: int) -> bool:
+    """
+    Detects an Outlook-style "From: / Sent: / To: / Subject:" block starting at `index`.
+    """
+    if not OUTLOOK_HEADER.match(lines[index]):
+        return False
+    block = [line for line in lines[index:index + 5] if line.strip()]
+    return len(block) >= 3 and sum(1 for line in block[:4] if OUTLOOK_HEADER.match(line)) >= 3
+
+def _quote_follows(lines, index: int) -> bool:
+    """
+    True if the next non-blank line from `index` on is quoted ("> ...") or the message ends first.
+    """
+    for line in lines[index:]:
+        if line.strip():
+            return line.lstrip().startswith(">")
+    return True
+
+def _is_reply_header(lines, index: int) -> bool:
+    """
+    Detects "On ... wrote:" and "Original Message" headers at `index`. "On Friday the vendor
+    wrote:" is also how people quote someone in their own words, so a header only counts
+    when quoted lines or the end of the message follow it.
     """
-    Cleans email body by removing HTML tags and extra whitespace.
+    stripped = lines[index].strip()
+    if any(p.match(stripped) for p in REPLY_HEADER_PATTERNS):
+        return _quote_follows(lines, index + 1)
+    # "On <date>, <name> wrote:" is often wrapped over two lines
+    if index + 1 < len(lines):
+        joined = f"{stripped} {lines[index + 1].strip()}"
+        if any(p.match(joined) for p in REPLY_HEADER_PATTERNS):
+            return _quote_follows(lines, index + 2)
+    return False
+
+def _is_signature(lines, index: int) -> bool:
+    """
+    Detects a signature marker ("-- ", "Sent from my ...") close enough to the end of the
+    message that what follows it is a signature, not more of the message.
+    """
+    if not any(p.match(lines[index].strip()) for p in SIGNATURE_PATTERNS):
+        return False
+    rest = [line for line in lines[index + 1:] if line.strip() and not line.lstrip().startswith(">")]
+    return len(rest) <= SIGNATURE_MAX_LINES
+
+def strip_quoted_text(text: str) -> str:
+    """
+    Removes quoted reply history ("> ..." lines, "On ... wrote:" headers followed by quoted
+    lines and Outlook headers, with everything after them) and trailing signatures.
+    Returns the input unchanged if stripping would leave nothing.
+    """
+    lines = text.split("\n")
+    kept = []
+    forwarded_until = -1
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if FORWARD_MARKER.match(stripped):
+            # The forwarded message's own header block follows; keep it
+            forwarded_until = index + 8
+        if _is_reply_header(lines, index) or (index > forwarded_until and _is_outlook_header(lines, index)):
+            break
+        if _is_signature(lines, index):
+            break
+        if stripped.startswith(">"):
+            continue
+        kept.append(line)
+    # Drop the separator line Outlook puts above its header block
+    while kept and SEPARATOR_LINE.match(kept[-1].strip()):
+        kept.pop()
+    result = "\n".join(kept).strip()
+    return result if result else text
+
+def clean_email_body(body: str, strip_quotes: bool = True) -> str:
+    """
+    Cleans email body by removing HTML tags and extra whitespace. Quoted reply chains
+    and signatures are dropped unless strip_quotes is False.
     """
     if not body:
         return ""
-    
-    # Use BeautifulSoup to parse HTML and get text
-    soup = BeautifulSoup(body, "html.parser")
-    text = soup.get_text()
-    
+
+    if TAG_PATTERN.search(body):
+        text = html_to_text(body, strip_quotes=strip_quotes)
+    else:
+        # Fast path: no markup to parse, only entities to decode
+        text = html.unescape(body) if "&" in body else body
+
     # Remove excessive newlines and whitespace
     text = re.sub(r'\s*\n\s*', '\n', text).strip()
     text = re.sub(r'[ \t]{2,}', ' ', text)
-    
+
+    if strip_quotes:
+        text = strip_quoted_text(text)
+
     return text
 
 def format_email_preview(subject: str, sender: str, body: str, max_len: int = 100) -> str:
@@ -23,4 +207,4 @@ def format_email_preview(subject: str, sender: str, body: str, max_len: int = 10
     Formats a short preview of an email.
     """
     body_preview = (body[:max_len] + '...') if len(body) > max_len else body
-    return f"From: {sender}\nSubject: {subject}\nBody: {body_preview.replace(chr(10), ' ')}"
\ No newline at end of file
+    return f"From: {sender}\nSubject: {subject}\nBody: {body_preview.replace(chr(10), ' ')}"
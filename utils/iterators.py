@@ -0,0 +1,22 @@
+import asyncio
+from typing import AsyncIterator, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+async def iterate_in_thread(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """
+    Adapts a blocking iterator (file or IMAP reads) into an async iterator by
+    advancing it in a worker thread, so the event loop is never blocked.
+    """
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await asyncio.to_thread(close)
@@ -0,0 +1,282 @@
+import bisect
+import inspect
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from utils.logger import logger
+import config
+
+try:
+    from opentelemetry import trace  # optional: per-email spans for a tracing backend
+except ImportError:
+    trace = None
+
+# Seconds; covers everything from a local classification to a slow LLM call or IMAP pull
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+    def snapshot(self) -> list:
+        return [{"labels": dict(key), "value": value} for _, key, value in self.samples()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text)
+        # A gauge with a function is read when metrics are collected, e.g. a queue's length
+        self.function = function
+
+    @property
+    def function(self) -> Optional[Callable[[], float]]:
+        function = self._function
+        return function() if isinstance(function, weakref.WeakMethod) else function
+
+    @function.setter
+    def function(self, function: Optional[Callable[[], float]]):
+        # Bound methods are held weakly: registering one (each new supervisor, client or queue
+        # does) must not keep its object alive after it is replaced
+        self._function = weakref.WeakMethod(function) if inspect.ismethod(function) else function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        function = self.function
+        if function is not None:
+            try:
+                self.set(function())
+            except Exception as e:
+                logger.warning(f"Could not read gauge {self.name}: {e}")
+        return super().samples()
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., count in +Inf], sum
+        self._values: Dict[LabelKey, Tuple[list, list]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_label_key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def quantile(self, q: float, **labels) -> float:
+        """
+        Estimates a quantile from the buckets (the upper bound of the bucket it falls in).
+        """
+        entry = self._values.get(_label_key(labels))
+        if not entry or not sum(entry[0]):
+            return 0.0
+        counts = entry[0]
+        rank = q * sum(counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", "+Inf" if bound == float("inf") else repr(bound)),), cumulative
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, cumulative
+
+    def snapshot(self) -> list:
+        with self._lock:
+            keys = list(self._values)
+        return [
+            {"labels": dict(key), "count": self.count(**dict(key)), "sum": self._values[key][1][0],
+             "p50": self.quantile(0.5, **dict(key)), "p99": self.quantile(0.99, **dict(key))}
+            for key in keys
+        ]
+
+class MetricsRegistry:
+    """
+    Holds the process's counters, gauges and histograms and renders them in the
+    Prometheus text format or as JSON. Metrics are created on first use, so
+    instrumented code can simply call e.g. metrics.counter(name, help).inc().
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "", function: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._get(Gauge, name, help_text)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name: str, help_text: str = "", buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: {"type": metric.kind, "help": metric.help, "values": metric.snapshot()} for metric in metrics}
+
+    def dump_json(self, path: str):
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.time(), "metrics": self.to_dict()}, f, indent=2)
+        os.replace(temporary, path)
+
+metrics = MetricsRegistry()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics.render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.to_dict()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the application log
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serves /metrics (Prometheus text) and /metrics.json from a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def start_json_dump(path: str, interval_seconds: float) -> threading.Event:
+    """
+    Writes the metrics to `path` every `interval_seconds` until the returned event is set.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval_seconds):
+            try:
+                metrics.dump_json(path)
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {path}: {e}")
+        metrics.dump_json(path)
+
+    threading.Thread(target=run, name="metrics-json", daemon=True).start()
+    return stop
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    An OpenTelemetry span when tracing is enabled and opentelemetry is installed, otherwise a no-op.
+    """
+    if trace is None or not config.TRACING_ENABLED:
+        yield None
+        return
+    with trace.get_tracer("mailmind").start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            current.set_attribute(key, value)
+        yield current
+
+def start_exporters():
+    """
+    Starts the metrics endpoints configured in config.py.
+    """
+    if config.METRICS_PORT:
+        start_http_server(config.METRICS_PORT)
+    if config.METRICS_JSON_PATH:
+        start_json_dump(config.METRICS_JSON_PATH, config.METRICS_JSON_INTERVAL_SECONDS)
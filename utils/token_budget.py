@@ -0,0 +1,97 @@
+import re
+from typing import Tuple
+from utils.formatter import strip_quoted_text
+from utils.metrics import metrics
+import config
+
+# Rough average for English text with DeepSeek/GPT-style BPE tokenizers. Exact counts would
+# need the model's tokenizer, which is far slower than this and only matters near the limit.
+CHARS_PER_TOKEN = 4
+
+# A table row: cells separated by pipes (as html_to_text renders them), tabs or aligned spaces
+TABLE_LINE = re.compile(r"^.*(?:\||\t|\S {2,}\S).*$")
+TABLE_MIN_ROWS = 8
+
+TOKENS_SAVED = metrics.counter("mailmind_prompt_tokens_saved_total", "Estimated prompt tokens removed by per-node body budgets")
+TABLE_KEPT_ROWS = 4
+# Share of the budget kept from the start of the body; the rest comes from the end
+HEAD_RATIO = 0.7
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for budgeting prompts.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def node_budget(node: str) -> int:
+    """
+    Returns the body token budget for a graph node; 0 or less means unlimited.
+    """
+    budgets = {
+        "filter_email": config.TOKEN_BUDGET_FILTER,
+        "summarize_email": config.TOKEN_BUDGET_SUMMARIZE,
+        "generate_response": config.TOKEN_BUDGET_RESPONSE,
+        "analyze_email": config.TOKEN_BUDGET_ANALYZE,
+    }
+    return budgets.get(node, 0)
+
+def collapse_tables(text: str) -> str:
+    """
+    Replaces long runs of table-like lines with their first few rows and a marker.
+    """
+    lines = text.split("\n")
+    result = []
+    index = 0
+    while index < len(lines):
+        end = index
+        while end < len(lines) and lines[end].strip() and TABLE_LINE.match(lines[end]):
+            end += 1
+        if end - index >= TABLE_MIN_ROWS:
+            result.extend(lines[index:index + TABLE_KEPT_ROWS])
+            result.append(f"[... {end - index - TABLE_KEPT_ROWS} table rows omitted ...]")
+            index = end
+        else:
+            result.append(lines[index])
+            index += 1
+    return "\n".join(result)
+
+def keep_head_and_tail(text: str, max_tokens: int) -> str:
+    """
+    Keeps the start and end of the text (greeting, main ask, closing) and drops the middle.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    marker = "\n[... {} tokens omitted ...]\n"
+    available = max(0, max_chars - len(marker) - 8)
+    head_chars = int(available * HEAD_RATIO)
+    tail_chars = available - head_chars
+    # Cut on whitespace so words are not split; a slice may be whitespace only
+    head = (text[:head_chars].rsplit(None, 1) or [""])[0] if head_chars else ""
+    tail = (text[len(text) - tail_chars:].split(None, 1) or [""])[-1] if tail_chars else ""
+    omitted = estimate_tokens(text) - estimate_tokens(head) - estimate_tokens(tail)
+    return head + marker.format(omitted) + tail
+
+def fit_to_budget(text: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Trims text to roughly max_tokens, least destructive step first: quoted history,
+    then long tables, then the middle of the body. Returns (text, tokens_saved).
+    """
+    original = estimate_tokens(text)
+    if max_tokens <= 0 or original <= max_tokens:
+        return text, 0
+    for step in (strip_quoted_text, collapse_tables):
+        text = step(text)
+        if estimate_tokens(text) <= max_tokens:
+            return text, original - estimate_tokens(text)
+    text = keep_head_and_tail(text, max_tokens)
+    return text, max(0, original - estimate_tokens(text))
+
+def budget_body(state, node: str) -> Tuple[str, int]:
+    """
+    Returns the email body trimmed to the node's token budget and the tokens saved.
+    """
+    body, saved = fit_to_budget(state.cleaned_body, node_budget(node))
+    if saved:
+        TOKENS_SAVED.inc(saved, node=node)
+    return body, saved
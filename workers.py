@@ -0,0 +1,77 @@
+import argparse
+import multiprocessing
+import os
+import signal
+from core.accounts import load_accounts
+from core.work_queue import WorkQueue
+from utils.logger import logger
+from utils.metrics import start_exporters
+import config
+
+def run_worker(index: int, count: int):
+    """
+    Runs one worker with its own EmailSupervisor until SIGINT/SIGTERM.
+    """
+    from core.supervisor import EmailSupervisor
+    from core.worker import Worker
+
+    # Each process exports its own metrics
+    if config.METRICS_PORT:
+        config.METRICS_PORT += index
+    if config.METRICS_JSON_PATH:
+        root, ext = os.path.splitext(config.METRICS_JSON_PATH)
+        config.METRICS_JSON_PATH = f"{root}.worker{index}{ext}"
+    start_exporters()
+
+    queue = WorkQueue(config.WORK_QUEUE_PATH, lease_seconds=config.WORK_LEASE_SECONDS, max_attempts=config.WORK_MAX_ATTEMPTS)
+    worker = Worker(EmailSupervisor(), queue, load_accounts(), index=index, count=count)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Worker {index} received signal {signum}; finishing the current batch.")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    worker.run()
+
+def main():
+    """
+    Processes many mailboxes with a pool of worker processes sharing a local work queue.
+    """
+    parser = argparse.ArgumentParser(description="Run sharded workers over the accounts in ACCOUNTS_PATH.")
+    parser.add_argument("--workers", type=int, default=config.WORKER_COUNT, help="Total number of workers")
+    parser.add_argument("--index", type=int,
+                        help="Run only this worker (0-based) in the foreground, e.g. one service per worker")
+    args = parser.parse_args()
+
+    accounts = load_accounts()
+    if not accounts:
+        logger.error(f"No accounts configured: create {config.ACCOUNTS_PATH} or set the IMAP_* variables. Exiting.")
+        return
+    if args.workers < 1 or (args.index is not None and not 0 <= args.index < args.workers):
+        parser.error("--index must be between 0 and --workers - 1")
+
+    # Ensure drafts directory exists
+    if not os.path.exists('drafts'):
+        os.makedirs('drafts')
+
+    if args.index is not None:
+        run_worker(args.index, args.workers)
+        return
+
+    logger.info(f"🚀 Starting {args.workers} workers for {len(accounts)} accounts...")
+    processes = [multiprocessing.Process(target=run_worker, args=(index, args.workers), name=f"worker-{index}")
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Ctrl-C reaches every worker in the process group; wait for them to finish their batch
+        for process in processes:
+            process.join()
+    logger.info(f"Work queue: {WorkQueue(config.WORK_QUEUE_PATH).counts()}")
+
+if __name__ == "__main__":
+    main()